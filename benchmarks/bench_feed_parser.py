@@ -0,0 +1,82 @@
+#!/usr/bin/env python3
+"""
+Feed Parser Benchmark
+合成 RSS（既定 2000 件・約 1MB）で、feedparser による全件パースと
+feed_parser のストリーミングパース（全件 / 先頭 N 件 / 既読ウォーターマークで打ち切り）を比べる
+
+使い方:
+    python benchmarks/bench_feed_parser.py
+    python benchmarks/bench_feed_parser.py --items 500 --max-items 10
+"""
+
+import os
+import sys
+import time
+import argparse
+from typing import Callable
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'deploy'))
+
+from feed_parser import FeedStreamParser
+
+CHUNK_SIZE = 16 * 1024
+
+
+def make_feed(items: int) -> bytes:
+    body = ''.join(
+        f"<item><title>記事 {i}: 市場と政策の最新動向</title>"
+        f"<link>https://news.example.jp/articles/{i}</link><guid>news-{i}</guid>"
+        f"<pubDate>Tue, 02 Jan 2024 00:{i % 60:02d}:00 +0900</pubDate>"
+        f"<description><![CDATA[<p>{'本文の要約。' * 40}</p>]]></description></item>"
+        for i in range(items, 0, -1)
+    )
+    return (f'<?xml version="1.0" encoding="UTF-8"?><rss version="2.0"><channel>'
+            f'<title>Bench</title>{body}</channel></rss>').encode('utf-8')
+
+
+def stream_parse(content: bytes, **options):
+    """ネットワーク受信と同じく CHUNK_SIZE ごとに渡し、打ち切られたら残りは読まない"""
+    parser = FeedStreamParser(**options)
+    received = 0
+    for i in range(0, len(content), CHUNK_SIZE):
+        parser.feed(content[i:i + CHUNK_SIZE])
+        received = min(i + CHUNK_SIZE, len(content))
+        if parser.done:
+            break
+    return parser.finish(), received
+
+
+def measure(name: str, run: Callable, repeat: int):
+    started = time.perf_counter()
+    for _ in range(repeat):
+        entries, received = run()
+    elapsed = (time.perf_counter() - started) / repeat
+    print(f"  {name:<34} {elapsed * 1000:9.1f} ms   {len(entries):5d} entries   {received / 1024:8.0f} KB read")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Streaming feed parser benchmark")
+    parser.add_argument('--items', type=int, default=2000)
+    parser.add_argument('--max-items', type=int, default=20)
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    content = make_feed(args.items)
+    print(f"{args.items} items, {len(content) / 1024:.0f} KB")
+
+    try:
+        import feedparser
+        measure("feedparser (full)", lambda: (feedparser.parse(content).entries, len(content)), args.repeat)
+    except ImportError:
+        print("  feedparser not installed; skipping baseline")
+
+    watermark = f"news-{args.items - args.max_items}"
+    measure("stream (full)", lambda: stream_parse(content), args.repeat)
+    measure(f"stream (max_items={args.max_items})",
+            lambda: stream_parse(content, max_items=args.max_items), args.repeat)
+    measure("stream (stop at watermark)",
+            lambda: stream_parse(content, stop=lambda item: item['id'] == watermark), args.repeat)
+
+
+if __name__ == "__main__":
+    main()
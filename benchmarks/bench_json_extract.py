@@ -0,0 +1,150 @@
+#!/usr/bin/env python3
+"""
+JSON Extract Benchmark
+DeepSeek の応答に近い合成テキスト（コードブロックだけの短い応答・長い推論の後の JSON・入れ子の深い JSON）で、
+置き換え前の多段階抽出（正規表現 + json.loads の繰り返し）と json_scanner.load_json_response を比べる
+
+使い方:
+    python benchmarks/bench_json_extract.py
+    python benchmarks/bench_json_extract.py --reasoning-kb 200 --repeat 3
+"""
+
+import os
+import re
+import sys
+import json
+import time
+import random
+import argparse
+from typing import Any, Callable, Dict, Tuple
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'deploy'))
+
+from json_scanner import load_json_response
+
+ANALYSIS = {
+    "title_ja": "日銀、政策金利を据え置き",
+    "summary": "日本銀行は金融政策決定会合で政策金利の据え置きを決めた。" * 2,
+    "category": "経済",
+    "importance": 7,
+    "sentiment": "neutral",
+    "keywords": ["日銀", "金利", "為替", "物価"],
+    "reasoning": "市場への影響が大きい {決定} のため",
+    "global_impact": "円相場と各国の金融政策に影響",
+    "japan_relevance": "住宅ローン金利や企業の資金調達に直結"
+}
+
+# 3段の入れ子（置き換え前の正規表現は2段までしか対応しない）
+NESTED = {**ANALYSIS, "scores": {"impact": {"japan": 8, "global": 6}, "urgency": 5}}
+
+SENTENCES = [
+    "まず記事の要点を整理する。",
+    "設定例は {key: value} の形だが、これは JSON ではない。",
+    "出典[1]と[関連記事](https://example.com/a)を確認した。",
+    "重要度は {影響範囲} × {緊急度} で考える。",
+    "前回の会合では {rate: 0.25} だったが、今回は据え置き。",
+    "円相場への影響は限定的と見られる。",
+]
+
+
+def make_reasoning(rng: random.Random, kb: int) -> str:
+    parts, size = [], 0
+    while size < kb * 1024:
+        sentence = rng.choice(SENTENCES)
+        parts.append(sentence)
+        size += len(sentence.encode('utf-8'))
+    return ''.join(parts)
+
+
+def make_responses(reasoning_kb: int) -> Dict[str, Tuple[str, Any]]:
+    """名前 -> (応答テキスト, 取り出すべき値)"""
+    rng = random.Random(25)
+    encoded = json.dumps(ANALYSIS, ensure_ascii=False, indent=2)
+    return {
+        'fenced': (f"```json\n{encoded}\n```", ANALYSIS),
+        'reasoning + json': (f"<think>{make_reasoning(rng, reasoning_kb)}</think>\n{encoded}\n以上です。", ANALYSIS),
+        'nested json': (f"{make_reasoning(rng, reasoning_kb)}\n{json.dumps(NESTED, ensure_ascii=False)}", NESTED),
+    }
+
+
+def old_extract(content: str) -> str:
+    """置き換え前の実装（deepseek_processor / article_enhancer の _extract_json_from_response）"""
+    if "```json" in content:
+        try:
+            json_part = content.split("```json")[1].split("```")[0].strip()
+            if json_part and (json_part.startswith('{') or json_part.startswith('[')):
+                return json_part
+        except Exception:
+            pass
+
+    if "```" in content:
+        try:
+            json_part = content.split("```")[1].split("```")[0].strip()
+            if json_part and (json_part.startswith('{') or json_part.startswith('[')):
+                return json_part
+        except Exception:
+            pass
+
+    json_pattern = r'\{[^{}]*(?:\{[^{}]*\}[^{}]*)*\}'
+    for match in re.findall(json_pattern, content, re.DOTALL):
+        try:
+            json.loads(match.strip())
+            return match.strip()
+        except Exception:
+            continue
+
+    start_idx = content.find('{')
+    if start_idx != -1:
+        brace_count = 0
+        for i, char in enumerate(content[start_idx:], start_idx):
+            if char == '{':
+                brace_count += 1
+            elif char == '}':
+                brace_count -= 1
+                if brace_count == 0:
+                    potential_json = content[start_idx:i + 1]
+                    try:
+                        json.loads(potential_json)
+                        return potential_json
+                    except Exception:
+                        break
+
+    cleaned = content.strip()
+    cleaned = re.sub(r'^[^{]*({.*})[^}]*$', r'\1', cleaned, flags=re.DOTALL)
+    cleaned = re.sub(r'\n\s*', '', cleaned)
+    cleaned = re.sub(r',\s*}', '}', cleaned)
+    cleaned = re.sub(r',\s*]', ']', cleaned)
+    return cleaned
+
+
+def old_load(content: str):
+    return json.loads(old_extract(content))
+
+
+def measure(extract: Callable, content: str, expected: Any, repeat: int) -> str:
+    started = time.perf_counter()
+    try:
+        for _ in range(repeat):
+            value = extract(content)
+    except json.JSONDecodeError:
+        return f"{'failed':>10}"
+    elapsed = (time.perf_counter() - started) / repeat
+    mark = '' if value == expected else ' (wrong value)'
+    return f"{elapsed * 1000:8.2f} ms{mark}"
+
+
+def main():
+    parser = argparse.ArgumentParser(description="JSON extraction benchmark")
+    parser.add_argument('--reasoning-kb', type=int, default=50)
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    print(f"  {'response':<20} {'size':>8}   {'old extractor':<26} load_json_response")
+    for name, (content, expected) in make_responses(args.reasoning_kb).items():
+        old = measure(old_load, content, expected, args.repeat)
+        new = measure(load_json_response, content, expected, args.repeat)
+        print(f"  {name:<20} {len(content.encode('utf-8')) / 1024:6.0f} KB   {old:<26} {new}")
+
+
+if __name__ == "__main__":
+    main()
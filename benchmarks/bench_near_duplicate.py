@@ -0,0 +1,134 @@
+#!/usr/bin/env python3
+"""
+Near Duplicate Benchmark
+日本語・英語の合成タイトル（ユニーク記事 + 既知の言い換え）で、旧来の単語 Jaccard による
+総当たり比較と MinHash/LSH（near_duplicate.remove_near_duplicates）の速度と再現率を比べる
+
+使い方:
+    python benchmarks/bench_near_duplicate.py                    # 7000 + 4000 件
+    python benchmarks/bench_near_duplicate.py --skip-baseline    # 総当たり比較（数十秒〜）を省く
+"""
+
+import os
+import sys
+import time
+import random
+import argparse
+from typing import Dict, List, Tuple
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'deploy'))
+
+from near_duplicate import remove_near_duplicates
+
+JA_SUBJECTS = ['日銀', '政府', 'トヨタ', 'ソニー', '東京都', '気象庁', '文部科学省', '任天堂', 'JR東日本', '厚生労働省',
+               '大阪府', '経済産業省', 'ソフトバンク', '楽天', 'NTT', '日産', 'パナソニック', '防衛省', '国土交通省', '総務省']
+JA_OBJECTS = ['新型EV', '政策金利', '補正予算', '新作ゲーム', '運賃改定', '大雨警報', '入試制度', '半導体工場', '賃上げ',
+              '再生可能エネルギー', '生成AI', '観光客数', '物価指数', '防災計画', '医療費', '少子化対策', '宇宙開発', '量子計算機']
+JA_VERBS = ['を発表', 'を引き上げ', 'を決定', 'を公開', 'を見直し', 'を検討', 'を延期', 'に着手', 'を強化', 'を開始']
+JA_TAILS = ['、過去最高に', '、来年春から', '、専門家は慎重', '、市場に影響', '、前年比2割増', '、全国で初', '']
+
+EN_SUBJECTS = ['Apple', 'The Fed', 'Microsoft', 'NASA', 'The EU', 'Tesla', 'Google', 'Amazon', 'OpenAI', 'The UN',
+               'Samsung', 'Nvidia', 'The White House', 'Boeing', 'Meta', 'Intel']
+EN_VERBS = ['unveils', 'delays', 'expands', 'cuts', 'announces', 'approves', 'rejects', 'launches', 'probes', 'boosts']
+EN_OBJECTS = ['new chip', 'interest rates', 'climate deal', 'satellite network', 'AI model', 'trade rules',
+              'battery plant', 'privacy policy', 'moon mission', 'data center', 'layoff plan', 'price target']
+EN_TAILS = [' amid record demand', ' after talks stall', ' for 2026', ' in Europe', ' as shares fall', '']
+
+KATAKANA = 'アイウエオカキクケコサシスセソタチツテトナニヌネノハヒフヘホマミムメモヤユヨラリルレロワン'
+LETTERS = 'abcdefghijklmnopqrstuvwxyz'
+
+PREFIXES = ['【速報】', '【独自】', '[Update] ', 'BREAKING: ']
+SUFFIXES = [' - 共同通信', ' - NHKニュース', ' | Reuters', ' - BBC News', '（日経）']
+
+
+def make_titles(unique: int, variants: int, seed: int = 7) -> Tuple[List[Dict], int]:
+    """ユニーク記事と、そのいずれかの言い換え（variant）を混ぜて返す。戻り値の2つ目はユニーク記事の件数"""
+    rng = random.Random(seed)
+    titles = set()
+    while len(titles) < unique:
+        # 固有名詞に当たる部分はランダムにして、定型部分だけが共通するようにする
+        if rng.random() < 0.6:
+            name = ''.join(rng.choices(KATAKANA, k=rng.randint(4, 7)))
+            title = (f"{rng.choice(JA_SUBJECTS)}が「{name}」の{rng.choice(JA_OBJECTS)}{rng.choice(JA_VERBS)}"
+                     f"{rng.choice(JA_TAILS)}")
+        else:
+            name = ''.join(rng.choices(LETTERS, k=rng.randint(5, 9))).capitalize()
+            title = (f"{rng.choice(EN_SUBJECTS)} {rng.choice(EN_VERBS)} {name} {rng.choice(EN_OBJECTS)}"
+                     f"{rng.choice(EN_TAILS)}")
+        titles.add(title)
+
+    articles = [{'title': title, 'url': f"https://example.com/{i}", 'variant': False}
+                for i, title in enumerate(sorted(titles))]
+    rng.shuffle(articles)
+
+    for i in range(variants):
+        title = rng.choice(articles[:unique])['title']
+        edit = rng.randrange(6)
+        if edit == 0:
+            title = rng.choice(PREFIXES) + title
+        elif edit == 1:
+            title = title + rng.choice(SUFFIXES)
+        elif edit == 2:
+            title = f"「{title}」"
+        elif edit == 3:
+            title = title.replace('、', '　').replace(' ', '  ') + '！'
+        elif edit == 4:
+            title = title.upper() if title.isascii() else title.replace('が', 'が、')
+        else:
+            title = rng.choice(PREFIXES) + title + rng.choice(SUFFIXES)
+        articles.append({'title': title, 'url': f"https://mirror.example/{i}", 'variant': True})
+
+    head, tail = articles[:unique], articles[unique:]
+    rng.shuffle(tail)
+    return head + tail, unique
+
+
+def word_jaccard_dedupe(articles: List[Dict], threshold: float = 0.8) -> List[Dict]:
+    """置き換え前の実装（str.split() の単語集合を既出の全タイトルと比べる）"""
+    unique_articles = []
+    seen_titles = []
+    for article in articles:
+        words = set(article['title'].lower().split())
+        duplicate = False
+        for seen in seen_titles:
+            union = words | seen
+            if union and len(words & seen) / len(union) > threshold:
+                duplicate = True
+                break
+        if not duplicate:
+            unique_articles.append(article)
+            seen_titles.append(words)
+    return unique_articles
+
+
+def report(name: str, articles: List[Dict], kept: List[Dict], elapsed: float):
+    variants = sum(1 for article in articles if article['variant'])
+    kept_variants = sum(1 for article in kept if article['variant'])
+    false_drops = sum(1 for article in articles if not article['variant']) - (len(kept) - kept_variants)
+    recall = (variants - kept_variants) / variants if variants else 1.0
+    print(f"  {name:<28} {elapsed:8.2f} s   recall {recall:.3f}   {false_drops} false drops")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Near-duplicate title detection benchmark")
+    parser.add_argument('--unique', type=int, default=7000)
+    parser.add_argument('--variants', type=int, default=4000)
+    parser.add_argument('--skip-baseline', action='store_true', help="Skip the quadratic word Jaccard baseline")
+    args = parser.parse_args()
+
+    articles, unique = make_titles(args.unique, args.variants)
+    print(f"{len(articles)} titles: {unique} unique + {len(articles) - unique} variants")
+
+    if not args.skip_baseline:
+        started = time.perf_counter()
+        kept = word_jaccard_dedupe(articles)
+        report("old word Jaccard (0.8)", articles, kept, time.perf_counter() - started)
+
+    for threshold in (0.5, 0.6):
+        started = time.perf_counter()
+        kept = remove_near_duplicates(articles, threshold=threshold)
+        report(f"MinHash/LSH ({threshold})", articles, kept, time.perf_counter() - started)
+
+
+if __name__ == "__main__":
+    main()
@@ -16,23 +16,21 @@ from typing import Dict, List, Optional
 # Add current directory to path
 sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
 
-import httpx
+from deepseek_processor import DeepSeekProcessor
+from json_scanner import load_json_response
+from llm_stream import get_stream_metrics
 
 logger = logging.getLogger(__name__)
 
+# Articles shown on the page (newly enhanced ones first, then the previous run's)
+MAX_ARTICLES = 10
+
 class ArticleEnhancer:
     def __init__(self):
-        self.api_key = os.getenv("DEEPSEEK_API_KEY", "sk-9689ac1bcc6248cf842cc16816cd2829")
-        self.api_url = "https://api.deepseek.com/chat/completions"
-        self.model = "deepseek-reasoner"
-        
-        self.client = httpx.Client(
-            timeout=120.0,
-            headers={
-                "Authorization": f"Bearer {self.api_key}",
-                "Content-Type": "application/json"
-            }
-        )
+        # API 呼び出し（応答キャッシュ・スケジューラ・ストリーミング）は DeepSeekProcessor と共通
+        self.processor = DeepSeekProcessor()
+        self.scheduler = self.processor.scheduler
+        self.cache = self.processor.cache
     
     def enhance_article(self, article: Dict) -> Dict:
         """Enhance article with detailed analysis and fact-checking"""
@@ -109,17 +107,15 @@ class ArticleEnhancer:
             }}
             """
             
-            response = self.client.post(
-                self.api_url,
-                json={
-                    "model": self.model,
-                    "messages": [
-                        {"role": "system", "content": "あなたは経験豊富なジャーナリストです。正確で深い分析を行い、読者にとって価値のある情報を提供します。"},
-                        {"role": "user", "content": prompt}
-                    ],
-                    "temperature": 0.4,
-                    "max_tokens": 2500
-                }
+            response = self.processor.chat_completion(
+                [
+                    {"role": "system", "content": "あなたは経験豊富なジャーナリストです。正確で深い分析を行い、読者にとって価値のある情報を提供します。"},
+                    {"role": "user", "content": prompt}
+                ],
+                temperature=0.4,
+                max_tokens=2500,
+                timeout=120.0,
+                expect_json='object'
             )
             
             if response.status_code == 200:
@@ -128,8 +124,7 @@ class ArticleEnhancer:
                 
                 # JSON extraction
                 try:
-                    cleaned_content = self._extract_json_from_response(content)
-                    analysis = json.loads(cleaned_content)
+                    analysis = load_json_response(content)
                     
                     # Validate content length
                     total_length = sum(len(str(v)) for v in analysis.values() if isinstance(v, str))
@@ -150,56 +145,6 @@ class ArticleEnhancer:
             logger.error(f"Error in detailed analysis generation: {str(e)}")
             return None
     
-    def _extract_json_from_response(self, content: str) -> str:
-        """Extract JSON from DeepSeek response"""
-        import re
-        
-        # Strategy 1: Look for code blocks
-        if "```json" in content:
-            try:
-                json_part = content.split("```json")[1].split("```")[0].strip()
-                if json_part and json_part.startswith('{'):
-                    return json_part
-            except:
-                pass
-        
-        if "```" in content:
-            try:
-                json_part = content.split("```")[1].split("```")[0].strip()
-                if json_part and json_part.startswith('{'):
-                    return json_part
-            except:
-                pass
-        
-        # Strategy 2: Find JSON objects using regex
-        json_pattern = r'\{[^{}]*(?:\{[^{}]*\}[^{}]*)*\}'
-        matches = re.findall(json_pattern, content, re.DOTALL)
-        for match in matches:
-            try:
-                json.loads(match.strip())
-                return match.strip()
-            except:
-                continue
-        
-        # Strategy 3: Manual brace matching
-        start_idx = content.find('{')
-        if start_idx != -1:
-            brace_count = 0
-            for i, char in enumerate(content[start_idx:], start_idx):
-                if char == '{':
-                    brace_count += 1
-                elif char == '}':
-                    brace_count -= 1
-                    if brace_count == 0:
-                        potential_json = content[start_idx:i+1]
-                        try:
-                            json.loads(potential_json)
-                            return potential_json
-                        except:
-                            break
-        
-        return content.strip()
-    
     def _generate_fallback_enhancement(self, article: Dict) -> Dict:
         """Generate fallback enhancement when API fails"""
         category = article.get('category', '')
@@ -229,8 +174,7 @@ class ArticleEnhancer:
     
     def close(self):
         """Close HTTP client"""
-        if self.client:
-            self.client.close()
+        self.processor.close()
 
 
 class EnhancedRealNewsSystem:
@@ -249,7 +193,7 @@ class EnhancedRealNewsSystem:
         self.comment_system = AnonymousCommentSystem(data_dir)
         self.ranking_system = RankingSystem(self.comment_system)
         self.comment_generator = EnhancedCommentGenerator()
-        self.news_fetcher = RealNewsFetcher()
+        self.news_fetcher = RealNewsFetcher('enhanced_news')
         self.article_enhancer = ArticleEnhancer()
         self.realtime_rankings = RealtimeRankingsSystem()
     
@@ -260,18 +204,31 @@ class EnhancedRealNewsSystem:
             
             # Fetch real news
             logger.info("📡 Fetching real news from RSS feeds...")
-            real_articles = self.news_fetcher.fetch_all_feeds(max_per_feed=2)  # Reduced for better processing
+            real_articles = self.news_fetcher.fetch_all_feeds(max_per_feed=2, only_new=True)  # Reduced for better processing
             
-            if not real_articles:
+            previous_articles = self._load_previous_articles()
+            if not real_articles and not previous_articles:
                 logger.warning("No real articles fetched, using fallback")
                 real_articles = self._get_fallback_articles()
             
             # Enhance articles with detailed analysis
             logger.info("🔍 Enhancing articles with detailed analysis...")
+            target_articles = real_articles[:MAX_ARTICLES]  # Process top 10 articles (the rest wait for the next run)
+            results = self.article_enhancer.scheduler.map(self.article_enhancer.enhance_article, target_articles)
             enhanced_articles = []
-            for article in real_articles[:10]:  # Process top 10 articles
-                enhanced_article = self.article_enhancer.enhance_article(article)
+            for article, enhanced_article in zip(target_articles, results):
+                if isinstance(enhanced_article, Exception):
+                    article['enhanced_content'] = self.article_enhancer._generate_fallback_enhancement(article)
+                    article['content_enhanced'] = False
+                    enhanced_article = article
                 enhanced_articles.append(enhanced_article)
+            processed = [article for article in enhanced_articles
+                         if article.get('is_real_news') and article.get('content_enhanced')]
+            
+            # 前回までに詳細化した記事は取得し直さないので、新しい記事の後ろに並べて表示する
+            urls = {article['url'] for article in enhanced_articles}
+            enhanced_articles += [article for article in previous_articles if article['url'] not in urls]
+            enhanced_articles = enhanced_articles[:MAX_ARTICLES]
             
             # Initialize comments
             self._initialize_comments_for_articles(enhanced_articles)
@@ -300,6 +257,11 @@ class EnhancedRealNewsSystem:
             with open(articles_path, 'w', encoding='utf-8') as f:
                 json.dump(enhanced_articles, f, ensure_ascii=False, indent=2)
             
+            # 保存できた詳細化済みの記事だけを記録する（仮の詳細化の記事は次回もう一度処理する）
+            self.news_fetcher.commit_seen(processed)
+            
+            self.article_enhancer.cache.log_stats()
+            get_stream_metrics().log_stats()
             logger.info("🎉 Enhanced news system update completed!")
             
         except Exception as e:
@@ -309,6 +271,18 @@ class EnhancedRealNewsSystem:
             self.news_fetcher.close()
             self.article_enhancer.close()
     
+    def _load_previous_articles(self) -> List[Dict]:
+        """Load the articles enhanced by the previous run"""
+        try:
+            with open(self.data_dir / 'enhanced_articles.json', 'r', encoding='utf-8') as f:
+                articles = json.load(f)
+        except (OSError, ValueError):
+            return []
+        if not isinstance(articles, list):
+            return []
+        return [article for article in articles
+                if isinstance(article, dict) and article.get('is_real_news') and article.get('content_enhanced')]
+    
     def _initialize_comments_for_articles(self, articles: List[Dict]):
         """Initialize comments for articles"""
         existing_comments = self.comment_system._load_comments()
@@ -39,6 +39,14 @@ def get_log_directory():
     # Use system temp directory
     return Path(tempfile.gettempdir())
 
+def get_cache_directory():
+    """Get the directory for persistent fetch caches"""
+    # Check environment variable first
+    if 'CACHE_DIR' in os.environ:
+        return Path(os.environ['CACHE_DIR'])
+    
+    return Path.home() / '.cache' / 'news-ai-site'
+
 def get_backend_path():
     """Get the backend module path"""
     # Check environment variable first
@@ -74,8 +82,13 @@ def get_deploy_config():
 CONFIG = get_deploy_config()
 DATA_DIR = get_data_directory()
 LOG_DIR = get_log_directory()
+CACHE_DIR = get_cache_directory()
 BACKEND_PATH = get_backend_path()
 
+# フィード・HTML の解析に使うワーカープロセス数（0 でイベントループ内で解析）
+# プロセス内の取得処理すべてで1つのプールを共有する。解析は取得待ちの合間に収まるので少数で足りる
+PARSE_WORKERS = int(os.getenv('PARSE_WORKERS', min(2, os.cpu_count() or 1)))
+
 # API Configuration
 API_CONFIG = {
     'deepseek_api_key': os.getenv('DEEPSEEK_API_KEY', 'sk-9689ac1bcc6248cf842cc16816cd2829'),
@@ -83,6 +96,24 @@ API_CONFIG = {
     'deepseek_model': 'deepseek-reasoner'
 }
 
+# DeepSeek API 呼び出しの上限（llm_scheduler が全呼び出し元で共有する）
+LLM_CONFIG = {
+    'max_in_flight': int(os.getenv('LLM_MAX_IN_FLIGHT', '4')),
+    'requests_per_minute': int(os.getenv('LLM_REQUESTS_PER_MINUTE', '30')),
+    'tokens_per_minute': int(os.getenv('LLM_TOKENS_PER_MINUTE', '100000')),
+    # SSE で受け取り、JSON が閉じた時点で打ち切る。タイムアウトはチャンク間の無通信時間
+    'stream': os.getenv('LLM_STREAM', '1') != '0',
+    'stream_idle_timeout': float(os.getenv('LLM_STREAM_IDLE_TIMEOUT', '30'))
+}
+
+# LLM 応答キャッシュ（有効期限・最大サイズ）と節約額の計算に使う単価（USD / 100万トークン）
+LLM_CACHE_CONFIG = {
+    'ttl': int(os.getenv('LLM_CACHE_TTL', str(24 * 3600))),
+    'max_bytes': int(os.getenv('LLM_CACHE_MAX_BYTES', str(50 * 1024 * 1024))),
+    'input_price': float(os.getenv('LLM_INPUT_PRICE', '0.55')),
+    'output_price': float(os.getenv('LLM_OUTPUT_PRICE', '2.19'))
+}
+
 # Environment information
 ENV_INFO = {
     'platform': platform.system(),
@@ -91,6 +122,7 @@ ENV_INFO = {
     'is_windows': IS_WINDOWS,
     'data_dir': str(DATA_DIR),
     'log_dir': str(LOG_DIR),
+    'cache_dir': str(CACHE_DIR),
     'backend_path': BACKEND_PATH
 }
 
@@ -99,5 +131,6 @@ if __name__ == "__main__":
     print(f"Platform: {ENV_INFO['platform']}")
     print(f"Data Directory: {ENV_INFO['data_dir']}")
     print(f"Log Directory: {ENV_INFO['log_dir']}")
+    print(f"Cache Directory: {ENV_INFO['cache_dir']}")
     print(f"Backend Path: {ENV_INFO['backend_path']}")
     print(f"DeepSeek API Key: {'✅ Set' if API_CONFIG['deepseek_api_key'] else '❌ Not set'}")
\ No newline at end of file
@@ -8,11 +8,32 @@ import os
 import json
 import httpx
 import logging
-from typing import Dict, List, Optional
+from typing import Callable, Dict, List, Optional
 from datetime import datetime
 
+from config import LLM_CONFIG
+from json_scanner import iter_json_candidates, load_json_response
+from llm_cache import get_llm_cache, reply_has_json
+from llm_scheduler import estimate_tokens, get_llm_scheduler
+from llm_stream import get_stream_metrics, stream_chat_completion
+
 logger = logging.getLogger(__name__)
 
+# まとめて分析するときの1リクエストあたりの上限（記事部分の見積もりトークン数・記事数）
+BATCH_INPUT_TOKENS = 6000
+BATCH_MAX_ARTICLES = 8
+# 1記事あたりの出力トークン数（analyze_article の max_tokens と同じ）
+ANALYSIS_MAX_TOKENS = 500
+
+ANALYSIS_SYSTEM_PROMPT = "あなたは高度なニュース分析AIです。正確でバランスの取れた分析を提供します。"
+
+# chat_completion(expect_json=...) の値と、ストリームを打ち切る JSON の開き括弧・打ち切ってよい値
+# 配列は記事のオブジェクトが並んだものだけ（本文中の出典[1] などで打ち切らない）
+JSON_EXPECTATIONS = {
+    'object': ('{', lambda value: isinstance(value, dict)),
+    'array': ('[', lambda value: bool(value) and isinstance(value, list) and all(isinstance(item, dict) for item in value))
+}
+
 class DeepSeekProcessor:
     def __init__(self):
         self.api_key = os.getenv("DEEPSEEK_API_KEY", "sk-9689ac1bcc6248cf842cc16816cd2829")
@@ -26,6 +47,46 @@ class DeepSeekProcessor:
                 "Content-Type": "application/json"
             }
         )
+        self.scheduler = get_llm_scheduler()
+        self.cache = get_llm_cache()
+    
+    def chat_completion(self, messages: List[Dict], temperature: float, max_tokens: int,
+                        timeout: Optional[float] = None, expect_json: Optional[str] = None,
+                        is_valid: Optional[Callable[[Dict], bool]] = None) -> httpx.Response:
+        """
+        Call the chat completions API within the shared in-flight / per-minute budgets
+        Identical requests are answered from the shared response cache without using the budgets
+        All DeepSeek callers go through here (timeout overrides the client's for non-streaming calls)
+        
+        expect_json ('object' / 'array') is for callers that only read the first JSON value of the reply:
+        the stream is closed as soon as it is complete. Prose requests leave it unset and read to the end
+        
+        Only replies is_valid(body) accepts are cached; for expect_json it defaults to "the reply holds
+        such a JSON value", so an unparsable reply is requested again on the next run
+        """
+        payload = {
+            "model": self.model,
+            "messages": messages,
+            "temperature": temperature,
+            "max_tokens": max_tokens
+        }
+        if is_valid is None and expect_json:
+            openers, accept = JSON_EXPECTATIONS[expect_json]
+            is_valid = lambda body: reply_has_json(body, openers, accept)
+        return self.cache.get_or_call(payload, lambda: self._post(payload, timeout, expect_json),
+                                      variant=expect_json and f"json-{expect_json}", is_valid=is_valid)
+    
+    def _post(self, payload: Dict, timeout: Optional[float] = None,
+              expect_json: Optional[str] = None) -> httpx.Response:
+        with self.scheduler.request(estimate_tokens(payload["messages"], payload["max_tokens"])) as reservation:
+            if LLM_CONFIG['stream']:
+                openers, accept = JSON_EXPECTATIONS.get(expect_json, (None, None))
+                response = stream_chat_completion(self.client, self.api_url, payload, openers=openers, accept=accept)
+            else:
+                response = self.client.post(self.api_url, json=payload, timeout=timeout or self.client.timeout)
+            if response.status_code == 200:
+                reservation.settle(response.json().get('usage', {}).get('total_tokens'))
+        return response
     
     def analyze_article(self, article: Dict) -> Dict:
         """
@@ -62,17 +123,14 @@ class DeepSeekProcessor:
             必ずJSON形式のみで返答してください。
             """
             
-            response = self.client.post(
-                self.api_url,
-                json={
-                    "model": self.model,
-                    "messages": [
-                        {"role": "system", "content": "あなたは高度なニュース分析AIです。正確でバランスの取れた分析を提供します。"},
-                        {"role": "user", "content": prompt}
-                    ],
-                    "temperature": 0.3,
-                    "max_tokens": 500
-                }
+            response = self.chat_completion(
+                [
+                    {"role": "system", "content": ANALYSIS_SYSTEM_PROMPT},
+                    {"role": "user", "content": prompt}
+                ],
+                temperature=0.3,
+                max_tokens=ANALYSIS_MAX_TOKENS,
+                expect_json='object'
             )
             
             if response.status_code == 200:
@@ -81,23 +139,10 @@ class DeepSeekProcessor:
                 
                 # JSON部分を抽出してパース
                 try:
-                    # より強固なJSON抽出
-                    cleaned_content = self._extract_json_from_response(content)
-                    analysis = json.loads(cleaned_content)
+                    analysis = load_json_response(content)
                     
                     # 記事データと分析結果を統合
-                    return {
-                        **article,
-                        "ai_analysis": {
-                            "summary": analysis.get("summary", article.get("content", "")[:100]),
-                            "category": analysis.get("category", "その他"),
-                            "importance": analysis.get("importance", 5),
-                            "sentiment": analysis.get("sentiment", "neutral"),
-                            "keywords": analysis.get("keywords", []),
-                            "reasoning": analysis.get("reasoning", ""),
-                            "analyzed_at": datetime.utcnow().isoformat()
-                        }
-                    }
+                    return self._merge_analysis(article, analysis)
                 except json.JSONDecodeError:
                     logger.error(f"Failed to parse JSON from DeepSeek response: {content}")
                     return self._get_fallback_analysis(article)
@@ -109,6 +154,120 @@ class DeepSeekProcessor:
             logger.error(f"DeepSeek processing error: {str(e)}")
             return self._get_fallback_analysis(article)
     
+    def _merge_analysis(self, article: Dict, analysis: Dict) -> Dict:
+        """
+        Merge a parsed analysis into the article
+        """
+        return {
+            **article,
+            "ai_analysis": {
+                "summary": analysis.get("summary", article.get("content", "")[:100]),
+                "category": analysis.get("category", "その他"),
+                "importance": analysis.get("importance", 5),
+                "sentiment": analysis.get("sentiment", "neutral"),
+                "keywords": analysis.get("keywords", []),
+                "reasoning": analysis.get("reasoning", ""),
+                "analyzed_at": datetime.utcnow().isoformat()
+            }
+        }
+    
+    def _article_block(self, article_id: str, article: Dict) -> str:
+        is_japanese = article.get('language', '') == 'ja' or not article.get('needs_translation', True)
+        return f"""
+            [{article_id}]{" （日本語以外の記事です。翻訳が必要です）" if not is_japanese else ""}
+            - タイトル: {article.get('title', '')}
+            - 言語: {article.get('language', 'unknown')}
+            - ソース: {article.get('source', 'unknown')}
+            - 公開日: {article.get('published', '')}
+            - 内容: {article.get('content', '')}
+            - URL: {article.get('url', '')}
+            """
+    
+    def _plan_batches(self, articles: List[Dict]) -> List[List[int]]:
+        """
+        Pack article positions into batches that fit the per-request token budget
+        An article larger than the budget gets a batch of its own
+        """
+        batches, current, current_tokens = [], [], 0
+        for position, article in enumerate(articles):
+            tokens = len(self._article_block(f"a{position}", article))
+            if current and (current_tokens + tokens > BATCH_INPUT_TOKENS or len(current) >= BATCH_MAX_ARTICLES):
+                batches.append(current)
+                current, current_tokens = [], 0
+            current.append(position)
+            current_tokens += tokens
+        if current:
+            batches.append(current)
+        return batches
+    
+    def _analyze_batch(self, batch: List[Dict]) -> Dict[int, Dict]:
+        """
+        Analyze several articles in one request
+        Returns analyzed articles by their index in the batch; missing or unparsable items are left out
+        """
+        ids = [f"a{index + 1}" for index in range(len(batch))]
+        blocks = "".join(self._article_block(article_id, article) for article_id, article in zip(ids, batch))
+        prompt = f"""
+            以下の{len(batch)}件の実際のニュース記事をそれぞれ分析してください。
+            各記事は [a1] のような ID で区切られています。
+            {blocks}
+            記事ごとに以下の項目を含むJSONオブジェクトを作り、全記事分をJSON配列で返してください：
+            0. id: 記事の ID（例: "a1"）
+            1. title_ja: 日本語タイトル（30文字以内）
+            2. summary: 80-100文字の日本語要約
+            3. category: 技術/経済/健康/科学/スポーツ/政治/環境/文化/その他 から1つ選択
+            4. importance: 1-10の重要度スコア（グローバルな影響を考慮）
+            5. sentiment: positive/neutral/negative
+            6. keywords: 主要キーワード3-5個のリスト（日本語）
+            7. reasoning: なぜこの分類・スコアにしたのかの簡潔な説明
+            8. global_impact: このニュースのグローバルな影響の簡潔な説明
+            9. japan_relevance: 日本への影響や関連性
+            
+            必ずJSON配列のみで返答してください。
+            """
+        
+        response = self.chat_completion(
+            [
+                {"role": "system", "content": ANALYSIS_SYSTEM_PROMPT},
+                {"role": "user", "content": prompt}
+            ],
+            temperature=0.3,
+            max_tokens=ANALYSIS_MAX_TOKENS * len(batch),
+            expect_json='array',
+            # max_tokens で切れた配列も、読めた記事があれば使える
+            is_valid=lambda body: bool(self._extract_batch_results(body['choices'][0]['message']['content'], set(ids)))
+        )
+        if response.status_code != 200:
+            logger.error(f"DeepSeek API error: {response.status_code}")
+            return {}
+        
+        content = response.json()['choices'][0]['message']['content']
+        analyses = self._extract_batch_results(content, set(ids))
+        return {ids.index(article_id): self._merge_analysis(batch[ids.index(article_id)], analysis)
+                for article_id, analysis in analyses.items()}
+    
+    @staticmethod
+    def _extract_batch_results(content: str, ids: set) -> Dict[str, Dict]:
+        """
+        Collect every JSON object carrying a known id from a batched response
+        Works for a bare array, an array wrapped in an object or code fence, and an array cut off by max_tokens
+        """
+        results = {}
+        accepted_end = 0
+        for start, end in iter_json_candidates(content):
+            if start < accepted_end:
+                # 採用済みの記事の内側にあるオブジェクト
+                continue
+            try:
+                value = json.loads(content[start:end])
+            except json.JSONDecodeError:
+                continue
+            # ラッパーのオブジェクト（id を持たない）は読み捨て、続く内側の候補から記事を拾う
+            if isinstance(value, dict) and value.get('id') in ids:
+                results.setdefault(value['id'], value)
+                accepted_end = end
+        return results
+    
     def generate_detailed_article(self, article: Dict, target_length: int = 2000) -> Dict:
         """
         Generate a detailed article using DeepSeek-R1's advanced reasoning
@@ -163,17 +322,13 @@ class DeepSeekProcessor:
             深い推論と分析を含む、洞察に富んだ記事を作成してください。
             """
             
-            response = self.client.post(
-                self.api_url,
-                json={
-                    "model": self.model,
-                    "messages": [
-                        {"role": "system", "content": "あなたは経験豊富なジャーナリストであり、深い分析力を持つAIです。"},
-                        {"role": "user", "content": prompt}
-                    ],
-                    "temperature": 0.7,
-                    "max_tokens": 3000
-                }
+            response = self.chat_completion(
+                [
+                    {"role": "system", "content": "あなたは経験豊富なジャーナリストであり、深い分析力を持つAIです。"},
+                    {"role": "user", "content": prompt}
+                ],
+                temperature=0.7,
+                max_tokens=3000
             )
             
             if response.status_code == 200:
@@ -197,66 +352,6 @@ class DeepSeekProcessor:
             logger.error(f"DeepSeek detailed generation error: {str(e)}")
             return article
     
-    def _extract_json_from_response(self, content: str) -> str:
-        """
-        Extract JSON from DeepSeek response with multiple strategies
-        """
-        import re
-        
-        # Strategy 1: Look for code blocks
-        if "```json" in content:
-            try:
-                json_part = content.split("```json")[1].split("```")[0].strip()
-                if json_part and (json_part.startswith('{') or json_part.startswith('[')):
-                    return json_part
-            except:
-                pass
-        
-        if "```" in content:
-            try:
-                json_part = content.split("```")[1].split("```")[0].strip()
-                if json_part and (json_part.startswith('{') or json_part.startswith('[')):
-                    return json_part
-            except:
-                pass
-        
-        # Strategy 2: Find JSON objects using regex
-        json_pattern = r'\{[^{}]*(?:\{[^{}]*\}[^{}]*)*\}'
-        matches = re.findall(json_pattern, content, re.DOTALL)
-        for match in matches:
-            try:
-                # Test if it's valid JSON
-                json.loads(match.strip())
-                return match.strip()
-            except:
-                continue
-        
-        # Strategy 3: Look for JSON-like structure manually
-        start_idx = content.find('{')
-        if start_idx != -1:
-            brace_count = 0
-            for i, char in enumerate(content[start_idx:], start_idx):
-                if char == '{':
-                    brace_count += 1
-                elif char == '}':
-                    brace_count -= 1
-                    if brace_count == 0:
-                        potential_json = content[start_idx:i+1]
-                        try:
-                            json.loads(potential_json)
-                            return potential_json
-                        except:
-                            break
-        
-        # Strategy 4: Clean common issues and return as-is
-        cleaned = content.strip()
-        cleaned = re.sub(r'^[^{]*({.*})[^}]*$', r'\1', cleaned, flags=re.DOTALL)
-        cleaned = re.sub(r'\n\s*', '', cleaned)  # Remove newlines and indentation
-        cleaned = re.sub(r',\s*}', '}', cleaned)  # Remove trailing commas
-        cleaned = re.sub(r',\s*]', ']', cleaned)  # Remove trailing commas in arrays
-        
-        return cleaned
-
     def _get_fallback_analysis(self, article: Dict) -> Dict:
         """
         Fallback analysis when API fails
@@ -270,21 +365,41 @@ class DeepSeekProcessor:
                 "sentiment": "neutral",
                 "keywords": [],
                 "reasoning": "API接続エラーのため、基本的な分析のみ",
-                "analyzed_at": datetime.utcnow().isoformat()
+                "analyzed_at": datetime.utcnow().isoformat(),
+                "fallback": True
             }
         }
     
-    def batch_analyze(self, articles: List[Dict]) -> List[Dict]:
+    def batch_analyze(self, articles: List[Dict], batched: bool = True) -> List[Dict]:
         """
         Analyze multiple articles
+        With batched=True several articles share one request; items missing from a batch response are retried one by one
         """
-        analyzed_articles = []
-        for article in articles:
-            analyzed = self.analyze_article(article)
-            analyzed_articles.append(analyzed)
-            logger.info(f"Analyzed: {article.get('title', 'Unknown')}")
+        results: List[Optional[Dict]] = [None] * len(articles)
+        
+        if batched:
+            batches = self._plan_batches(articles)
+            responses = self.scheduler.map(self._analyze_batch, [[articles[i] for i in batch] for batch in batches])
+            for batch, analyzed in zip(batches, responses):
+                if isinstance(analyzed, Exception):
+                    continue
+                for index, analyzed_article in analyzed.items():
+                    results[batch[index]] = analyzed_article
         
-        return analyzed_articles
+        missing = [position for position, analyzed in enumerate(results) if analyzed is None]
+        if batched and missing:
+            logger.info(f"Retrying {len(missing)}/{len(articles)} articles individually")
+        for position, analyzed in zip(missing, self.scheduler.map(self.analyze_article, [articles[i] for i in missing])):
+            if isinstance(analyzed, Exception):
+                analyzed = self._get_fallback_analysis(articles[position])
+            results[position] = analyzed
+        
+        for analyzed in results:
+            if analyzed['ai_analysis'].get('fallback'):
+                logger.warning(f"Analysis failed, using fallback: {analyzed.get('title', 'Unknown')}")
+            else:
+                logger.info(f"Analyzed: {analyzed.get('title', 'Unknown')}")
+        return results
     
     def close(self):
         """
@@ -26,6 +26,14 @@ except ImportError:
     httpx = None
     BeautifulSoup = None
 
+from feed_consumer import FeedConsumerMixin
+from feed_state import FeedStateStore
+from fetch_engine import DEFAULT_DEADLINE, MIN_LATENCY_SAMPLES, FetchResult, adaptive_timeout
+from http_cache import ConditionalGetCache
+from near_duplicate import remove_near_duplicates
+from parse_executor import feed_entries, find_texts, get_parse_executor
+from rate_limiter import MAX_RETRY_AFTER, RateLimiter, parse_retry_after
+from seen_index import SeenArticleIndex
 from news_sources_extended import (
     NEWS_SOURCES, SNS_TREND_SOURCES, GLOBAL_NEWS_SOURCES,
     SPECIAL_CATEGORIES, RELIABILITY_SCORES, SENSITIVE_LEVELS,
@@ -34,34 +42,54 @@ from news_sources_extended import (
 
 logger = logging.getLogger(__name__)
 
-class ExtendedNewsFetcher:
-    def __init__(self):
+class FetchDeadlineExceeded(Exception):
+    """取得段階全体の締め切りを過ぎたため、リクエストを打ち切った（または出さなかった）"""
+
+
+class ExtendedNewsFetcher(FeedConsumerMixin):
+    def __init__(self, seen_namespace: str = 'extended_news_fetcher',
+                 deadline: Optional[float] = DEFAULT_DEADLINE):
         if httpx is None:
             raise ImportError("httpx library is required")
         
+        self.timeout = 30.0
         self.client = httpx.AsyncClient(
-            timeout=30.0,
+            timeout=self.timeout,
             headers={
                 'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36'
             }
         )
+        self.http_cache = ConditionalGetCache()
+        self.seen_index = SeenArticleIndex(seen_namespace)
+        self.feed_state = FeedStateStore()
+        # feedparser / BeautifulSoup の解析はワーカープロセスで行い、取得中のリクエストを止めない
+        self.parse_executor = get_parse_executor()
+        
+        # Rate limiting（ソース種別・ホストごとのトークンバケット）
+        self.rate_limiter = RateLimiter()
+        self.max_retries = 2
         
-        # Rate limiting
-        self.rate_limits = {
-            'youtube': {'calls': 0, 'reset_time': time.time() + 3600, 'max_calls': 100},
-            'twitter': {'calls': 0, 'reset_time': time.time() + 900, 'max_calls': 15},
-            'reddit': {'calls': 0, 'reset_time': time.time() + 60, 'max_calls': 60},
-            'default': {'calls': 0, 'reset_time': time.time() + 60, 'max_calls': 30}
-        }
+        # ホストごとの過去のレイテンシ。タイムアウトを p99 から決めるのに使う
+        self.host_latency = self.feed_state.host_latency(MIN_LATENCY_SAMPLES)
+        
+        # 取得段階全体の締め切り。過ぎたらそれまでに集まった記事だけで続ける
+        self.deadline = deadline
+        self._deadline_at: Optional[float] = None
+        self.deadline_cancelled = 0
         
         self.trending_keywords = {}
         self.viral_threshold = 1000  # ソーシャルメトリクス閾値
         
-    async def fetch_all_extended_feeds(self, max_per_category: int = 3) -> List[Dict]:
+    async def fetch_all_extended_feeds(self, max_per_category: int = 3, only_new: bool = False) -> List[Dict]:
         """
         全拡張カテゴリからニュースを収集
+        only_new: 前回までの実行で取得済みの記事を除き、新規・変更のあった記事だけを返す
+                  処理を終えた記事は commit_seen() で記録する（記録するまでは次回も新規として返る）
+        締め切り（deadline 秒）を過ぎた取得は打ち切り、それまでに取得できた記事を返す
         """
         all_articles = []
+        self._deadline_at = time.monotonic() + self.deadline if self.deadline else None
+        self.deadline_cancelled = 0
         
         # メインニュースソース
         for category, sources in NEWS_SOURCES.items():
@@ -88,8 +116,16 @@ class ExtendedNewsFetcher:
         unique_articles = self._remove_duplicates_advanced(all_articles)
         sorted_articles = self._sort_by_viral_score(unique_articles)
         
+        if self.deadline_cancelled:
+            logger.warning(f"Fetch deadline reached: returning partial results, "
+                           f"{self.deadline_cancelled} requests cancelled at the {self.deadline:.0f}s fetch deadline")
         logger.info(f"Collected {len(sorted_articles)} unique articles from 100+ sources")
-        return sorted_articles
+        self.http_cache.log_stats()
+        limiter_levels = self.rate_limiter.levels()
+        logger.info(f"Rate limiter: waited {limiter_levels['waited_seconds']}s in total, "
+                    f"{limiter_levels['throttled']} back-off(s) requested by servers")
+        
+        return self._select_new(sorted_articles, only_new)
     
     async def _fetch_category_sources(self, sources: List[Dict], category: str, max_items: int) -> List[Dict]:
         """
@@ -97,9 +133,9 @@ class ExtendedNewsFetcher:
         """
         tasks = []
         for source in sources[:10]:  # レート制限対策で10ソースまで
-            if self._check_rate_limit(self._get_source_type(source['url'])):
-                task = self._fetch_single_source(source, category, max_items)
-                tasks.append(task)
+            # 上限を超える分は捨てずに _rate_limited_get の中で順番を待つ
+            task = self._fetch_single_source(source, category, max_items)
+            tasks.append(task)
         
         results = await asyncio.gather(*tasks, return_exceptions=True)
         
@@ -117,12 +153,19 @@ class ExtendedNewsFetcher:
         単一ソースからの記事取得
         """
         try:
-            response = await self.client.get(source['url'])
+            # 失敗の続くソースは待たずに飛ばし、更新の遅いソースは前回の本文を使う
+            reason = self.feed_state.skip_reason(source['url'])
+            if reason == 'circuit open':
+                logger.info(f"Skipping {source['url']}: circuit open")
+                return []
+            response = self.http_cache.cached_response(source['url']) if reason == 'not due' else None
+            if response is None:
+                response = await self._rate_limited_get(source['url'], source=source)
             response.raise_for_status()
             
             articles = []
             if source['url'].endswith('.xml') or 'rss' in source['url']:
-                articles = self._parse_rss_feed(response.text, source, category, max_items)
+                articles = await self._parse_rss_feed(response.content, source, category, max_items)
             else:
                 # HTMLスクレイピング
                 articles = await self._scrape_html_content(response.text, source, category, max_items)
@@ -135,38 +178,35 @@ class ExtendedNewsFetcher:
             
             return articles
             
+        except FetchDeadlineExceeded:
+            return []
         except Exception as e:
             logger.error(f"Failed to fetch {source['url']}: {str(e)}")
             return []
     
-    def _parse_rss_feed(self, xml_content: str, source: Dict, category: str, max_items: int) -> List[Dict]:
+    async def _parse_rss_feed(self, xml_content: bytes, source: Dict, category: str, max_items: int) -> List[Dict]:
         """
-        RSS/XMLフィードの解析
+        RSS/XMLフィードの解析（feedparser はワーカープロセスで実行）
         """
         articles = []
         
         try:
-            if feedparser:
-                feed = feedparser.parse(xml_content)
-                entries = feed.entries[:max_items]
-                
-                for entry in entries:
-                    article = {
-                        'id': hashlib.md5(f"{entry.get('link', '')}{entry.get('title', '')}".encode()).hexdigest()[:8],
-                        'title': entry.get('title', '').strip(),
-                        'url': entry.get('link', ''),
-                        'content': self._clean_html(entry.get('summary', entry.get('description', ''))),
-                        'source': source['name'],
-                        'language': source['lang'],
-                        'category': category,
-                        'published': self._parse_date(entry.get('published', '')),
-                        'fetch_timestamp': datetime.utcnow().isoformat(),
-                        'needs_translation': source['lang'] != 'ja'
-                    }
-                    articles.append(article)
-            else:
-                # フォールバック: 基本XML解析
-                articles = self._parse_xml_basic(xml_content, source, category, max_items)
+            entries = await self.parse_executor.run(feed_entries, xml_content, max_items)
+            
+            for entry in entries:
+                article = {
+                    'id': hashlib.md5(f"{entry.get('link', '')}{entry.get('title', '')}".encode()).hexdigest()[:8],
+                    'title': entry.get('title', '').strip(),
+                    'url': entry.get('link', ''),
+                    'content': self._clean_html(entry.get('summary', entry.get('description', ''))),
+                    'source': source['name'],
+                    'language': source['lang'],
+                    'category': category,
+                    'published': self._parse_date(entry.get('published', '')),
+                    'fetch_timestamp': datetime.utcnow().isoformat(),
+                    'needs_translation': source['lang'] != 'ja'
+                }
+                articles.append(article)
                 
         except Exception as e:
             logger.error(f"RSS parsing error: {str(e)}")
@@ -231,20 +271,15 @@ class ExtendedNewsFetcher:
         """
         trends = []
         
-        if not self._check_rate_limit('twitter'):
-            return trends
-            
         try:
             # Yahoo!リアルタイム検索をスクレイピング
             url = 'https://search.yahoo.co.jp/realtime'
-            response = await self.client.get(url)
+            response = await self._rate_limited_get(url, source_type='twitter', use_cache=False)
             
             if BeautifulSoup:
-                soup = BeautifulSoup(response.text, 'html.parser')
-                trend_elements = soup.find_all('a', class_='trendword')
+                keywords = await self.parse_executor.run(find_texts, response.text, 'a', 'trendword', 10)
                 
-                for element in trend_elements[:10]:
-                    keyword = element.get_text().strip()
+                for keyword in keywords:
                     if keyword:
                         trend_article = {
                             'id': hashlib.md5(f"trend_{keyword}_{datetime.utcnow()}".encode()).hexdigest()[:8],
@@ -273,15 +308,12 @@ class ExtendedNewsFetcher:
         """
         trends = []
         
-        if not self._check_rate_limit('youtube'):
-            return trends
-            
         try:
             # YouTubeチャンネルのRSSフィードから
             youtube_sources = SNS_TREND_SOURCES['youtube_sources']
             
             for source in youtube_sources[:5]:  # レート制限
-                response = await self.client.get(source['url'])
+                response = await self._rate_limited_get(source['url'], source_type='youtube')
                 if response.status_code == 200:
                     videos = self._parse_youtube_rss(response.text, source)
                     trends.extend(videos)
@@ -355,16 +387,15 @@ class ExtendedNewsFetcher:
         for region, sources in SNS_TREND_SOURCES['gossip_sources'].items():
             for source in sources[:3]:  # 各地域3ソースまで
                 try:
-                    if self._check_rate_limit('default'):
-                        articles = await self._fetch_single_source(source, 'gossip', 3)
+                    articles = await self._fetch_single_source(source, 'gossip', 3)
+                    
+                    # ゴシップ系は特別な処理
+                    for article in articles:
+                        article['gossip_region'] = region
+                        article['fact_checked'] = False
+                        article['controversy_level'] = self._assess_controversy_level(article)
                         
-                        # ゴシップ系は特別な処理
-                        for article in articles:
-                            article['gossip_region'] = region
-                            article['fact_checked'] = False
-                            article['controversy_level'] = self._assess_controversy_level(article)
-                            
-                        gossip_articles.extend(articles)
+                    gossip_articles.extend(articles)
                         
                 except Exception as e:
                     logger.error(f"Gossip source error: {str(e)}")
@@ -497,66 +528,77 @@ class ExtendedNewsFetcher:
         """
         高度な重複除去（タイトル類似度も考慮）
         """
-        unique = []
-        seen_urls = set()
-        seen_titles = set()
-        
-        for article in articles:
-            url = article.get('url', '')
-            title = article.get('title', '').lower()
-            
-            # URL重複チェック
-            if url and url in seen_urls:
-                continue
-                
-            # タイトル類似度チェック（簡易版）
-            is_similar = False
-            for seen_title in seen_titles:
-                if self._calculate_title_similarity(title, seen_title) > 0.8:
-                    is_similar = True
-                    break
-            
-            if not is_similar:
-                unique.append(article)
-                if url:
-                    seen_urls.add(url)
-                seen_titles.add(title)
-        
-        return unique
+        # 文字 n-gram の MinHash/LSH で候補を絞るので、全タイトル同士の比較は不要
+        return remove_near_duplicates(articles)
     
-    def _calculate_title_similarity(self, title1: str, title2: str) -> float:
+    async def _rate_limited_get(self, url: str, source_type: Optional[str] = None,
+                                use_cache: bool = True, source: Optional[Dict] = None) -> 'httpx.Response':
         """
-        タイトル類似度の計算（簡易版）
+        レート制限のトークンを待ってから取得する
+        429 / 503 は Retry-After（なければ指数バックオフ）の間ホストを止めて取り直す
+        source を渡すと最終的な結果をフィードの健全性として記録する（待ち時間はレイテンシに含めない）
+        取得段階の締め切りを過ぎると、トークン待ちや取得中のリクエストも打ち切って FetchDeadlineExceeded
+        （締め切りによる打ち切りはフィードの健全性には数えない）
         """
-        words1 = set(title1.split())
-        words2 = set(title2.split())
-        
-        if not words1 or not words2:
-            return 0.0
+        request = self._get_with_retries(url, source_type, use_cache, source)
+        if self._deadline_at is None:
+            return await request
         
-        intersection = words1.intersection(words2)
-        union = words1.union(words2)
-        
-        return len(intersection) / len(union) if union else 0.0
+        remaining = self._deadline_at - time.monotonic()
+        if remaining > 0:
+            try:
+                return await asyncio.wait_for(request, remaining)
+            except asyncio.TimeoutError:
+                if time.monotonic() < self._deadline_at:
+                    raise  # ホストごとのタイムアウト
+        else:
+            request.close()
+        self.deadline_cancelled += 1
+        raise FetchDeadlineExceeded(f"cancelled at the {self.deadline:.0f}s fetch deadline: {url}")
     
-    def _check_rate_limit(self, source_type: str) -> bool:
-        """
-        レート制限チェック
-        """
-        current_time = time.time()
-        limit_info = self.rate_limits.get(source_type, self.rate_limits['default'])
-        
-        # リセット時間チェック
-        if current_time > limit_info['reset_time']:
-            limit_info['calls'] = 0
-            limit_info['reset_time'] = current_time + (3600 if source_type == 'youtube' else 900)
-        
-        # コール数チェック
-        if limit_info['calls'] >= limit_info['max_calls']:
-            return False
-        
-        limit_info['calls'] += 1
-        return True
+    async def _get_with_retries(self, url: str, source_type: Optional[str], use_cache: bool,
+                                source: Optional[Dict]) -> 'httpx.Response':
+        source_type = source_type or self._get_source_type(url)
+        host = urlparse(url).netloc
+        
+        for attempt in range(self.max_retries + 1):
+            await self.rate_limiter.acquire(source_type, host)
+            started = time.perf_counter()
+            timeout = adaptive_timeout(self.host_latency.get(host), self.timeout)
+            try:
+                if use_cache:
+                    request = self.http_cache.get(self.client, url)
+                else:
+                    request = self.client.get(url)
+                response = await asyncio.wait_for(request, timeout)
+            except asyncio.TimeoutError:
+                if source:
+                    await asyncio.to_thread(self.feed_state.record_result, url, FetchResult(
+                        source=source, error=f"Timeout after {timeout:.1f}s", elapsed=time.perf_counter() - started))
+                raise
+            except Exception as e:
+                if source:
+                    await asyncio.to_thread(self.feed_state.record_result, url, FetchResult(
+                        source=source, error=f"{type(e).__name__}: {e}", elapsed=time.perf_counter() - started))
+                raise
+            elapsed = time.perf_counter() - started
+            
+            if response.status_code not in (429, 503):
+                break
+            
+            delay = parse_retry_after(response.headers.get('retry-after'))
+            if delay is None:
+                delay = 5.0 * 2 ** attempt
+            self.rate_limiter.throttle(source_type, host, min(delay, MAX_RETRY_AFTER))
+            if delay > MAX_RETRY_AFTER:
+                # 長すぎる待ち時間は次回の実行に回す
+                break
+        
+        if source:
+            # SQLite への書き込みはイベントループの外で行い、並行中の取得を止めない
+            await asyncio.to_thread(self.feed_state.record_result, url,
+                                    FetchResult(source=source, response=response, elapsed=elapsed))
+        return response
     
     def _get_source_type(self, url: str) -> str:
         """
@@ -608,6 +650,8 @@ class ExtendedNewsFetcher:
         クライアントのクローズ
         """
         await self.client.aclose()
+        self.seen_index.close()
+        self.feed_state.close()
 
 # 使用例
 async def main():
@@ -0,0 +1,114 @@
+#!/usr/bin/env python3
+"""
+Feed Consumer
+フィードを取得して記事にするクラス（NewsFetcher / RealNewsFetcher / ExtendedNewsFetcher）の共通部分
+取得済み記事の判定（only_new）と記録（commit_seen）、エンジンで取得したフィードの解析を受け持つ
+
+各フィードで取り込んだ最新エントリ（ウォーターマーク）も commit_seen() まで保留し、
+そのフィードから受け取った新規記事がすべて記録されたときに、取得済み記事と同じ namespace で保存する
+（取得後に処理が失敗した場合や、同じフィードを別の利用者が先に取得した場合に、次回のパースが
+未処理の記事の手前で打ち切られないように）
+"""
+
+import logging
+from typing import Dict, List, Optional, Set, Tuple
+
+from feed_parser import parse_entries
+from feed_state import feedparser_entry_marker
+from fetch_engine import FetchResult
+
+logger = logging.getLogger(__name__)
+
+
+def _article_key(article: Dict) -> str:
+    return article.get('url') or article.get('title', '')
+
+
+class FeedConsumerMixin:
+    """使う側は self.seen_index（SeenArticleIndex）を持つ
+
+    フィードを fetch_engine で取得するクラスは、さらに self.feed_state（FeedStateStore）と
+    self.fetch_engine（FeedFetchEngine）を持ち、エントリを記事にする _article_from_entry() を実装する
+    """
+
+    def _select_new(self, articles: List[Dict], only_new: bool) -> List[Dict]:
+        """only_new のときは前回までの実行で処理済みの記事を除く（記録は commit_seen() まで行わない）"""
+        selected = self.seen_index.classify(articles) if only_new else articles
+        # 重複除去や既読で落ちた記事は、ウォーターマークを進める前に処理を待つ必要がない
+        keys = {_article_key(article) for article in selected}
+        for _, _, waiting in self._pending_watermarks().values():
+            waiting &= keys
+        return selected
+
+    def commit_seen(self, articles: List[Dict]):
+        """
+        only_new で受け取った記事を、後段の処理が成功したあとで取得済みとして記録する
+        受け取った新規記事がすべて記録されたフィードは、ウォーターマークも進める
+        """
+        self.seen_index.commit(articles)
+        committed = {_article_key(article) for article in articles}
+        pending = self._pending_watermarks()
+        for feed_url, (source, marker, waiting) in list(pending.items()):
+            waiting -= committed
+            if not waiting:
+                self.feed_state.set_watermark(feed_url, *marker, feed_name=source['name'],
+                                              namespace=self.seen_index.namespace)
+                del pending[feed_url]
+
+    def _pending_watermarks(self) -> Dict[str, Tuple[Dict, Tuple, Set[str]]]:
+        """フィード URL -> (ソース, 最新エントリの目印, 記録を待っている記事のキー)"""
+        return self.__dict__.setdefault('_pending_feed_watermarks', {})
+
+    def _article_from_entry(self, entry, source: Dict) -> Optional[Dict]:
+        raise NotImplementedError
+
+    def _fetch_feed_articles(self, sources: List[Dict], max_items: int,
+                             stop_at_watermark: bool = False) -> List[Dict]:
+        """全フィードを並行取得し（受信しながら必要な件数だけ解析する）、登録順に記事にする"""
+        parse = lambda source: self._entry_options(source, max_items, stop_at_watermark)
+        all_articles = []
+        for result in self.fetch_engine.fetch_all_sync(sources, parse=parse):
+            articles = self._parse_feed_response(result, max_items, stop_at_watermark)
+            all_articles.extend(articles)
+            logger.info(f"Fetched {len(articles)} articles from {result.source['name']}")
+        return all_articles
+
+    def _entry_options(self, source: Dict, max_items: int, stop_at_watermark: bool = False) -> Dict:
+        """
+        フィードを解析する件数と打ち切り条件（受信しながら解析する場合も取得後に解析する場合も同じ）
+        """
+        watermark = (self.feed_state.get_watermark(source['url'], self.seen_index.namespace)
+                     if stop_at_watermark else None)
+        # 前回取り込んだ最新エントリに達したら、それ以降は既読なのでパースしない
+        stop = (lambda entry: watermark.covers(*feedparser_entry_marker(entry))) if watermark else None
+        return {'max_items': max_items, 'stop': stop}
+
+    def _parse_feed_response(self, result: FetchResult, max_items: int, stop_at_watermark: bool = False) -> List[Dict]:
+        """
+        Parse the response of a single feed fetched by the engine
+        """
+        source = result.source
+        articles = []
+
+        try:
+            result.raise_for_status()
+            # 受信しながら解析していない本文（304 や更新の遅いフィードで再利用した本文）はここで解析する
+            entries = result.entries
+            if entries is None:
+                entries = parse_entries(result.content, **self._entry_options(source, max_items, stop_at_watermark))
+
+            for entry in entries:
+                article = self._article_from_entry(entry, source)
+                if article:
+                    articles.append(article)
+
+            if entries:
+                # 記事の処理が終わるまで保留し、commit_seen() で記録する
+                self._pending_watermarks()[source['url']] = (
+                    source, feedparser_entry_marker(entries[0]), {_article_key(article) for article in articles}
+                )
+
+        except Exception as e:
+            logger.error(f"Failed to fetch {source['url']}: {str(e)}")
+
+        return articles
@@ -0,0 +1,311 @@
+#!/usr/bin/env python3
+"""
+Streaming Feed Parser
+xml.etree.ElementTree の pull パーサで RSS 2.0 / RSS 1.0 (RDF) / Atom を逐次解析する
+必要な件数に達した時点（またはウォーターマークに達した時点）で読み込みをやめ、
+処理済みの要素は都度破棄するので、大きなフィードでも全体を木として保持しない
+取得中のレスポンス（client.stream()）は届いたチャンクから解析し、必要なエントリが揃えば残りを受信しない
+"""
+
+import re
+import time
+import codecs
+import logging
+import xml.etree.ElementTree as ET
+from typing import Callable, List, Optional
+
+try:
+    import feedparser
+except ImportError:
+    feedparser = None
+
+try:
+    import httpx
+except ImportError:
+    httpx = None
+
+from feed_state import parse_timestamp
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_MAX_BYTES = 5 * 1024 * 1024
+CHUNK_SIZE = 64 * 1024
+
+ITEM_TAGS = {'item', 'entry'}
+
+# エントリ内の要素名（名前空間を除いたもの）→ FeedItem のキー。先に現れたものを優先
+FIELD_TAGS = {
+    'title': 'title',
+    'guid': 'id',
+    'id': 'id',
+    'description': 'summary',
+    'summary': 'summary',
+    'encoded': 'content',
+    'content': 'content',
+    'pubDate': 'published',
+    'published': 'published',
+    'date': 'published',
+    'updated': 'updated',
+}
+
+# expat が直接扱えるエンコーディング。それ以外（Shift_JIS など）は UTF-8 に変換してから渡す
+EXPAT_ENCODINGS = {'utf-8', 'utf8', 'us-ascii', 'ascii', 'iso-8859-1', 'latin-1', 'latin1', 'utf-16'}
+
+_DECLARATION_PATTERN = re.compile(rb'^(\s*<\?xml[^>]*?encoding=["\'])([A-Za-z0-9_.:-]+)(["\'])')
+
+
+class FeedItem(dict):
+    """feedparser のエントリと同じく entry.get('title') / entry.summary の両方で参照できる dict"""
+    
+    def __getattr__(self, name):
+        try:
+            return self[name]
+        except KeyError:
+            raise AttributeError(name)
+
+
+def _local_name(tag: str) -> str:
+    return tag.rsplit('}', 1)[-1] if isinstance(tag, str) else ''
+
+def _element_text(elem) -> str:
+    return ''.join(elem.itertext()).strip()
+
+def _build_item(elem) -> FeedItem:
+    item = FeedItem()
+    
+    # RDF の item は rdf:about 属性が識別子
+    about = elem.get('{http://www.w3.org/1999/02/22-rdf-syntax-ns#}about')
+    if about:
+        item['id'] = about
+    
+    for child in elem:
+        name = _local_name(child.tag)
+        if name == 'link':
+            # Atom は <link rel="alternate" href="..."/>、RSS/RDF は要素のテキスト
+            href = child.get('href')
+            if href is not None:
+                if child.get('rel', 'alternate') == 'alternate' and 'link' not in item:
+                    item['link'] = href
+            elif 'link' not in item and child.text:
+                item['link'] = child.text.strip()
+            continue
+        
+        key = FIELD_TAGS.get(name)
+        if key and key not in item:
+            item[key] = _element_text(child)
+    
+    if 'summary' not in item and 'content' in item:
+        item['summary'] = item['content']
+    if 'published' not in item and 'updated' in item:
+        item['published'] = item['updated']
+    if 'id' not in item and 'link' in item:
+        item['id'] = item['link']
+    
+    for key in ('published', 'updated'):
+        if item.get(key):
+            timestamp = parse_timestamp(item[key])
+            if timestamp is not None:
+                item[f'{key}_parsed'] = time.gmtime(timestamp)
+    
+    return item
+
+class _Transcoder:
+    """XML 宣言のエンコーディングが expat 非対応なら、受け取ったチャンクを UTF-8 に変換して返す"""
+    
+    def __init__(self):
+        self._head = b''
+        self._started = False
+        self._decoder = None
+    
+    def feed(self, chunk: bytes) -> bytes:
+        if self._started:
+            return self._decoder.decode(chunk).encode('utf-8') if self._decoder else chunk
+        self._head += chunk
+        if b'>' not in self._head and len(self._head) <= 1024:
+            return b''
+        return self._start()
+    
+    def flush(self) -> bytes:
+        if not self._started:
+            return self._start()
+        return self._decoder.decode(b'', final=True).encode('utf-8') if self._decoder else b''
+    
+    def _start(self) -> bytes:
+        head, self._head = self._head, b''
+        self._started = True
+        match = _DECLARATION_PATTERN.match(head)
+        encoding = match.group(2).decode('ascii').lower() if match else 'utf-8'
+        if encoding in EXPAT_ENCODINGS:
+            return head
+        try:
+            self._decoder = codecs.getincrementaldecoder(encoding)(errors='replace')
+        except LookupError:
+            return head
+        head = _DECLARATION_PATTERN.sub(rb'\g<1>utf-8\g<3>', head, count=1)
+        return self._decoder.decode(head).encode('utf-8')
+
+
+class FeedStreamParser:
+    """feed() でバイト列のチャンクを受け取りながらエントリを取り出す
+    
+    max_items 件に達するか、stop(item) が True を返すエントリに達すると done になり、以降の入力は不要
+    入力が max_bytes を超えた場合や途中で壊れていた場合も、それまでに取り出せたエントリがあれば done
+    1件も取り出せないまま壊れていた場合は done にならず（寛容なパーサで読み直すために本文は最後まで要る）、
+    finish() が ET.ParseError を送出する
+    """
+    
+    def __init__(self, max_items: Optional[int] = None, max_bytes: int = DEFAULT_MAX_BYTES,
+                 stop: Optional[Callable[[FeedItem], bool]] = None):
+        self.max_items = max_items
+        self.max_bytes = max_bytes
+        self.stop = stop
+        self.items: List[FeedItem] = []
+        self.done = max_items is not None and max_items <= 0
+        self.error: Optional[ET.ParseError] = None
+        self._parser = ET.XMLPullParser(events=('start', 'end'))
+        self._transcoder = _Transcoder()
+        self._stack = []
+        self._received = 0
+    
+    def feed(self, chunk: bytes) -> List[FeedItem]:
+        """チャンクを解析し、新たに取り出せたエントリを返す"""
+        if self.done or self.error is not None:
+            return []
+        self._received += len(chunk)
+        if self._received > self.max_bytes:
+            logger.warning(f"Stopped parsing feed: feed exceeds {self.max_bytes} bytes")
+            self.done = True
+            return []
+        return self._parse(self._transcoder.feed(chunk))
+    
+    def finish(self) -> List[FeedItem]:
+        """入力の終わり（または done で打ち切った時点）で、取り出したエントリを返す"""
+        if not self.done and self.error is None:
+            self._parse(self._transcoder.flush())
+            if not self.done and self.error is None:
+                try:
+                    self._parser.close()
+                except ET.ParseError as e:
+                    self.error = e
+        if self.error is not None:
+            if not self.items:
+                raise self.error
+            logger.warning(f"Feed is malformed after {len(self.items)} entries, using the entries parsed so far")
+        return self.items
+    
+    def _parse(self, data: bytes) -> List[FeedItem]:
+        produced = len(self.items)
+        try:
+            self._parser.feed(data)
+            for event, elem in self._parser.read_events():
+                if event == 'start':
+                    self._stack.append(elem)
+                    continue
+                
+                self._stack.pop()
+                if _local_name(elem.tag) not in ITEM_TAGS:
+                    continue
+                
+                item = _build_item(elem)
+                # 処理済みのエントリは親から外して破棄する
+                elem.clear()
+                if self._stack:
+                    self._stack[-1].remove(elem)
+                
+                if self.stop is not None and self.stop(item):
+                    self.done = True
+                    break
+                self.items.append(item)
+                if self.max_items is not None and len(self.items) >= self.max_items:
+                    self.done = True
+                    break
+        except ET.ParseError as e:
+            # 途中で壊れているフィードは、そこまでに読めたエントリを使う
+            self.error = e
+            self.done = bool(self.items)
+        return self.items[produced:]
+
+
+def _feed_content(parser: FeedStreamParser, content: bytes) -> FeedStreamParser:
+    for i in range(0, len(content), CHUNK_SIZE):
+        parser.feed(content[i:i + CHUNK_SIZE])
+        if parser.done:
+            break
+    return parser
+
+def parse_feed(content: bytes, max_items: Optional[int] = None,
+               max_bytes: int = DEFAULT_MAX_BYTES,
+               stop: Optional[Callable[[FeedItem], bool]] = None) -> List[FeedItem]:
+    """取得済みの本文をチャンクに分けて FeedStreamParser に流す
+    
+    サイズ超過や途中で壊れている場合はそこまでに読めたエントリを返す
+    1件も読めないほど壊れている場合は ET.ParseError を送出する
+    """
+    return _feed_content(FeedStreamParser(max_items, max_bytes, stop), content).finish()
+
+def _finish_entries(parser: FeedStreamParser, content: bytes, max_items: Optional[int],
+                    stop: Optional[Callable]) -> List:
+    try:
+        return parser.finish()
+    except ET.ParseError as e:
+        if feedparser is None:
+            raise
+        logger.info(f"Streaming parse failed ({e}), falling back to feedparser")
+    
+    entries = []
+    for entry in feedparser.parse(content).entries:
+        if (stop is not None and stop(entry)) or (max_items is not None and len(entries) >= max_items):
+            break
+        entries.append(entry)
+    return entries
+
+def parse_entries(content: bytes, max_items: Optional[int] = None,
+                  stop: Optional[Callable] = None) -> List:
+    """逐次パースし、XML として読めないフィードは寛容な feedparser で読み直す
+    
+    戻り値のエントリはどちらの場合も entry.get('title') / entry.summary 形式で参照できる
+    """
+    parser = _feed_content(FeedStreamParser(max_items, stop=stop), content)
+    return _finish_entries(parser, content, max_items, stop)
+
+async def read_feed_response(response: 'httpx.Response', max_items: Optional[int] = None,
+                             stop: Optional[Callable] = None, read_all: bool = False,
+                             max_bytes: int = DEFAULT_MAX_BYTES) -> 'httpx.Response':
+    """client.stream() で受信中のレスポンスの本文を、届いたチャンクから順に parse_entries と同じ規則で解析する
+    
+    必要なエントリが揃った時点で受信をやめる（呼び出し側の async with を抜けると接続が閉じる）
+    read_all のときは解析だけやめて本文は最後まで受け取る（本文を保存する場合）
+    本文が max_bytes を超えたら read_all でも受信をやめ、超えたチャンクは持たない
+    戻り値は受信した本文を持つレスポンスで、extensions['entries'] にエントリ、
+    途中で受信をやめた場合は extensions['truncated'] が True（途中までの本文は保存しない）
+    """
+    parser = FeedStreamParser(max_items, max_bytes, stop)
+    chunks = []
+    received = 0
+    truncated = False
+    async for chunk in response.aiter_bytes():
+        received += len(chunk)
+        parsing = not parser.done and parser.error is None
+        parser.feed(chunk)
+        if received > max_bytes:
+            # 解析を続けていた場合はパーサが警告を出している
+            if not parsing:
+                logger.warning(f"Stopped receiving feed: feed exceeds {max_bytes} bytes")
+            truncated = True
+            break
+        chunks.append(chunk)
+        if parser.done and not read_all:
+            truncated = True
+            break
+    
+    content = b''.join(chunks)
+    # 本文は展開済みなので、Content-Encoding などの転送時のヘッダは引き継がない
+    headers = [(key, value) for key, value in response.headers.multi_items()
+               if key.lower() not in ('content-encoding', 'content-length', 'transfer-encoding')]
+    return httpx.Response(
+        response.status_code,
+        headers=headers,
+        content=content,
+        request=response.request,
+        extensions={'entries': _finish_entries(parser, content, max_items, stop), 'truncated': truncated}
+    )
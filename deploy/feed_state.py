@@ -0,0 +1,394 @@
+#!/usr/bin/env python3
+"""
+Feed State Store
+フィードごとの取り込み状態（最新エントリのウォーターマーク）と取得の健全性を SQLite に保存する
+news_sources.py などのフィード一覧と同じくフィード URL をキーにする
+ウォーターマークは取得済み記事の記録（seen_index）と同じく利用する側の namespace ごとに持つ
+
+健全性は取得ごとの履歴（成否・レイテンシ・サイズ・内容の変化）から求め、
+失敗が続くフィードはサーキットブレーカーで指数的に間隔を空け、
+更新の遅いフィードは観測した更新間隔に合わせて毎回は取得しない
+
+使い方:
+    python feed_state.py reset-watermarks            # 全フィードのウォーターマークを消す
+    python feed_state.py reset-watermarks --feed URL # 指定フィードのみ（名前でも可）
+    python feed_state.py feed-health                 # 問題の多いフィードから一覧表示
+    python feed_state.py feed-health --limit 50
+"""
+
+import os
+import sys
+import time
+import sqlite3
+import hashlib
+import logging
+import calendar
+import threading
+from dataclasses import dataclass
+from datetime import datetime
+from email.utils import parsedate_to_datetime
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+from urllib.parse import urlparse
+
+# Add current directory to path
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from config import CACHE_DIR
+
+logger = logging.getLogger(__name__)
+
+# フィードごとに保持する取得履歴の件数
+HISTORY_SIZE = 100
+
+# 連続失敗がこの回数に達したらブレーカーを開き、以降は失敗のたびに待ち時間を倍にする
+BREAKER_THRESHOLD = 3
+BREAKER_BASE_BACKOFF = 15 * 60
+BREAKER_MAX_BACKOFF = 24 * 3600
+
+# 観測した更新間隔のこの割合をポーリング間隔にする。短いもの（cron 1回分未満）は毎回取得する
+POLL_FRACTION = 0.5
+MIN_POLL_INTERVAL = 10 * 60
+MAX_POLL_INTERVAL = 6 * 3600
+# cron の起動時刻のずれで 1 回分取りこぼさないための余裕
+POLL_SLACK = 60
+
+@dataclass
+class Watermark:
+    """前回までに取り込んだ最新エントリ"""
+    entry_id: str
+    published: Optional[float] = None
+    
+    def covers(self, entry_id: str, published: Optional[float]) -> bool:
+        """エントリが取り込み済み（ウォーターマーク以前）か"""
+        if entry_id and entry_id == self.entry_id:
+            return True
+        # 公開日時が分かる場合は、ウォーターマークより古いものも取り込み済みとみなす
+        return published is not None and self.published is not None and published < self.published
+
+
+def feedparser_entry_marker(entry) -> Tuple[str, Optional[float]]:
+    """feedparser のエントリから (GUID またはリンク, 公開日時の epoch 秒) を取り出す"""
+    entry_id = entry.get('id') or entry.get('link') or ''
+    parsed = entry.get('published_parsed') or entry.get('updated_parsed')
+    return entry_id, calendar.timegm(parsed) if parsed else None
+
+def parse_timestamp(text: str) -> Optional[float]:
+    try:
+        return parsedate_to_datetime(text).timestamp()
+    except (TypeError, ValueError):
+        pass
+    try:
+        return datetime.fromisoformat(text.replace('Z', '+00:00')).timestamp()
+    except ValueError:
+        return None
+
+def _percentile(values: List[float], fraction: float) -> Optional[float]:
+    if not values:
+        return None
+    ordered = sorted(values)
+    return ordered[min(int(len(ordered) * fraction), len(ordered) - 1)]
+
+
+class FeedStateStore:
+    def __init__(self, db_path: Optional[Path] = None):
+        self.db_path = Path(db_path or CACHE_DIR / 'feed_state.db')
+        self.db_path.parent.mkdir(parents=True, exist_ok=True)
+        
+        # 取得結果の記録はイベントループの外のスレッドから行うので、接続はロックで直列化する
+        self._lock = threading.RLock()
+        self.conn = sqlite3.connect(str(self.db_path), timeout=30, check_same_thread=False)
+        self.conn.row_factory = sqlite3.Row
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        with self.conn:
+            columns = [row['name'] for row in self.conn.execute("PRAGMA table_info(feed_watermarks)")]
+            if columns and 'namespace' not in columns:
+                # 旧形式は取得した時点で全利用者共通に記録していたので、引き継がずに作り直す
+                self.conn.execute("DROP TABLE feed_watermarks")
+            self.conn.execute('''
+                CREATE TABLE IF NOT EXISTS feed_watermarks (
+                    namespace TEXT NOT NULL,
+                    feed_url TEXT NOT NULL,
+                    feed_name TEXT,
+                    entry_id TEXT NOT NULL,
+                    published REAL,
+                    updated_at REAL NOT NULL,
+                    PRIMARY KEY (namespace, feed_url)
+                )
+            ''')
+            self.conn.execute('''
+                CREATE TABLE IF NOT EXISTS feed_fetches (
+                    feed_url TEXT NOT NULL,
+                    fetched_at REAL NOT NULL,
+                    ok INTEGER NOT NULL,
+                    status INTEGER,
+                    latency REAL,
+                    bytes INTEGER,
+                    changed INTEGER NOT NULL DEFAULT 0,
+                    error TEXT
+                )
+            ''')
+            self.conn.execute("CREATE INDEX IF NOT EXISTS idx_feed_fetches_url ON feed_fetches(feed_url, fetched_at)")
+            self.conn.execute('''
+                CREATE TABLE IF NOT EXISTS feed_health (
+                    feed_url TEXT PRIMARY KEY,
+                    feed_name TEXT,
+                    consecutive_failures INTEGER NOT NULL DEFAULT 0,
+                    open_until REAL,
+                    next_poll_at REAL,
+                    poll_interval REAL,
+                    content_hash TEXT
+                )
+            ''')
+    
+    def get_watermark(self, feed_url: str, namespace: str = 'default') -> Optional[Watermark]:
+        with self._lock:
+            row = self.conn.execute(
+                "SELECT entry_id, published FROM feed_watermarks WHERE namespace = ? AND feed_url = ?",
+                (namespace, feed_url)
+            ).fetchone()
+        return Watermark(row['entry_id'], row['published']) if row else None
+    
+    def set_watermark(self, feed_url: str, entry_id: str, published: Optional[float],
+                      feed_name: Optional[str] = None, namespace: str = 'default'):
+        if not entry_id:
+            return
+        with self._lock, self.conn:
+            self.conn.execute('''
+                INSERT OR REPLACE INTO feed_watermarks (namespace, feed_url, feed_name, entry_id, published, updated_at)
+                VALUES (?, ?, ?, ?, ?, ?)
+            ''', (namespace, feed_url, feed_name, entry_id, published, time.time()))
+    
+    def reset_watermarks(self, feed: Optional[str] = None) -> int:
+        """ウォーターマークを削除する（全 namespace）。feed には URL かフィード名を指定（省略時は全件）"""
+        with self._lock, self.conn:
+            if feed:
+                cursor = self.conn.execute(
+                    "DELETE FROM feed_watermarks WHERE feed_url = ? OR feed_name = ?", (feed, feed)
+                )
+            else:
+                cursor = self.conn.execute("DELETE FROM feed_watermarks")
+        return cursor.rowcount
+    
+    def skip_reason(self, feed_url: str) -> Optional[str]:
+        """今回の実行で取得しない理由を返す。取得すべきなら None
+        
+        'circuit open' はブレーカーが開いている（失敗が続いている）フィード、
+        'not due' は更新間隔から見てまだ新しい記事がなさそうなフィード
+        """
+        with self._lock:
+            row = self.conn.execute(
+                "SELECT open_until, next_poll_at FROM feed_health WHERE feed_url = ?", (feed_url,)
+            ).fetchone()
+        if row is None:
+            return None
+        now = time.time()
+        if row['open_until'] and now < row['open_until']:
+            return 'circuit open'
+        if row['next_poll_at'] and now + POLL_SLACK < row['next_poll_at']:
+            return 'not due'
+        return None
+    
+    def record_fetch(self, feed_url: str, ok: bool, status: Optional[int] = None,
+                     latency: Optional[float] = None, size: Optional[int] = None,
+                     content_hash: Optional[str] = None, error: Optional[str] = None,
+                     feed_name: Optional[str] = None):
+        """1回分の取得結果を履歴に加え、ブレーカーと次回のポーリング時刻を更新する"""
+        with self._lock:
+            self._record_fetch(feed_url, ok, status, latency, size, content_hash, error, feed_name)
+    
+    def _record_fetch(self, feed_url: str, ok: bool, status: Optional[int], latency: Optional[float],
+                      size: Optional[int], content_hash: Optional[str], error: Optional[str],
+                      feed_name: Optional[str]):
+        now = time.time()
+        row = self.conn.execute(
+            "SELECT consecutive_failures, poll_interval, content_hash FROM feed_health WHERE feed_url = ?",
+            (feed_url,)
+        ).fetchone()
+        failures = row['consecutive_failures'] if row else 0
+        previous_hash = row['content_hash'] if row else None
+        changed = ok and content_hash is not None and content_hash != previous_hash
+        
+        with self.conn:
+            self.conn.execute('''
+                INSERT INTO feed_fetches (feed_url, fetched_at, ok, status, latency, bytes, changed, error)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+            ''', (feed_url, now, int(ok), status, latency, size, int(changed), error))
+            self.conn.execute('''
+                DELETE FROM feed_fetches WHERE feed_url = ? AND fetched_at < (
+                    SELECT fetched_at FROM feed_fetches WHERE feed_url = ?
+                    ORDER BY fetched_at DESC LIMIT 1 OFFSET ?
+                )
+            ''', (feed_url, feed_url, HISTORY_SIZE - 1))
+            
+            if ok:
+                failures = 0
+                open_until = None
+                poll_interval = self._poll_interval(feed_url, now)
+                next_poll_at = now + poll_interval if poll_interval else None
+                new_hash = content_hash or previous_hash
+            else:
+                failures += 1
+                open_until = None
+                if failures >= BREAKER_THRESHOLD:
+                    backoff = min(BREAKER_BASE_BACKOFF * 2 ** (failures - BREAKER_THRESHOLD), BREAKER_MAX_BACKOFF)
+                    open_until = now + backoff
+                    logger.warning(f"Circuit open for {feed_name or feed_url} after {failures} failures, "
+                                   f"retrying in {backoff / 60:.0f} min")
+                poll_interval = row['poll_interval'] if row else None
+                next_poll_at = None
+                new_hash = previous_hash
+            
+            self.conn.execute('''
+                INSERT OR REPLACE INTO feed_health
+                    (feed_url, feed_name, consecutive_failures, open_until, next_poll_at, poll_interval, content_hash)
+                VALUES (?, COALESCE(?, (SELECT feed_name FROM feed_health WHERE feed_url = ?)), ?, ?, ?, ?, ?)
+            ''', (feed_url, feed_name, feed_url, failures, open_until, next_poll_at, poll_interval, new_hash))
+    
+    def record_result(self, feed_url: str, result):
+        """fetch_engine.FetchResult から record_fetch する"""
+        content = result.content if result.ok else b''
+        if result.truncated:
+            # 途中で受信をやめた本文は切れ目が毎回違うので、変化の検出には受け取ったエントリを使う
+            content = '\n'.join(f"{entry.get('id', '')}\t{entry.get('title', '')}"
+                                for entry in result.entries).encode('utf-8')
+        self.record_fetch(
+            feed_url,
+            ok=result.ok,
+            status=result.status_code,
+            latency=result.elapsed,
+            size=len(result.content) if result.ok else None,
+            content_hash=hashlib.sha256(content).hexdigest() if result.ok else None,
+            error=result.error or (None if result.ok else f"HTTP {result.status_code}"),
+            feed_name=result.source.get('name')
+        )
+    
+    def host_latency(self, min_samples: int = 5) -> Dict[str, Dict]:
+        """成功した取得のレイテンシをホストごとに集計し、p95 / p99 を返す（min_samples 件未満のホストは除く）"""
+        latencies: Dict[str, List[float]] = {}
+        with self._lock:
+            rows = self.conn.execute(
+                "SELECT feed_url, latency FROM feed_fetches WHERE ok = 1 AND latency IS NOT NULL"
+            ).fetchall()
+        for row in rows:
+            latencies.setdefault(urlparse(row['feed_url']).netloc, []).append(row['latency'])
+        return {
+            host: {'p95': _percentile(values, 0.95), 'p99': _percentile(values, 0.99), 'samples': len(values)}
+            for host, values in latencies.items() if len(values) >= min_samples
+        }
+    
+    def _poll_interval(self, feed_url: str, now: float) -> float:
+        """観測した更新間隔からポーリング間隔を決める。0 は毎回取得
+        
+        更新間隔は履歴中の変化の平均間隔とし、最後の変化からの経過時間がそれより長ければそちらを使う
+        （更新が止まったフィードほど間隔が伸びていく）
+        """
+        changes = [row['fetched_at'] for row in self.conn.execute(
+            "SELECT fetched_at FROM feed_fetches WHERE feed_url = ? AND changed = 1 ORDER BY fetched_at",
+            (feed_url,)
+        )]
+        if not changes:
+            return 0.0
+        update_interval = now - changes[-1]
+        if len(changes) >= 2:
+            update_interval = max(update_interval, (changes[-1] - changes[0]) / (len(changes) - 1))
+        
+        interval = min(update_interval * POLL_FRACTION, MAX_POLL_INTERVAL)
+        return interval if interval >= MIN_POLL_INTERVAL else 0.0
+    
+    def health_report(self, limit: Optional[int] = None) -> List[Dict]:
+        """フィードごとの成功率・レイテンシ・サイズ・更新間隔を、問題の多い順に返す"""
+        report = []
+        for health in self.conn.execute("SELECT * FROM feed_health").fetchall():
+            fetches = self.conn.execute(
+                "SELECT fetched_at, ok, latency, bytes, changed, error FROM feed_fetches "
+                "WHERE feed_url = ? ORDER BY fetched_at", (health['feed_url'],)
+            ).fetchall()
+            if not fetches:
+                continue
+            
+            latencies = [row['latency'] for row in fetches if row['latency'] is not None]
+            sizes = [row['bytes'] for row in fetches if row['ok'] and row['bytes'] is not None]
+            changes = [row['fetched_at'] for row in fetches if row['changed']]
+            errors = [row['error'] for row in fetches if row['error']]
+            
+            report.append({
+                'feed_url': health['feed_url'],
+                'feed_name': health['feed_name'],
+                'fetches': len(fetches),
+                'success_rate': sum(row['ok'] for row in fetches) / len(fetches),
+                'latency_p50': _percentile(latencies, 0.5),
+                'latency_p95': _percentile(latencies, 0.95),
+                'avg_bytes': sum(sizes) / len(sizes) if sizes else None,
+                'update_interval': (changes[-1] - changes[0]) / (len(changes) - 1) if len(changes) >= 2 else None,
+                'poll_interval': health['poll_interval'],
+                'consecutive_failures': health['consecutive_failures'],
+                'open_until': health['open_until'],
+                'last_error': errors[-1] if errors else None
+            })
+        
+        report.sort(key=lambda row: (row['success_rate'], -(row['latency_p95'] or 0)))
+        return report[:limit] if limit else report
+    
+    def close(self):
+        self.conn.close()
+
+
+def _format_duration(seconds: Optional[float]) -> str:
+    if seconds is None:
+        return '-'
+    if seconds < 120:
+        return f"{seconds:.0f}s"
+    if seconds < 7200:
+        return f"{seconds / 60:.0f}m"
+    return f"{seconds / 3600:.1f}h"
+
+def print_health_report(report: List[Dict]):
+    if not report:
+        print("No fetch history recorded yet")
+        return
+    
+    print(f"{'feed':<40} {'ok%':>5} {'n':>4} {'p50':>7} {'p95':>7} {'KB':>7} {'updates':>8} {'poll':>6}  status")
+    now = time.time()
+    for row in report:
+        name = (row['feed_name'] or row['feed_url'])[:40]
+        latency_p50 = f"{row['latency_p50']:.2f}s" if row['latency_p50'] is not None else '-'
+        latency_p95 = f"{row['latency_p95']:.2f}s" if row['latency_p95'] is not None else '-'
+        size = f"{row['avg_bytes'] / 1024:.0f}" if row['avg_bytes'] is not None else '-'
+        if row['open_until'] and row['open_until'] > now:
+            status = f"circuit open for {_format_duration(row['open_until'] - now)}: {row['last_error'] or ''}"
+        elif row['consecutive_failures']:
+            status = f"{row['consecutive_failures']} failure(s): {row['last_error'] or ''}"
+        else:
+            status = 'ok'
+        print(f"{name:<40} {row['success_rate']:>5.0%} {row['fetches']:>4} {latency_p50:>7} {latency_p95:>7} "
+              f"{size:>7} {_format_duration(row['update_interval']):>8} "
+              f"{_format_duration(row['poll_interval'] or None):>6}  {status[:80]}")
+
+def main():
+    import argparse
+    
+    parser = argparse.ArgumentParser(description='Feed state maintenance')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    
+    reset_parser = subparsers.add_parser('reset-watermarks', help='Forget the newest ingested entry of feeds')
+    reset_parser.add_argument('--feed', help='Feed URL or name (default: all feeds)')
+    
+    health_parser = subparsers.add_parser('feed-health', help='List feeds with the worst health first')
+    health_parser.add_argument('--limit', type=int, default=20, help='Number of feeds to show (0: all)')
+    
+    args = parser.parse_args()
+    
+    store = FeedStateStore()
+    try:
+        if args.command == 'reset-watermarks':
+            removed = store.reset_watermarks(args.feed)
+            print(f"Reset {removed} watermark(s)")
+        elif args.command == 'feed-health':
+            print_health_report(store.health_report(args.limit))
+    finally:
+        store.close()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,274 @@
+#!/usr/bin/env python3
+"""
+Feed Fetch Engine
+RSSフィードやランキングページを asyncio で並行取得する共通エンジン
+全体の同時接続数とホストごとの同時接続数を制限し、接続を使い回す
+
+feed_state があればホストごとの過去のレイテンシからタイムアウトを決め（p99 × 係数）、
+遅いリクエストには p95 を過ぎた時点で予備のリクエストを並走させられる（hedge=True）
+取得段階全体には deadline を設け、間に合わなかったソースは打ち切って部分的な結果を返す
+フィードは parse を渡すと受信しながら解析し、必要なエントリが揃った時点で残りを受信しない
+"""
+
+import asyncio
+import logging
+import time
+from dataclasses import dataclass
+from typing import Callable, Dict, List, Optional, Sequence
+from urllib.parse import urlparse
+
+try:
+    import httpx
+except ImportError:
+    httpx = None
+
+try:
+    import h2  # noqa: F401  httpx[http2] が入っていれば HTTP/2 を使う
+    HTTP2_AVAILABLE = True
+except ImportError:
+    HTTP2_AVAILABLE = False
+
+from feed_parser import read_feed_response
+from feed_state import FeedStateStore
+from http_cache import ConditionalGetCache
+
+logger = logging.getLogger(__name__)
+
+# 取得段階全体の締め切り（秒）。cron の 15 分枠に対して十分短くしておく
+DEFAULT_DEADLINE = 120.0
+
+# ホストごとのタイムアウト = p99 × TIMEOUT_FACTOR を [MIN_TIMEOUT, timeout] に収める
+TIMEOUT_FACTOR = 3.0
+MIN_TIMEOUT = 5.0
+# これ未満の成功履歴しかないホストには固定のタイムアウトを使い、ヘッジもしない
+MIN_LATENCY_SAMPLES = 5
+
+DEFAULT_HEADERS = {
+    'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36'
+}
+
+def adaptive_timeout(latency: Optional[Dict], ceiling: float) -> float:
+    """FeedStateStore.host_latency() の1ホスト分からタイムアウトを決める。履歴がなければ ceiling"""
+    if not latency:
+        return ceiling
+    return min(max(latency['p99'] * TIMEOUT_FACTOR, MIN_TIMEOUT), ceiling)
+
+@dataclass
+class FetchResult:
+    """1ソース分の取得結果。source には呼び出し側が渡した dict がそのまま入る"""
+    source: Dict
+    response: Optional['httpx.Response'] = None
+    error: Optional[str] = None
+    elapsed: float = 0.0
+    # 'not due' / 'circuit open' のときは取得しておらず、response は保存済みの本文（あれば）
+    skipped: Optional[str] = None
+    
+    @property
+    def status_code(self) -> Optional[int]:
+        return self.response.status_code if self.response is not None else None
+    
+    @property
+    def ok(self) -> bool:
+        return self.error is None and self.response is not None and self.response.is_success
+    
+    @property
+    def content(self) -> bytes:
+        return self.response.content if self.response is not None else b''
+    
+    @property
+    def text(self) -> str:
+        return self.response.text if self.response is not None else ''
+    
+    @property
+    def entries(self) -> Optional[List]:
+        """受信しながら解析したエントリ（fetch_all に parse を渡した場合）。未解析なら None"""
+        return self.response.extensions.get('entries') if self.response is not None else None
+    
+    @property
+    def truncated(self) -> bool:
+        """必要なエントリが揃ったため本文の途中で受信をやめたか"""
+        return self.response is not None and self.response.extensions.get('truncated', False)
+    
+    @property
+    def not_modified(self) -> bool:
+        """304 を受けて保存済みの本文を再利用したか"""
+        return self.response is not None and self.response.extensions.get('not_modified', False)
+    
+    def raise_for_status(self):
+        """取得時のエラー、または HTTP エラーステータスを例外として送出"""
+        if self.error is not None:
+            raise RuntimeError(self.error)
+        self.response.raise_for_status()
+
+
+class FeedFetchEngine:
+    def __init__(self, max_concurrency: int = 16, per_host_limit: int = 2,
+                 timeout: float = 30.0, connect_timeout: float = 10.0,
+                 headers: Optional[Dict] = None, use_http_cache: bool = True,
+                 feed_state: Optional[FeedStateStore] = None,
+                 deadline: Optional[float] = DEFAULT_DEADLINE, hedge: bool = False):
+        self.max_concurrency = max_concurrency
+        self.per_host_limit = per_host_limit
+        self.timeout = timeout
+        self.connect_timeout = connect_timeout
+        self.headers = headers or DEFAULT_HEADERS
+        self.http_cache = ConditionalGetCache() if use_http_cache else None
+        # 渡されたときはフィードの健全性を記録し、ブレーカーとポーリング間隔に従って取得を省く
+        self.feed_state = feed_state
+        self.deadline = deadline
+        self.hedge = hedge
+        self.hedged = 0
+    
+    def _create_client(self) -> 'httpx.AsyncClient':
+        return httpx.AsyncClient(
+            timeout=httpx.Timeout(self.timeout, connect=self.connect_timeout),
+            headers=self.headers,
+            follow_redirects=True,
+            http2=HTTP2_AVAILABLE,
+            limits=httpx.Limits(
+                max_connections=self.max_concurrency,
+                max_keepalive_connections=self.max_concurrency
+            )
+        )
+    
+    async def fetch_all(self, sources: Sequence[Dict], url_key: str = 'url',
+                        parse: Optional[Callable[[Dict], Dict]] = None) -> List[FetchResult]:
+        """全ソースを並行取得し、入力と同じ順序で結果を返す
+        
+        parse を渡すとフィードとして受信しながら解析する。parse(source) はそのソースの
+        read_feed_response の引数（max_items / stop）を返す。エントリは FetchResult.entries に入る
+        """
+        if httpx is None:
+            return [FetchResult(source=source, error="httpx not available") for source in sources]
+        
+        global_limit = asyncio.Semaphore(self.max_concurrency)
+        host_limits: Dict[str, asyncio.Semaphore] = {}
+        host_latency = self.feed_state.host_latency(MIN_LATENCY_SAMPLES) if self.feed_state else {}
+        started = time.perf_counter()
+        
+        async with self._create_client() as client:
+            async def fetch_one(source: Dict) -> FetchResult:
+                url = source[url_key]
+                skipped = self._skip(source, url)
+                if skipped is not None:
+                    return skipped
+                
+                host = urlparse(url).netloc
+                host_limit = host_limits.setdefault(host, asyncio.Semaphore(self.per_host_limit))
+                
+                latency = host_latency.get(host)
+                timeout = adaptive_timeout(latency, self.timeout)
+                hedge_after = latency['p95'] if self.hedge and latency else None
+                options = parse(source) if parse else None
+                
+                async with host_limit, global_limit:
+                    request_started = time.perf_counter()
+                    try:
+                        response = await asyncio.wait_for(self._hedged_get(client, url, hedge_after, options), timeout)
+                        return FetchResult(source=source, response=response,
+                                           elapsed=time.perf_counter() - request_started)
+                    except asyncio.TimeoutError:
+                        return FetchResult(source=source, error=f"Timeout after {timeout:.1f}s",
+                                           elapsed=time.perf_counter() - request_started)
+                    except Exception as e:
+                        # httpx の例外は str() が空になることがあるので型名も残す
+                        return FetchResult(source=source, error=f"{type(e).__name__}: {e}",
+                                           elapsed=time.perf_counter() - request_started)
+            
+            tasks = [asyncio.ensure_future(fetch_one(source)) for source in sources]
+            if tasks:
+                await asyncio.wait(tasks, timeout=self.deadline)
+            
+            results = []
+            for source, task in zip(sources, tasks):
+                if task.done():
+                    results.append(task.result())
+                else:
+                    # 締め切りに間に合わなかったソースは打ち切る（フィードの健全性には数えない）
+                    task.cancel()
+                    results.append(FetchResult(source=source, error=f"cancelled at the {self.deadline:.0f}s fetch deadline",
+                                               skipped='deadline'))
+            cancelled = sum(1 for result in results if result.skipped == 'deadline')
+            if cancelled:
+                await asyncio.gather(*tasks, return_exceptions=True)
+                logger.warning(f"Fetch deadline reached: returning partial results, "
+                               f"{cancelled}/{len(results)} sources cancelled")
+        
+        if self.feed_state:
+            await asyncio.to_thread(self._record_results, results, url_key)
+        
+        skipped = sum(1 for result in results if result.skipped)
+        failed = sum(1 for result in results if not result.ok and not result.skipped)
+        logger.info(f"Fetched {len(results) - skipped} sources in {time.perf_counter() - started:.2f}s "
+                    f"({failed} failed, {skipped} skipped, {self.hedged} hedged, http2={HTTP2_AVAILABLE})")
+        if self.http_cache:
+            self.http_cache.log_stats()
+        return results
+    
+    def _record_results(self, results: List[FetchResult], url_key: str):
+        for result in results:
+            if not result.skipped:
+                self.feed_state.record_result(result.source[url_key], result)
+    
+    async def _get(self, client: 'httpx.AsyncClient', url: str, options: Optional[Dict] = None) -> 'httpx.Response':
+        if options is None:
+            if self.http_cache:
+                return await self.http_cache.get(client, url)
+            return await client.get(url)
+        
+        if self.http_cache:
+            return await self.http_cache.get_feed(client, url, **options)
+        async with client.stream('GET', url) as response:
+            if response.status_code != 200:
+                await response.aread()
+                return response
+            return await read_feed_response(response, **options)
+    
+    async def _hedged_get(self, client: 'httpx.AsyncClient', url: str, hedge_after: Optional[float],
+                          options: Optional[Dict] = None) -> 'httpx.Response':
+        """hedge_after 秒たっても応答がなければ同じ URL に予備のリクエストを出し、先に返った方を使う"""
+        primary = asyncio.ensure_future(self._get(client, url, options))
+        if hedge_after is None:
+            return await primary
+        
+        pending = {primary}
+        try:
+            done, _ = await asyncio.wait(pending, timeout=hedge_after)
+            if done:
+                return primary.result()
+            
+            self.hedged += 1
+            pending.add(asyncio.ensure_future(self._get(client, url, options)))
+            error = None
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None:
+                        return task.result()
+                    error = task.exception()
+            raise error
+        finally:
+            for task in pending:
+                task.cancel()
+    
+    def _skip(self, source: Dict, url: str) -> Optional[FetchResult]:
+        """今回取得しないソースの結果を返す。取得すべきなら None"""
+        if not self.feed_state:
+            return None
+        reason = self.feed_state.skip_reason(url)
+        if reason is None:
+            return None
+        
+        if reason == 'not due':
+            # 更新が遅いフィードは前回の本文をそのまま使う。本文が手元になければ取得する
+            cached = self.http_cache.cached_response(url) if self.http_cache else None
+            if cached is None:
+                return None
+            return FetchResult(source=source, response=cached, skipped=reason)
+        
+        return FetchResult(source=source, error=f"skipped: {reason}", skipped=reason)
+    
+    def fetch_all_sync(self, sources: Sequence[Dict], url_key: str = 'url',
+                       parse: Optional[Callable[[Dict], Dict]] = None) -> List[FetchResult]:
+        """同期コードから呼ぶためのラッパー"""
+        return asyncio.run(self.fetch_all(sources, url_key, parse))
@@ -11,10 +11,15 @@ import logging
 import tempfile
 from datetime import datetime, timezone, timedelta
 from pathlib import Path
-import httpx
-import feedparser
 from typing import Dict, List, Optional
 
+# Add current directory to path
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from feed_parser import parse_entries
+from feed_state import FeedStateStore
+from fetch_engine import FeedFetchEngine
+
 # Setup logging
 logging.basicConfig(
     level=logging.INFO,
@@ -118,8 +123,10 @@ class GoogleNewsStyleSystem:
             {'name': 'CNET Japan（モバイル）', 'url': 'https://japan.cnet.com/rss/mobile.rdf', 'category': 'テクノロジー'},
         ]
         
-        self.client = httpx.Client(
-            timeout=30.0,
+        # フィードごとの検証ヘッダ・取得間隔とホストごとのレイテンシを記録し、次回の取得に使う
+        self.feed_state = FeedStateStore()
+        self.fetch_engine = FeedFetchEngine(
+            feed_state=self.feed_state,
             headers={
                 'User-Agent': 'Mozilla/5.0 (compatible; NewsBot/1.0; +http://example.com/bot)'
             }
@@ -129,15 +136,18 @@ class GoogleNewsStyleSystem:
         """Fetch news from all RSS feeds"""
         all_articles = []
         
-        for feed_info in self.rss_feeds:
+        # 全フィードを並行取得し（受信しながら先頭5件だけ解析する）、登録順に記事にする
+        for result in self.fetch_engine.fetch_all_sync(self.rss_feeds, parse=lambda feed: {'max_items': 5}):
+            feed_info = result.source
             try:
-                logger.info(f"Fetching from {feed_info['name']}")
-                response = self.client.get(feed_info['url'])
-                
-                if response.status_code == 200:
-                    feed = feedparser.parse(response.content)
+                if result.error:
+                    logger.error(f"Error fetching from {feed_info['name']}: {result.error}")
+                elif result.status_code == 200:
+                    entries = result.entries
+                    if entries is None:
+                        entries = parse_entries(result.content, max_items=5)  # Max 5 per feed
                     
-                    for entry in feed.entries[:5]:  # Max 5 per feed
+                    for entry in entries:
                         article = {
                             'title': entry.get('title', 'No Title'),
                             'url': entry.get('link', '#'),
@@ -149,9 +159,9 @@ class GoogleNewsStyleSystem:
                         }
                         all_articles.append(article)
                         
-                    logger.info(f"Fetched {len(feed.entries[:5])} articles from {feed_info['name']}")
+                    logger.info(f"Fetched {len(entries)} articles from {feed_info['name']}")
                 else:
-                    logger.warning(f"Failed to fetch from {feed_info['name']}: {response.status_code}")
+                    logger.warning(f"Failed to fetch from {feed_info['name']}: {result.status_code}")
                     
             except Exception as e:
                 logger.error(f"Error fetching from {feed_info['name']}: {str(e)}")
@@ -531,8 +541,14 @@ class GoogleNewsStyleSystem:
         except Exception as e:
             logger.error(f"Fatal error: {str(e)}")
             raise
+        
         finally:
-            self.client.close()
+            self.close()
+    
+    def close(self):
+        """Close the feed state store"""
+        # HTTP クライアントは fetch_engine が取得ごとに開閉する
+        self.feed_state.close()
 
 if __name__ == "__main__":
     try:
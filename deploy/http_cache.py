@@ -0,0 +1,178 @@
+#!/usr/bin/env python3
+"""
+Conditional GET Cache
+フィードの ETag / Last-Modified と最後に取得した本文をディスクに保存し、
+If-None-Match / If-Modified-Since 付きで再取得する。304 のときは保存済みの本文を返す
+"""
+
+import os
+import json
+import asyncio
+import hashlib
+import logging
+from pathlib import Path
+from typing import Callable, Dict, Optional
+
+try:
+    import httpx
+except ImportError:
+    httpx = None
+
+from config import CACHE_DIR
+from feed_parser import read_feed_response
+
+logger = logging.getLogger(__name__)
+
+class ConditionalGetCache:
+    def __init__(self, cache_dir: Optional[Path] = None):
+        self.cache_dir = Path(cache_dir or CACHE_DIR / 'http')
+        
+        # 実行ごと（プロセスごと）の統計
+        self.requests = 0
+        self.hits = 0
+        self.bytes_saved = 0
+        self.bytes_downloaded = 0
+    
+    def _entry_paths(self, url: str):
+        key = hashlib.sha256(url.encode('utf-8')).hexdigest()
+        return self.cache_dir / f"{key}.json", self.cache_dir / f"{key}.body"
+    
+    def _load(self, url: str) -> Optional[Dict]:
+        meta_path, _ = self._entry_paths(url)
+        try:
+            with open(meta_path, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+    
+    @staticmethod
+    def _cacheable(response: 'httpx.Response') -> bool:
+        return bool(response.headers.get('etag') or response.headers.get('last-modified'))
+    
+    @staticmethod
+    def _validators(entry: Optional[Dict]) -> Dict:
+        headers = {}
+        if entry:
+            if entry.get('etag'):
+                headers['If-None-Match'] = entry['etag']
+            if entry.get('last_modified'):
+                headers['If-Modified-Since'] = entry['last_modified']
+        return headers
+    
+    def _store(self, url: str, response: 'httpx.Response'):
+        if not self._cacheable(response):
+            return
+        
+        meta = {
+            'url': url,
+            'etag': response.headers.get('etag'),
+            'last_modified': response.headers.get('last-modified'),
+            'content_type': response.headers.get('content-type', ''),
+            'size': len(response.content)
+        }
+        meta_path, body_path = self._entry_paths(url)
+        suffix = f".{os.getpid()}.{id(response)}.tmp"
+        
+        try:
+            self.cache_dir.mkdir(parents=True, exist_ok=True)
+            # 本文を先に置き換えるので、メタデータが指す本文は常に完全なものになる
+            with open(str(body_path) + suffix, 'wb') as f:
+                f.write(response.content)
+            os.replace(str(body_path) + suffix, body_path)
+            with open(str(meta_path) + suffix, 'w', encoding='utf-8') as f:
+                json.dump(meta, f)
+            os.replace(str(meta_path) + suffix, meta_path)
+        except OSError as e:
+            logger.warning(f"Failed to cache {url}: {e}")
+    
+    def cached_response(self, url: str) -> Optional['httpx.Response']:
+        """ネットワークに出ずに、保存済みの本文から 200 のレスポンスを組み立てる。なければ None"""
+        entry = self._load(url)
+        if not entry:
+            return None
+        _, body_path = self._entry_paths(url)
+        try:
+            body = body_path.read_bytes()
+        except OSError:
+            return None
+        return httpx.Response(
+            200,
+            headers={'content-type': entry.get('content_type', '')},
+            content=body,
+            request=httpx.Request('GET', url),
+            extensions={'not_modified': True}
+        )
+    
+    async def get(self, client: 'httpx.AsyncClient', url: str) -> 'httpx.Response':
+        """条件付き GET。304 の場合は保存済みの本文で 200 のレスポンスを組み立てて返す"""
+        entry = self._load(url)
+        response = await client.get(url, headers=self._validators(entry))
+        self.requests += 1
+        
+        if response.status_code == 304 and entry:
+            cached = self.cached_response(url)
+            if cached is None:
+                # 本文が消えていたら検証ヘッダなしで取り直す
+                response = await client.get(url)
+            else:
+                self.hits += 1
+                self.bytes_saved += len(cached.content)
+                return cached
+        
+        self.bytes_downloaded += len(response.content)
+        if response.status_code == 200:
+            # 本文のディスクへの書き込みはイベントループの外で行う
+            await asyncio.to_thread(self._store, url, response)
+        return response
+    
+    async def get_feed(self, client: 'httpx.AsyncClient', url: str, max_items: Optional[int] = None,
+                       stop: Optional[Callable] = None) -> 'httpx.Response':
+        """get() のフィード版。200 の本文は受信しながら解析し、extensions['entries'] にエントリを入れる
+        
+        ETag / Last-Modified のない応答は必要なエントリが揃った時点で受信をやめる
+        保存できる応答は次回の 304 のために本文を最後まで受け取る（解析は揃った時点でやめる）
+        304 のときは get() と同じく保存済みの本文を返す（エントリは呼び出し側で解析する）
+        """
+        entry = self._load(url)
+        response = await self._stream_feed(client, url, self._validators(entry), max_items, stop)
+        self.requests += 1
+        
+        if response.status_code == 304 and entry:
+            cached = self.cached_response(url)
+            if cached is None:
+                response = await self._stream_feed(client, url, {}, max_items, stop)
+            else:
+                self.hits += 1
+                self.bytes_saved += len(cached.content)
+                return cached
+        
+        self.bytes_downloaded += len(response.content)
+        if response.status_code == 200 and not response.extensions.get('truncated'):
+            await asyncio.to_thread(self._store, url, response)
+        return response
+    
+    async def _stream_feed(self, client: 'httpx.AsyncClient', url: str, headers: Dict,
+                           max_items: Optional[int], stop: Optional[Callable]) -> 'httpx.Response':
+        async with client.stream('GET', url, headers=headers) as response:
+            if response.status_code != 200:
+                await response.aread()
+                return response
+            return await read_feed_response(response, max_items, stop, read_all=self._cacheable(response))
+    
+    @property
+    def hit_rate(self) -> float:
+        return self.hits / self.requests if self.requests else 0.0
+    
+    def stats(self) -> Dict:
+        return {
+            'requests': self.requests,
+            'hits': self.hits,
+            'hit_rate': self.hit_rate,
+            'bytes_saved': self.bytes_saved,
+            'bytes_downloaded': self.bytes_downloaded
+        }
+    
+    def log_stats(self):
+        logger.info(f"Conditional GET: {self.hits}/{self.requests} not modified "
+                    f"(hit rate {self.hit_rate:.0%}), {self.bytes_saved} bytes saved, "
+                    f"{self.bytes_downloaded} bytes downloaded")
@@ -0,0 +1,263 @@
+#!/usr/bin/env python3
+"""
+Incremental JSON Scanner
+LLM の出力テキストを少しずつ受け取り、最初に現れる JSON オブジェクト（または配列）の終わりを
+括弧の深さと文字列リテラルの状態だけを追って検出する
+
+ストリーミング応答では、対象の JSON が閉じた時点（完成）や括弧の対応が崩れた時点（不正）で
+残りの出力を待たずに打ち切れる
+
+取得済みの応答からの抽出（load_json_response）も同じ状態機械でテキストを一度だけ走査し、
+見つかった候補を先頭から順に json.loads で1回ずつ検証する
+"""
+
+import re
+import json
+import logging
+from typing import Any, Callable, Iterator, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+COMPLETE = 'complete'
+MALFORMED = 'malformed'
+
+_CLOSERS = {'{': '}', '[': ']'}
+# 文字列の外で意味を持つ文字と、文字列の中で意味を持つ文字
+_STRUCTURAL = re.compile(r'[{}\[\]"]')
+_IN_STRING = re.compile(r'["\\]')
+# 最後の手段として直す崩れ（文字列内の生の改行・インデント、閉じ括弧直前のカンマ）
+_NEWLINES = re.compile(r'\n\s*')
+_TRAILING_COMMAS = re.compile(r',\s*([}\]])')
+# オブジェクトは '{' の直後がキーか '}' でなければ JSON ではない（文中の {x} などは json.loads せずに飛ばす）
+_OBJECT_START = re.compile(r'\{\s*["}]')
+# ストリームで候補にする開き括弧の直後（空白を除く）に来うる文字。出典[1] の [1] は配列として読めるが、
+# [こちら](url) のようなリンクや {x} は JSON の始まりではないので候補にしない
+_VALUE_START = {'{': re.compile(r'\s*["}]'), '[': re.compile(r'\s*[\]\[{"\-0-9tfn]')}
+_NON_SPACE = re.compile(r'\S')
+# 閉じない範囲から探し直す回数の上限（iter_json_candidates）
+_MAX_RESTARTS = 8
+
+
+def iter_json_candidates(text: str, openers: str = '{') -> Iterator[Tuple[int, int]]:
+    """テキストを先頭から走査し、括弧の対応が取れた範囲 (start, end) を返す（同じ範囲は一度だけ）
+    
+    openers で始まる最も外側の範囲を返したあと、その内側の範囲を続けて返す
+    （外側が JSON として読めない場合に内側を試せる）。文字列リテラル内の括弧は数えない
+    対応の崩れた範囲は捨てて、その位置から探し直す
+    閉じないまま終わった範囲は、文中の "{" や don"t の引用符が残りを文字列として飲み込んでいることがあるので、
+    その開き括弧の次から探し直す（探し直しは _MAX_RESTARTS 回までなので、走査は高々その倍数の長さ）
+    """
+    emitted = set()
+    position = 0
+    for _ in range(_MAX_RESTARTS + 1):
+        unclosed = None
+        for span in _scan_candidates(text, openers, position):
+            if span[1] is None:
+                unclosed = span[0]
+            elif span not in emitted:
+                emitted.add(span)
+                yield span
+        if unclosed is None:
+            return
+        position = unclosed + 1
+
+def _scan_candidates(text: str, openers: str, position: int) -> Iterator[Tuple[int, Optional[int]]]:
+    """position から一度だけ走査して範囲を返す。閉じないまま終わった場合は最後に (その開始位置, None)"""
+    stack: List[Tuple[int, str]] = []
+    inner: List[Tuple[int, int]] = []
+    in_string = False
+    length = len(text)
+    
+    while position < length:
+        if not stack:
+            starts = [index for index in (text.find(opener, position) for opener in openers) if index != -1]
+            if not starts:
+                return
+            position = min(starts)
+            stack.append((position, _CLOSERS[text[position]]))
+            position += 1
+            continue
+        
+        if in_string:
+            match = _IN_STRING.search(text, position)
+            if match is None:
+                break
+            if match.group() == '\\':
+                position = match.end() + 1
+            else:
+                in_string = False
+                position = match.end()
+            continue
+        
+        match = _STRUCTURAL.search(text, position)
+        if match is None:
+            break
+        char = match.group()
+        position = match.end()
+        if char == '"':
+            in_string = True
+        elif char in _CLOSERS:
+            stack.append((position - 1, _CLOSERS[char]))
+        elif stack[-1][1] == char:
+            start, _ = stack.pop()
+            if not stack:
+                yield start, position
+                yield from sorted(inner)
+                inner = []
+            elif text[start] in openers:
+                inner.append((start, position))
+        else:
+            # 対応が崩れた範囲は捨てる（内側で閉じていたものは候補に残す）
+            stack = []
+            yield from sorted(inner)
+            inner = []
+    
+    # 閉じないまま終わった外側の範囲の内側
+    yield from sorted(inner)
+    if stack:
+        yield stack[0][0], None
+
+def load_json_response(text: str, openers: str = '{') -> Any:
+    """LLM の応答テキストから最初に読める JSON を返す。見つからなければ json.JSONDecodeError
+    
+    前置きの文章・```json のコードブロック・後置きの説明が付いていてもよい
+    どの候補も読めない場合は、最初の開き括弧から最後の閉じ括弧までをよくある崩れを直して一度だけ読む
+    """
+    for start, end in iter_json_candidates(text, openers):
+        if text[start] == '{' and not _OBJECT_START.match(text, start):
+            continue
+        try:
+            return json.loads(text[start:end])
+        except json.JSONDecodeError:
+            continue
+    
+    starts = [index for index in (text.find(opener) for opener in openers) if index != -1]
+    if starts:
+        start = min(starts)
+        end = max(text.rfind(_CLOSERS[text[start]]), start) + 1
+        repaired = _TRAILING_COMMAS.sub(r'\1', _NEWLINES.sub('', text[start:end]))
+        try:
+            return json.loads(repaired)
+        except json.JSONDecodeError:
+            pass
+    raise json.JSONDecodeError("No JSON value found", text, 0)
+
+
+class IncrementalJSONScanner:
+    """feed() にテキストを順に渡すと、JSON が閉じたら COMPLETE、崩れていたら MALFORMED を返す
+    
+    候補は openers の開き括弧のうち、直後が JSON の値として始まりうるものだけ（それ以外の括弧は読み飛ばす）
+    accept を渡すと、閉じた値のうち accept(value) が True のものだけで COMPLETE になる
+    （出典[1] の [1] のように、読めても呼び出し側が求める値でないものは読み捨てて次の候補を探す）
+    
+    scanner = IncrementalJSONScanner()
+    for chunk in chunks:
+        state = scanner.feed(chunk)
+        if state == COMPLETE:
+            value = scanner.value
+            break
+        if state == MALFORMED:
+            break
+    
+    テキストは候補の開始位置以降だけを保持し、各文字は一度だけ調べる
+    """
+    
+    def __init__(self, openers: str = '{[', accept: Optional[Callable[[Any], bool]] = None):
+        self.openers = openers
+        self.accept = accept
+        self.state: Optional[str] = None
+        self.value: Any = None
+        self.error: Optional[str] = None
+        self._buffer = ''
+        self._position = 0
+        self._stack = []
+        self._in_string = False
+        self._escaped = False
+    
+    def feed(self, text: str) -> Optional[str]:
+        if self.state is not None:
+            return self.state
+        
+        self._buffer += text
+        return self._scan()
+    
+    def _scan(self) -> Optional[str]:
+        buffer = self._buffer
+        position = self._position
+        while position < len(buffer):
+            if not self._stack:
+                # 候補の開始（開き括弧）まで読み飛ばし、それより前のテキストは保持しない
+                starts = [index for index in (buffer.find(opener, position) for opener in self.openers) if index != -1]
+                if not starts:
+                    self._buffer, self._position = '', 0
+                    return None
+                buffer = self._buffer = buffer[min(starts):]
+                position = 0
+                if _NON_SPACE.search(buffer, 1) is None:
+                    # 直後の文字がまだ届いていない
+                    break
+                if _VALUE_START[buffer[0]].match(buffer, 1):
+                    self._stack.append(_CLOSERS[buffer[0]])
+                position = 1
+                continue
+            
+            if self._in_string:
+                if self._escaped:
+                    self._escaped = False
+                    position += 1
+                    continue
+                match = _IN_STRING.search(buffer, position)
+                if match is None:
+                    position = len(buffer)
+                    break
+                position = match.end()
+                if match.group() == '\\':
+                    self._escaped = True
+                else:
+                    self._in_string = False
+                continue
+            
+            match = _STRUCTURAL.search(buffer, position)
+            if match is None:
+                position = len(buffer)
+                break
+            char = match.group()
+            position = match.end()
+            if char == '"':
+                self._in_string = True
+            elif char in _CLOSERS:
+                self._stack.append(_CLOSERS[char])
+            elif not self._stack or self._stack.pop() != char:
+                return self._fail(f"unexpected '{char}' at offset {position - 1}")
+            elif not self._stack:
+                state = self._complete(buffer[:position])
+                if state is not None:
+                    return state
+                # 求める値ではなかったので、その後ろから次の候補を探す
+                buffer = self._buffer = buffer[position:]
+                position = 0
+        
+        self._position = position
+        return None
+    
+    def _complete(self, candidate: str) -> Optional[str]:
+        try:
+            value = json.loads(candidate)
+        except json.JSONDecodeError as e:
+            return self._fail(str(e))
+        if self.accept is not None and not self.accept(value):
+            return None
+        self.value = value
+        self._buffer = candidate
+        self.state = COMPLETE
+        return self.state
+    
+    def _fail(self, error: str) -> str:
+        self.error = error
+        self.state = MALFORMED
+        return self.state
+    
+    @property
+    def text(self) -> str:
+        """候補の開始から現在（完成していれば終わり）までのテキスト"""
+        return self._buffer
@@ -0,0 +1,256 @@
+#!/usr/bin/env python3
+"""
+LLM Response Cache
+DeepSeek API の応答を SQLite に保存し、同じリクエストには API を呼ばずに保存済みの応答を返す
+キーはモデル・メッセージ（システム / ユーザープロンプト）・サンプリングパラメータから求めたハッシュ
+
+有効期限（ttl）を過ぎた応答は使わず、合計サイズが max_bytes を超えたら最後に使われた時刻が古いものから消す
+ヒット時は、元の呼び出しにかかった時間と使用トークン数から節約できた API 時間と費用を集計する
+
+使い方:
+    python llm_cache.py stats   # 保存件数・サイズを表示
+    python llm_cache.py clear   # 全件削除
+"""
+
+import os
+import sys
+import json
+import time
+import sqlite3
+import hashlib
+import logging
+import threading
+from pathlib import Path
+from typing import Any, Callable, Dict, Optional
+
+try:
+    import httpx
+except ImportError:
+    httpx = None
+
+# Add current directory to path
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from config import CACHE_DIR, LLM_CACHE_CONFIG
+from json_scanner import load_json_response
+
+logger = logging.getLogger(__name__)
+
+# キーに含めるリクエストの項目。これ以外（stream など）は応答の内容に影響しない
+KEY_FIELDS = ('model', 'messages', 'temperature', 'top_p', 'max_tokens', 'response_format')
+
+def cache_key(payload: Dict, variant: Optional[str] = None) -> str:
+    """リクエスト本文から決定的なキーを求める（項目の順序や空白の違いを吸収する）
+    
+    variant は同じリクエストでも応答の扱いが違う呼び出し（JSON が閉じた時点で打ち切るものなど）を分ける
+    """
+    canonical = {field: payload[field] for field in KEY_FIELDS if field in payload}
+    if variant:
+        canonical['variant'] = variant
+    encoded = json.dumps(canonical, ensure_ascii=False, sort_keys=True, separators=(',', ':'))
+    return hashlib.sha256(encoded.encode('utf-8')).hexdigest()
+
+def reply_has_json(body: Dict, openers: str = '{', accept: Optional[Callable[[Any], bool]] = None) -> bool:
+    """chat completions の応答本文に、呼び出し側が使える JSON（accept(value) が True）があるか
+    
+    JSON を求める呼び出しの get_or_call(is_valid=...) に使う
+    """
+    try:
+        value = load_json_response(body['choices'][0]['message']['content'], openers)
+    except (json.JSONDecodeError, KeyError, IndexError, TypeError):
+        return False
+    return accept is None or accept(value)
+
+
+class LLMResponseCache:
+    def __init__(self, db_path: Optional[Path] = None, ttl: int = LLM_CACHE_CONFIG['ttl'],
+                 max_bytes: int = LLM_CACHE_CONFIG['max_bytes']):
+        self.db_path = Path(db_path or CACHE_DIR / 'llm_cache.db')
+        self.db_path.parent.mkdir(parents=True, exist_ok=True)
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        
+        # スケジューラのワーカースレッドから共有するので、接続はロックで直列化する
+        self._lock = threading.Lock()
+        self.conn = sqlite3.connect(str(self.db_path), timeout=30, check_same_thread=False)
+        self.conn.row_factory = sqlite3.Row
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        with self.conn:
+            self.conn.execute('''
+                CREATE TABLE IF NOT EXISTS llm_responses (
+                    key TEXT PRIMARY KEY,
+                    model TEXT,
+                    response TEXT NOT NULL,
+                    size INTEGER NOT NULL,
+                    elapsed REAL,
+                    prompt_tokens INTEGER,
+                    completion_tokens INTEGER,
+                    created_at REAL NOT NULL,
+                    last_used REAL NOT NULL,
+                    hits INTEGER NOT NULL DEFAULT 0
+                )
+            ''')
+            self.conn.execute("CREATE INDEX IF NOT EXISTS idx_llm_responses_last_used ON llm_responses(last_used)")
+        self.purge_expired()
+        
+        # 実行ごと（プロセスごと）の統計
+        self.hits = 0
+        self.misses = 0
+        self.seconds_saved = 0.0
+        self.tokens_saved = 0
+        self.cost_saved = 0.0
+    
+    def get(self, payload: Dict, variant: Optional[str] = None) -> Optional[Dict]:
+        """有効期限内の応答があれば JSON を返し、ヒットとして集計する"""
+        key = cache_key(payload, variant)
+        now = time.time()
+        with self._lock:
+            row = self.conn.execute(
+                "SELECT * FROM llm_responses WHERE key = ? AND created_at > ?", (key, now - self.ttl)
+            ).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+            with self.conn:
+                self.conn.execute(
+                    "UPDATE llm_responses SET last_used = ?, hits = hits + 1 WHERE key = ?", (now, key)
+                )
+            
+            self.hits += 1
+            self.seconds_saved += row['elapsed'] or 0.0
+            prompt_tokens = row['prompt_tokens'] or 0
+            completion_tokens = row['completion_tokens'] or 0
+            self.tokens_saved += prompt_tokens + completion_tokens
+            self.cost_saved += (prompt_tokens * LLM_CACHE_CONFIG['input_price'] +
+                                completion_tokens * LLM_CACHE_CONFIG['output_price']) / 1_000_000
+        return json.loads(row['response'])
+    
+    def put(self, payload: Dict, response: Dict, elapsed: Optional[float] = None, variant: Optional[str] = None):
+        """成功した応答を保存し、合計サイズが上限を超えていれば古いものから消す"""
+        encoded = json.dumps(response, ensure_ascii=False)
+        usage = response.get('usage') or {}
+        now = time.time()
+        with self._lock, self.conn:
+            self.conn.execute('''
+                INSERT OR REPLACE INTO llm_responses
+                    (key, model, response, size, elapsed, prompt_tokens, completion_tokens, created_at, last_used)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+            ''', (cache_key(payload, variant), payload.get('model'), encoded, len(encoded.encode('utf-8')), elapsed,
+                  usage.get('prompt_tokens'), usage.get('completion_tokens'), now, now))
+            self._evict()
+    
+    def get_or_call(self, payload: Dict, call: Callable[[], 'httpx.Response'],
+                    variant: Optional[str] = None,
+                    is_valid: Optional[Callable[[Dict], bool]] = None) -> 'httpx.Response':
+        """保存済みの応答があれば 200 のレスポンスとして返し、なければ call() で API を呼んで保存する
+        
+        呼び出し側は response.status_code / response.json() をそのまま使える
+        最後まで受け取れなかった応答は保存しない。途中で打ち切った応答（stopped_early）は
+        打ち切りを求めた呼び出し（variant 付き）の分だけ保存する
+        is_valid を渡すと、is_valid(応答本文) が True の応答だけ保存する（JSON が読めない応答を
+        有効期限いっぱい返し続けないように。保存しなかった応答は次の実行で呼び直す）
+        """
+        cached = self.get(payload, variant)
+        if cached is not None:
+            return httpx.Response(200, json=cached)
+        
+        started = time.monotonic()
+        response = call()
+        if response.extensions.get('incomplete') or (response.extensions.get('stopped_early') and not variant):
+            return response
+        if response.status_code == 200:
+            try:
+                body = response.json()
+                if is_valid is not None and not is_valid(body):
+                    logger.info("Not caching an LLM response the caller cannot use")
+                    return response
+                self.put(payload, body, time.monotonic() - started, variant)
+            except (ValueError, sqlite3.Error) as e:
+                logger.warning(f"Failed to cache LLM response: {e}")
+        return response
+    
+    def _evict(self):
+        total = self.conn.execute("SELECT COALESCE(SUM(size), 0) FROM llm_responses").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        evicted = 0
+        for row in self.conn.execute("SELECT key, size FROM llm_responses ORDER BY last_used").fetchall():
+            if total <= self.max_bytes:
+                break
+            self.conn.execute("DELETE FROM llm_responses WHERE key = ?", (row['key'],))
+            total -= row['size']
+            evicted += 1
+        logger.info(f"LLM cache: evicted {evicted} entries to stay under {self.max_bytes} bytes")
+    
+    def purge_expired(self) -> int:
+        with self._lock, self.conn:
+            cursor = self.conn.execute("DELETE FROM llm_responses WHERE created_at <= ?", (time.time() - self.ttl,))
+        return cursor.rowcount
+    
+    def clear(self) -> int:
+        with self._lock, self.conn:
+            cursor = self.conn.execute("DELETE FROM llm_responses")
+        return cursor.rowcount
+    
+    def stats(self) -> Dict:
+        lookups = self.hits + self.misses
+        with self._lock:
+            row = self.conn.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM llm_responses").fetchone()
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': round(self.hits / lookups, 3) if lookups else 0.0,
+            'api_seconds_saved': round(self.seconds_saved, 1),
+            'tokens_saved': self.tokens_saved,
+            'cost_saved_usd': round(self.cost_saved, 4),
+            'entries': row[0],
+            'bytes': row[1]
+        }
+    
+    def log_stats(self):
+        stats = self.stats()
+        logger.info(
+            f"LLM cache: {stats['hits']}/{stats['hits'] + stats['misses']} hits ({stats['hit_rate']:.0%}), "
+            f"saved {stats['api_seconds_saved']}s of API time, {stats['tokens_saved']} tokens "
+            f"(${stats['cost_saved_usd']}); {stats['entries']} entries, {stats['bytes']} bytes"
+        )
+    
+    def close(self):
+        self.conn.close()
+
+
+_cache: Optional[LLMResponseCache] = None
+_cache_lock = threading.Lock()
+
+def get_llm_cache() -> LLMResponseCache:
+    """プロセス内で共有するキャッシュ。呼び出し元が違っても同じプロンプトなら応答を使い回す"""
+    global _cache
+    with _cache_lock:
+        if _cache is None:
+            _cache = LLMResponseCache()
+        return _cache
+
+
+def main():
+    import argparse
+    
+    parser = argparse.ArgumentParser(description="LLM response cache maintenance")
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    subparsers.add_parser('stats', help="Show the number and size of cached responses")
+    subparsers.add_parser('clear', help="Delete all cached responses")
+    args = parser.parse_args()
+    
+    cache = LLMResponseCache()
+    try:
+        if args.command == 'stats':
+            stats = cache.stats()
+            print(f"{stats['entries']} responses, {stats['bytes']} bytes ({cache.db_path})")
+        elif args.command == 'clear':
+            print(f"Deleted {cache.clear()} cached responses")
+    finally:
+        cache.close()
+
+
+if __name__ == "__main__":
+    main()
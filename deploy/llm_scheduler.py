@@ -0,0 +1,169 @@
+#!/usr/bin/env python3
+"""
+LLM Job Scheduler
+DeepSeek API 呼び出しの共通スケジューラ
+同時実行数・毎分リクエスト数・毎分トークン数の上限を守りながら記事ごとのジョブを並行に実行する
+
+ジョブ（記事1件分の処理）は map() でスレッドに振り分け、API を呼ぶ箇所は request() で枠を確保する
+1回の実行の LLM 段階は、レイテンシの合計ではなくおよそ max(レイテンシ) × ceil(件数 / 同時実行数) で終わる
+"""
+
+import time
+import logging
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Iterable, List, Optional
+
+from config import LLM_CONFIG
+
+logger = logging.getLogger(__name__)
+
+WINDOW_SECONDS = 60.0
+
+def estimate_tokens(messages: List[Dict], max_tokens: int) -> int:
+    """リクエストのトークン数の見積もり。日本語は1文字1トークン前後なので文字数をそのまま使う（多めに見積もる）"""
+    return sum(len(message.get('content', '')) for message in messages) + max_tokens
+
+
+class Reservation:
+    """毎分予算の1リクエスト分の確保。応答の usage が分かれば settle() で実際の値に直す"""
+    
+    def __init__(self, budget: 'MinuteBudget', timestamp: float, tokens: int):
+        self._budget = budget
+        self.timestamp = timestamp
+        self.tokens = tokens
+    
+    def settle(self, actual_tokens: Optional[int]):
+        if actual_tokens is not None:
+            self._budget.adjust(self, actual_tokens)
+
+
+class MinuteBudget:
+    """直近 60 秒間のリクエスト数とトークン数を数えるスライディングウィンドウ"""
+    
+    def __init__(self, requests_per_minute: int, tokens_per_minute: int):
+        self.requests_per_minute = requests_per_minute
+        self.tokens_per_minute = tokens_per_minute
+        self._log: deque = deque()
+        self._tokens = 0
+        self._condition = threading.Condition()
+    
+    def _expire(self, now: float):
+        while self._log and self._log[0].timestamp <= now - WINDOW_SECONDS:
+            self._tokens -= self._log.popleft().tokens
+    
+    def _wait_time(self, now: float, tokens: int) -> float:
+        if not self._log:
+            # 1件で上限を超える見積もりでも、ウィンドウが空なら通す
+            return 0.0
+        if len(self._log) >= self.requests_per_minute:
+            return self._log[0].timestamp + WINDOW_SECONDS - now
+        if self._tokens + tokens > self.tokens_per_minute:
+            # 古いものから順に抜けていったとき、収まるようになる時刻まで待つ
+            remaining = self._tokens
+            for reservation in self._log:
+                remaining -= reservation.tokens
+                if remaining + tokens <= self.tokens_per_minute:
+                    return reservation.timestamp + WINDOW_SECONDS - now
+        return 0.0
+    
+    def reserve(self, tokens: int) -> Reservation:
+        """予算に空きができるまで待って確保する"""
+        with self._condition:
+            while True:
+                now = time.monotonic()
+                self._expire(now)
+                wait = self._wait_time(now, tokens)
+                if wait <= 0:
+                    reservation = Reservation(self, now, tokens)
+                    self._log.append(reservation)
+                    self._tokens += tokens
+                    return reservation
+                self._condition.wait(wait)
+    
+    def adjust(self, reservation: Reservation, actual_tokens: int):
+        with self._condition:
+            if reservation in self._log:
+                self._tokens += actual_tokens - reservation.tokens
+            reservation.tokens = actual_tokens
+            self._condition.notify_all()
+    
+    def usage(self) -> Dict:
+        with self._condition:
+            self._expire(time.monotonic())
+            return {'requests': len(self._log), 'tokens': self._tokens}
+
+
+class LLMScheduler:
+    def __init__(self, max_in_flight: int = LLM_CONFIG['max_in_flight'],
+                 requests_per_minute: int = LLM_CONFIG['requests_per_minute'],
+                 tokens_per_minute: int = LLM_CONFIG['tokens_per_minute']):
+        self.max_in_flight = max_in_flight
+        self.budget = MinuteBudget(requests_per_minute, tokens_per_minute)
+        self._in_flight = threading.BoundedSemaphore(max_in_flight)
+        
+        self._stats_lock = threading.Lock()
+        self.requests = 0
+        self.wait_seconds = 0.0
+    
+    @contextmanager
+    def request(self, tokens: int):
+        """API を1回呼ぶ間、同時実行の枠と毎分の予算を確保する
+        
+        with scheduler.request(tokens) as reservation:
+            response = client.post(...)
+            reservation.settle(response.json()['usage']['total_tokens'])
+        """
+        started = time.monotonic()
+        with self._in_flight:
+            # 枠を確保してから予算を取るので、予算を取った時刻と実際の送信時刻がずれない
+            reservation = self.budget.reserve(tokens)
+            with self._stats_lock:
+                self.requests += 1
+                self.wait_seconds += time.monotonic() - started
+            yield reservation
+    
+    def map(self, func: Callable[[Any], Any], items: Iterable[Any]) -> List[Any]:
+        """items の各要素に func を並行に適用し、入力順に結果を返す（失敗は例外オブジェクト）
+        
+        結果は終わった順に受け取るので、遅い1件が他の記事の処理を待たせない
+        """
+        items = list(items)
+        results: List[Any] = [None] * len(items)
+        if not items:
+            return results
+        
+        started = time.monotonic()
+        with ThreadPoolExecutor(max_workers=min(self.max_in_flight, len(items))) as executor:
+            futures = {executor.submit(func, item): position for position, item in enumerate(items)}
+            for done, future in enumerate(as_completed(futures), 1):
+                position = futures[future]
+                try:
+                    results[position] = future.result()
+                except Exception as e:
+                    logger.error(f"LLM job {position + 1} failed: {e}")
+                    results[position] = e
+                logger.info(f"LLM jobs: {done}/{len(items)} done ({time.monotonic() - started:.1f}s)")
+        
+        return results
+    
+    def stats(self) -> Dict:
+        return {
+            'requests': self.requests,
+            'wait_seconds': round(self.wait_seconds, 1),
+            'window': self.budget.usage()
+        }
+
+
+_scheduler: Optional[LLMScheduler] = None
+_scheduler_lock = threading.Lock()
+
+def get_llm_scheduler() -> LLMScheduler:
+    """プロセス内で共有するスケジューラ。呼び出し元が違っても同じ上限を分け合う"""
+    global _scheduler
+    with _scheduler_lock:
+        if _scheduler is None:
+            _scheduler = LLMScheduler()
+        return _scheduler
@@ -0,0 +1,165 @@
+#!/usr/bin/env python3
+"""
+Streaming Chat Completions
+DeepSeek API を stream: true で呼び、SSE のチャンクを受け取る
+JSON を求める呼び出し（openers を指定）だけ本文を IncrementalJSONScanner に流し、
+対象の JSON が閉じた時点で接続を閉じて残りの出力を待たず、括弧の対応が崩れた時点で失敗として打ち切る
+文章を求める呼び出しは [DONE] まで読む
+
+戻り値は stream: false のときと同じ形の本文を持つ httpx.Response なので、
+呼び出し側（応答キャッシュ・スケジューラの精算・JSON 抽出）はそのまま使える
+最初のトークンまでの時間（TTFT）と完了までの時間は実行ごとに集計する
+"""
+
+import json
+import time
+import logging
+import threading
+from typing import Any, Callable, Dict, List, Optional
+
+try:
+    import httpx
+except ImportError:
+    httpx = None
+
+from config import LLM_CONFIG
+from json_scanner import COMPLETE, MALFORMED, IncrementalJSONScanner
+
+logger = logging.getLogger(__name__)
+
+
+class MalformedStreamError(Exception):
+    """ストリームの途中で本文の JSON が壊れていると分かった"""
+
+
+class StreamMetrics:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.ttft: List[float] = []
+        self.complete: List[float] = []
+        self.early_stops = 0
+        self.malformed = 0
+    
+    def record(self, ttft: Optional[float], complete: float, outcome: Optional[str]):
+        with self._lock:
+            if ttft is not None:
+                self.ttft.append(ttft)
+            self.complete.append(complete)
+            if outcome == COMPLETE:
+                self.early_stops += 1
+            elif outcome == MALFORMED:
+                self.malformed += 1
+    
+    def stats(self) -> Dict:
+        def summary(values: List[float]) -> Dict:
+            if not values:
+                return {}
+            ordered = sorted(values)
+            return {
+                'mean': round(sum(ordered) / len(ordered), 2),
+                'p50': round(ordered[len(ordered) // 2], 2),
+                'max': round(ordered[-1], 2)
+            }
+        
+        with self._lock:
+            return {
+                'streams': len(self.complete),
+                'ttft': summary(self.ttft),
+                'complete': summary(self.complete),
+                'early_stops': self.early_stops,
+                'malformed': self.malformed
+            }
+    
+    def log_stats(self):
+        stats = self.stats()
+        if not stats['streams']:
+            return
+        logger.info(
+            f"LLM streams: {stats['streams']}, TTFT {stats['ttft'].get('p50')}s p50 / {stats['ttft'].get('max')}s max, "
+            f"complete {stats['complete'].get('p50')}s p50 / {stats['complete'].get('max')}s max, "
+            f"{stats['early_stops']} stopped once the JSON closed, {stats['malformed']} aborted as malformed"
+        )
+
+
+_metrics = StreamMetrics()
+
+def get_stream_metrics() -> StreamMetrics:
+    """プロセス内で共有する集計（呼び出し元ごとのクライアントが違っても合算する）"""
+    return _metrics
+
+
+def stream_chat_completion(client: 'httpx.Client', api_url: str, payload: Dict, openers: Optional[str] = None,
+                           accept: Optional[Callable[[Any], bool]] = None,
+                           idle_timeout: float = LLM_CONFIG['stream_idle_timeout']) -> 'httpx.Response':
+    """payload を stream: true で送り、stream: false と同じ形の本文を持つレスポンスを返す
+    
+    openers（'{' や '['）を指定すると、その括弧で始まる JSON が閉じた時点で読むのをやめる
+    （レスポンスの extensions['stopped_early'] が True）。本文の JSON が崩れていた場合は MalformedStreamError
+    accept を指定すると、閉じた JSON のうち accept(value) が True のものでだけ打ち切る
+    [DONE] を受け取る前に接続が終わった場合は extensions['incomplete'] が True
+    全体のタイムアウトではなく、チャンク間の無通信時間（idle_timeout）で打ち切る
+    """
+    started = time.monotonic()
+    ttft = None
+    content: List[str] = []
+    reasoning: List[str] = []
+    usage = None
+    finish_reason = None
+    scanner = IncrementalJSONScanner(openers, accept) if openers else None
+    done = False
+    timeout = httpx.Timeout(idle_timeout, connect=10.0)
+    
+    request_body = {**payload, "stream": True, "stream_options": {"include_usage": True}}
+    
+    with client.stream('POST', api_url, json=request_body, timeout=timeout) as response:
+        if response.status_code != 200:
+            response.read()
+            return httpx.Response(response.status_code, content=response.content, headers=response.headers)
+        
+        for line in response.iter_lines():
+            if not line.startswith('data:'):
+                continue
+            data = line[5:].strip()
+            if data == '[DONE]':
+                done = True
+                break
+            try:
+                chunk = json.loads(data)
+            except ValueError:
+                continue
+            usage = chunk.get('usage') or usage
+            for choice in chunk.get('choices') or []:
+                delta = choice.get('delta') or {}
+                finish_reason = choice.get('finish_reason') or finish_reason
+                if delta.get('reasoning_content'):
+                    reasoning.append(delta['reasoning_content'])
+                if delta.get('content'):
+                    content.append(delta['content'])
+                    if scanner is not None:
+                        scanner.feed(delta['content'])
+                if ttft is None and (delta.get('reasoning_content') or delta.get('content')):
+                    ttft = time.monotonic() - started
+            if scanner is not None and scanner.state is not None:
+                # JSON が閉じた（または壊れた）ら残りは読まずに接続を閉じる
+                break
+    
+    elapsed = time.monotonic() - started
+    outcome = scanner.state if scanner is not None else None
+    get_stream_metrics().record(ttft, elapsed, outcome)
+    if outcome == MALFORMED:
+        raise MalformedStreamError(f"malformed JSON after {elapsed:.1f}s: {scanner.error}")
+    
+    message = {"role": "assistant", "content": ''.join(content)}
+    if reasoning:
+        message["reasoning_content"] = ''.join(reasoning)
+    body = {
+        "model": payload.get("model"),
+        "choices": [{"index": 0, "message": message, "finish_reason": finish_reason or "stop"}]
+    }
+    if usage:
+        # 途中で閉じた場合は usage が届かないので、スケジューラは見積もりのまま精算する
+        body["usage"] = usage
+    return httpx.Response(200, json=body, extensions={
+        'stopped_early': outcome == COMPLETE,
+        'incomplete': outcome is None and not done
+    })
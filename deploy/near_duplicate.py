@@ -0,0 +1,142 @@
+#!/usr/bin/env python3
+"""
+Near Duplicate Detection
+文字 n-gram シングル + MinHash + LSH バンディングによるタイトルの近似重複検出
+空白で区切られない日本語タイトルでも、候補探索は登録件数に対して準線形で済む
+"""
+
+import re
+import random
+import hashlib
+import unicodedata
+from collections import defaultdict
+from typing import Dict, Hashable, List, Optional, Set, Tuple
+
+DEFAULT_THRESHOLD = 0.5
+
+# 正規化で取り除く空白・記号（全角は NFKC で半角に寄せてから落とす）
+_NOISE_PATTERN = re.compile(r'[\s\W_]+', re.UNICODE)
+
+def normalize_title(text: str) -> str:
+    """NFKC 正規化・小文字化し、空白と記号を取り除く"""
+    return _NOISE_PATTERN.sub('', unicodedata.normalize('NFKC', text or '').lower())
+
+def shingles(text: str, size: int = 3) -> Set[str]:
+    normalized = normalize_title(text)
+    if len(normalized) <= size:
+        return {normalized} if normalized else set()
+    return {normalized[i:i + size] for i in range(len(normalized) - size + 1)}
+
+def jaccard(a: Set[str], b: Set[str]) -> float:
+    if not a or not b:
+        return 0.0
+    return len(a & b) / len(a | b)
+
+def _lsh_params(threshold: float, num_perm: int, recall: float = 0.9) -> Tuple[int, int]:
+    """閾値ちょうどの類似度のペアが recall 以上の確率で候補に入る範囲で、最も行数の多い (バンド数, 行数) を選ぶ
+    
+    行数が多いほど無関係な候補は減る。最終判定は厳密な Jaccard で行うので、候補は広めでよい
+    """
+    best = (num_perm, 1)
+    for rows in range(1, num_perm + 1):
+        bands = num_perm // rows
+        if 1 - (1 - threshold ** rows) ** bands >= recall:
+            best = (bands, rows)
+    return best
+
+
+class NearDuplicateIndex:
+    def __init__(self, threshold: float = DEFAULT_THRESHOLD, shingle_size: int = 3,
+                 num_perm: int = 64, seed: int = 1):
+        self.threshold = threshold
+        self.shingle_size = shingle_size
+        self.num_perm = num_perm
+        self.bands, self.rows = _lsh_params(threshold, num_perm)
+        
+        # 64bit ハッシュとランダムマスクの XOR を各置換の代わりに使う
+        rng = random.Random(seed)
+        self._masks = [rng.getrandbits(64) for _ in range(num_perm)]
+        
+        self._buckets: List[Dict[Tuple[int, ...], List[Hashable]]] = [defaultdict(list) for _ in range(self.bands)]
+        self._shingles: Dict[Hashable, Set[str]] = {}
+    
+    def __len__(self) -> int:
+        return len(self._shingles)
+    
+    def _signature(self, shingle_set: Set[str]) -> List[int]:
+        hashes = [int.from_bytes(hashlib.blake2b(s.encode('utf-8'), digest_size=8).digest(), 'big')
+                  for s in shingle_set]
+        return [min(map(mask.__xor__, hashes)) for mask in self._masks]
+    
+    def _band_keys(self, signature: List[int]):
+        for band in range(self.bands):
+            start = band * self.rows
+            yield band, tuple(signature[start:start + self.rows])
+    
+    def _insert(self, key: Hashable, shingle_set: Set[str], signature: List[int]):
+        self._shingles[key] = shingle_set
+        for band, band_key in self._band_keys(signature):
+            self._buckets[band][band_key].append(key)
+    
+    def add(self, key: Hashable, text: str):
+        shingle_set = shingles(text, self.shingle_size)
+        if shingle_set:
+            self._insert(key, shingle_set, self._signature(shingle_set))
+    
+    def query(self, text: str) -> List[Tuple[Hashable, float]]:
+        """threshold 以上の類似度を持つ登録済みキーを (キー, Jaccard) で返す"""
+        shingle_set = shingles(text, self.shingle_size)
+        if not shingle_set:
+            return []
+        return self._verify(shingle_set, self._candidates(self._signature(shingle_set)))
+    
+    def _candidates(self, signature: List[int]) -> Set[Hashable]:
+        candidates = set()
+        for band, band_key in self._band_keys(signature):
+            candidates.update(self._buckets[band].get(band_key, ()))
+        return candidates
+    
+    def _verify(self, shingle_set: Set[str], candidates: Set[Hashable]) -> List[Tuple[Hashable, float]]:
+        matches = []
+        for key in candidates:
+            similarity = jaccard(shingle_set, self._shingles[key])
+            if similarity >= self.threshold:
+                matches.append((key, similarity))
+        return sorted(matches, key=lambda match: match[1], reverse=True)
+    
+    def find_duplicate(self, text: str) -> Optional[Hashable]:
+        matches = self.query(text)
+        return matches[0][0] if matches else None
+    
+    def add_if_new(self, key: Hashable, text: str) -> bool:
+        """近似重複がなければ登録して True、あれば登録せず False を返す"""
+        shingle_set = shingles(text, self.shingle_size)
+        if not shingle_set:
+            return True
+        
+        signature = self._signature(shingle_set)
+        if self._verify(shingle_set, self._candidates(signature)):
+            return False
+        
+        self._insert(key, shingle_set, signature)
+        return True
+
+
+def remove_near_duplicates(articles: List[Dict], threshold: float = DEFAULT_THRESHOLD,
+                           shingle_size: int = 3) -> List[Dict]:
+    """URL の完全一致とタイトルの近似重複を除き、最初に現れた記事を残す"""
+    index = NearDuplicateIndex(threshold=threshold, shingle_size=shingle_size)
+    seen_urls = set()
+    unique_articles = []
+    
+    for position, article in enumerate(articles):
+        url = article.get('url', '')
+        if url and url in seen_urls:
+            continue
+        
+        if index.add_if_new(position, article.get('title', '')):
+            unique_articles.append(article)
+            if url:
+                seen_urls.add(url)
+    
+    return unique_articles
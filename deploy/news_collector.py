@@ -13,6 +13,9 @@ from typing import Dict, List
 import hashlib
 import time
 
+from json_scanner import load_json_response
+from llm_cache import get_llm_cache, reply_has_json
+
 logger = logging.getLogger(__name__)
 
 class NewsCollector:
@@ -23,6 +26,7 @@ class NewsCollector:
         
         self.regions = ["北米", "ヨーロッパ", "アジア", "中東", "アフリカ", "南米", "オセアニア"]
         self.categories = ["テクノロジー", "経済", "科学", "政治", "文化", "スポーツ", "環境", "健康"]
+        self.cache = get_llm_cache()
         
     def generate_global_news(self, date: str = None) -> List[Dict]:
         """
@@ -93,12 +97,7 @@ class NewsCollector:
                     
                     # Parse JSON response
                     try:
-                        if "```json" in content:
-                            content = content.split("```json")[1].split("```")[0]
-                        elif "```" in content:
-                            content = content.split("```")[1].split("```")[0]
-                        
-                        news_data = json.loads(content.strip())
+                        news_data = load_json_response(content)
                         
                         for article in news_data.get("articles", []):
                             # Generate unique ID
@@ -161,32 +160,30 @@ class NewsCollector:
         """
         
         try:
-            response = httpx.post(
+            payload = {
+                "model": self.model,
+                "messages": [
+                    {"role": "system", "content": "あなたは多言語対応の国際ニュースアナリストです。"},
+                    {"role": "user", "content": prompt}
+                ],
+                "temperature": 0.3,
+                "max_tokens": 1000
+            }
+            response = self.cache.get_or_call(payload, lambda: httpx.post(
                 self.api_url,
-                json={
-                    "model": self.model,
-                    "messages": [
-                        {"role": "system", "content": "あなたは多言語対応の国際ニュースアナリストです。"},
-                        {"role": "user", "content": prompt}
-                    ],
-                    "temperature": 0.3,
-                    "max_tokens": 1000
-                },
+                json=payload,
                 headers={
                     "Authorization": f"Bearer {self.api_key}",
                     "Content-Type": "application/json"
                 },
                 timeout=30.0
-            )
+            ), is_valid=reply_has_json)
             
             if response.status_code == 200:
                 result = response.json()
                 content = result['choices'][0]['message']['content']
                 
-                if "```json" in content:
-                    content = content.split("```json")[1].split("```")[0]
-                    
-                return json.loads(content.strip())
+                return load_json_response(content)
             else:
                 return {"error": f"Translation failed: {response.status_code}"}
                 
@@ -11,79 +11,52 @@ import logging
 import hashlib
 from datetime import datetime, timedelta
 from typing import Dict, List, Optional
-import xml.etree.ElementTree as ET
 from urllib.parse import urlparse
 
-try:
-    import feedparser
-except ImportError:
-    feedparser = None
-
-import httpx
+from feed_consumer import FeedConsumerMixin
+from feed_state import FeedStateStore
+from fetch_engine import FeedFetchEngine
 from news_sources import NEWS_SOURCES
+from seen_index import SeenArticleIndex
 
 logger = logging.getLogger(__name__)
 
-class NewsFetcher:
-    def __init__(self):
+class NewsFetcher(FeedConsumerMixin):
+    def __init__(self, seen_namespace: str = 'news_fetcher'):
         self.sources = NEWS_SOURCES['rss_feeds']
-        self.client = httpx.Client(
-            timeout=30.0,
-            headers={
-                'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36'
-            }
-        )
+        self.feed_state = FeedStateStore()
+        self.fetch_engine = FeedFetchEngine(feed_state=self.feed_state)
+        self.seen_index = SeenArticleIndex(seen_namespace)
         self.fetched_articles = []
         self.seen_urls = set()
         
-    def fetch_all_feeds(self, max_per_feed: int = 5) -> List[Dict]:
+    def fetch_all_feeds(self, max_per_feed: int = 5, only_new: bool = False) -> List[Dict]:
         """
         Fetch news from all configured RSS feeds
+        only_new: 前回までの実行で取得済みの記事を除き、新規・変更のあった記事だけを返す
+                  （各フィードは前回取り込んだ最新エントリに達した時点でパースを打ち切る）
+                  処理を終えた記事は commit_seen() で記録する（記録するまでは次回も新規として返る）
         """
-        all_articles = []
-        
-        for feed_info in self.sources:
-            try:
-                logger.info(f"Fetching from {feed_info['name']}")
-                articles = self.fetch_rss_feed(feed_info, max_per_feed)
-                all_articles.extend(articles)
-                logger.info(f"Fetched {len(articles)} articles from {feed_info['name']}")
-            except Exception as e:
-                logger.error(f"Error fetching {feed_info['name']}: {str(e)}")
+        all_articles = self._fetch_feed_articles(self.sources, max_per_feed, stop_at_watermark=only_new)
                 
         # Remove duplicates
         unique_articles = self._remove_duplicates(all_articles)
         logger.info(f"Total unique articles: {len(unique_articles)}")
         
-        return unique_articles
+        return self._select_new(unique_articles, only_new)
     
-    def fetch_rss_feed(self, feed_info: Dict, max_items: int = 5) -> List[Dict]:
+    def fetch_rss_feed(self, feed_info: Dict, max_items: int = 5, stop_at_watermark: bool = False) -> List[Dict]:
         """
         Fetch and parse a single RSS feed
         """
-        articles = []
-        
-        try:
-            response = self.client.get(feed_info['url'])
-            response.raise_for_status()
-            
-            if feedparser:
-                # Use feedparser if available
-                feed = feedparser.parse(response.text)
-                
-                for entry in feed.entries[:max_items]:
-                    article = self._parse_feed_entry(entry, feed_info)
-                    if article and article['url'] not in self.seen_urls:
-                        articles.append(article)
-                        self.seen_urls.add(article['url'])
-            else:
-                # Fallback to basic XML parsing
-                articles = self._parse_rss_xml(response.text, feed_info, max_items)
-                
-        except Exception as e:
-            logger.error(f"Failed to fetch {feed_info['url']}: {str(e)}")
-            
-        return articles
+        return self._fetch_feed_articles([feed_info], max_items, stop_at_watermark)
+    
+    def _article_from_entry(self, entry, feed_info: Dict) -> Optional[Dict]:
+        article = self._parse_feed_entry(entry, feed_info)
+        if article and article['url'] not in self.seen_urls:
+            self.seen_urls.add(article['url'])
+            return article
+        return None
     
     def _parse_feed_entry(self, entry: Dict, feed_info: Dict) -> Optional[Dict]:
         """
@@ -132,49 +105,6 @@ class NewsFetcher:
             logger.error(f"Error parsing entry: {str(e)}")
             return None
     
-    def _parse_rss_xml(self, xml_content: str, feed_info: Dict, max_items: int) -> List[Dict]:
-        """
-        Fallback XML parser for RSS feeds
-        """
-        articles = []
-        
-        try:
-            root = ET.fromstring(xml_content)
-            
-            # Find all items
-            items = root.findall('.//item')
-            if not items:
-                items = root.findall('.//entry')  # Atom format
-                
-            for item in items[:max_items]:
-                title_elem = item.find('title')
-                link_elem = item.find('link')
-                desc_elem = item.find('description') or item.find('summary')
-                pub_elem = item.find('pubDate') or item.find('published')
-                
-                if title_elem is not None and link_elem is not None:
-                    url = link_elem.text or link_elem.get('href', '')
-                    
-                    if url not in self.seen_urls:
-                        article = {
-                            'title': title_elem.text or '',
-                            'url': url,
-                            'content': self._clean_html(desc_elem.text if desc_elem is not None else ''),
-                            'source': feed_info['name'],
-                            'language': feed_info['lang'],
-                            'published': pub_elem.text if pub_elem is not None else datetime.utcnow().isoformat(),
-                            'fetch_timestamp': datetime.utcnow().isoformat(),
-                            'original_language': feed_info['lang'],
-                            'needs_translation': feed_info['lang'] != 'ja'
-                        }
-                        articles.append(article)
-                        self.seen_urls.add(url)
-                        
-        except Exception as e:
-            logger.error(f"XML parsing error: {str(e)}")
-            
-        return articles
-    
     def _clean_html(self, html_content: str) -> str:
         """
         Remove HTML tags and clean content
@@ -259,4 +189,6 @@ class NewsFetcher:
     
     def close(self):
         """Close HTTP client"""
-        self.client.close()
\ No newline at end of file
+        # HTTP クライアントは fetch_engine が取得ごとに開閉する
+        self.seen_index.close()
+        self.feed_state.close()
\ No newline at end of file
@@ -0,0 +1,153 @@
+#!/usr/bin/env python3
+"""
+Parse Executor
+feedparser / BeautifulSoup による CPU 負荷の高い解析をワーカープロセスで実行する
+イベントループ（取得処理）は I/O 待ちだけになり、解析は PARSE_WORKERS 個のワーカーで並列化される
+プールは get_parse_executor() でプロセス内の取得処理すべてが共有する
+
+投入中のジョブ数は max_pending までに抑え、小さなジョブは chunk_size 件ずつまとめて送る
+ワーカーで実行する関数は pickle できるようにモジュールの最上位に置き、素の dict / list を返す
+"""
+
+import asyncio
+import logging
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+
+try:
+    import feedparser
+except ImportError:
+    feedparser = None
+
+try:
+    from bs4 import BeautifulSoup
+except ImportError:
+    BeautifulSoup = None
+
+from config import PARSE_WORKERS
+
+logger = logging.getLogger(__name__)
+
+# ワーカーから返すエントリの項目
+ENTRY_FIELDS = ('title', 'link', 'summary', 'description', 'published', 'id')
+
+def feed_entries(content: bytes, max_items: int) -> List[Dict]:
+    """フィード本文を解析し、先頭 max_items 件のエントリを素の dict で返す"""
+    if feedparser is None:
+        from feed_parser import parse_feed
+        entries = parse_feed(content, max_items)
+    else:
+        entries = feedparser.parse(content).entries[:max_items]
+    return [{field: entry[field] for field in ENTRY_FIELDS if field in entry} for entry in entries]
+
+def select_links(html: bytes, item_selector: str, link_selector: Optional[str] = None,
+                 limit: int = 20) -> List[Tuple[str, str]]:
+    """CSS セレクタに一致する要素から (テキスト, href) を返す。link_selector は各要素内のリンク
+    
+    順位などの位置を保つため、link_selector に一致するものがない要素は None になる
+    """
+    soup = BeautifulSoup(html, 'html.parser')
+    links = []
+    for item in soup.select(item_selector)[:limit]:
+        element = item.select_one(link_selector) if link_selector else item
+        if element is not None:
+            links.append((element.text.strip(), element.get('href', '')))
+        else:
+            links.append(None)
+    return links
+
+def find_texts(html: str, tag: str, class_name: str, limit: int) -> List[str]:
+    """指定クラスの要素のテキストを返す"""
+    soup = BeautifulSoup(html, 'html.parser')
+    return [element.get_text().strip() for element in soup.find_all(tag, class_=class_name)[:limit]]
+
+def _run_chunk(func: Callable, chunk: Sequence[Tuple]) -> List[Any]:
+    # 1件の失敗でまとめて送った他のジョブを失わないよう、例外は結果として返す
+    results = []
+    for args in chunk:
+        try:
+            results.append(func(*args))
+        except Exception as e:
+            results.append(e)
+    return results
+
+
+class ParseExecutor:
+    def __init__(self, max_workers: Optional[int] = None, max_pending: Optional[int] = None,
+                 chunk_size: int = 4):
+        self.max_workers = PARSE_WORKERS if max_workers is None else max_workers
+        self.max_pending = max_pending or max(self.max_workers * 2, 2)
+        self.chunk_size = chunk_size
+        self._pool: Optional[ProcessPoolExecutor] = None
+        self._slots: Optional[Tuple[asyncio.AbstractEventLoop, asyncio.Semaphore]] = None
+    
+    def _get_pool(self) -> Optional[ProcessPoolExecutor]:
+        """ワーカープロセスを初回に起動する。起動できない環境（max_workers=0 を含む）では None"""
+        if self._pool is None and self.max_workers > 0:
+            try:
+                self._pool = ProcessPoolExecutor(max_workers=self.max_workers)
+            except (OSError, NotImplementedError) as e:
+                logger.warning(f"Process pool unavailable, parsing inline: {e}")
+                self.max_workers = 0
+        return self._pool
+    
+    def _semaphore(self) -> asyncio.Semaphore:
+        # asyncio.run ごとにイベントループが変わるので、ループごとに作り直す
+        loop = asyncio.get_running_loop()
+        if self._slots is None or self._slots[0] is not loop:
+            self._slots = (loop, asyncio.Semaphore(self.max_pending))
+        return self._slots[1]
+    
+    async def run(self, func: Callable, *args) -> Any:
+        """func(*args) をワーカーで実行して結果を待つ。投入中のジョブが max_pending 件に達している間は待つ"""
+        pool = self._get_pool()
+        if pool is None:
+            return func(*args)
+        
+        async with self._semaphore():
+            return await asyncio.get_running_loop().run_in_executor(pool, func, *args)
+    
+    async def map(self, func: Callable, jobs: Iterable[Tuple]) -> List[Any]:
+        """引数タプルの列を chunk_size 件ずつワーカーに送り、入力順に結果を返す（失敗は例外オブジェクト）"""
+        chunks = self._chunks(jobs)
+        results = await asyncio.gather(*(self.run(_run_chunk, func, chunk) for chunk in chunks))
+        return [result for chunk_results in results for result in chunk_results]
+    
+    def map_sync(self, func: Callable, jobs: Iterable[Tuple]) -> List[Any]:
+        """同期コード用の map。投入中のチャンクは max_pending 件までに抑える"""
+        chunks = self._chunks(jobs)
+        pool = self._get_pool()
+        if pool is None:
+            return [result for chunk in chunks for result in _run_chunk(func, chunk)]
+        
+        results: List[Any] = []
+        futures = []
+        for chunk in chunks:
+            if len(futures) >= self.max_pending:
+                results.extend(futures.pop(0).result())
+            futures.append(pool.submit(_run_chunk, func, chunk))
+        for future in futures:
+            results.extend(future.result())
+        return results
+    
+    def _chunks(self, jobs: Iterable[Tuple]) -> List[List[Tuple]]:
+        jobs = list(jobs)
+        return [jobs[i:i + self.chunk_size] for i in range(0, len(jobs), self.chunk_size)]
+    
+    def shutdown(self):
+        if self._pool is not None:
+            self._pool.shutdown(wait=True)
+            self._pool = None
+
+
+_executor: Optional[ParseExecutor] = None
+_executor_lock = threading.Lock()
+
+def get_parse_executor() -> ParseExecutor:
+    """プロセス内で共有する解析用プール。取得処理ごとにワーカーを起動しない（終了時にまとめて止まる）"""
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ParseExecutor()
+        return _executor
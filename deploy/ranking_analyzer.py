@@ -23,6 +23,10 @@ except ImportError:
     httpx = None
     BeautifulSoup = None
 
+from feed_state import FeedStateStore
+from fetch_engine import FeedFetchEngine, FetchResult
+from parse_executor import get_parse_executor, select_links
+
 logger = logging.getLogger(__name__)
 
 class NewsRankingAnalyzer:
@@ -69,29 +73,27 @@ class NewsRankingAnalyzer:
         self.pattern_analyzer = PatternAnalyzer()
         self.ranking_history = []
         
-        if httpx:
-            self.client = httpx.Client(
-                timeout=30.0,
-                headers={
-                    'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36'
-                }
-            )
-        else:
-            self.client = None
+        # ページごとの検証ヘッダ・取得間隔とホストごとのレイテンシを記録し、次回の取得に使う
+        self.feed_state = FeedStateStore()
+        self.fetch_engine = FeedFetchEngine(feed_state=self.feed_state)
+        self.parse_executor = get_parse_executor()
     
     def collect_all_rankings(self):
         """全ニュースサイトのランキングを収集"""
         all_rankings = {}
         
         # httpxが利用できない場合はダミーデータを返す
-        if not self.client or not BeautifulSoup:
+        if not httpx or not BeautifulSoup:
             logger.warning("httpx or BeautifulSoup not available, using dummy data")
             return self._get_dummy_rankings()
         
-        for site_name, config in self.news_sites.items():
+        # 全サイトを並行取得してから、登録順にパースする
+        site_names = list(self.news_sites)
+        results = self.fetch_engine.fetch_all_sync([self.news_sites[name] for name in site_names])
+        
+        for site_name, result, rankings in zip(site_names, results, self._parse_rankings(site_names, results)):
+            config = result.source
             try:
-                logger.info(f"Collecting rankings from {site_name}")
-                rankings = self.scrape_ranking(site_name, config)
                 all_rankings[site_name] = rankings
                 
                 # パターン分析
@@ -112,33 +114,42 @@ class NewsRankingAnalyzer:
     
     def scrape_ranking(self, site_name, config):
         """個別サイトのランキングをスクレイピング"""
-        try:
-            response = self.client.get(config['url'])
-            if response.status_code != 200:
-                logger.error(f"Failed to fetch {site_name}: {response.status_code}")
-                return []
-            
-            soup = BeautifulSoup(response.content, 'html.parser')
-            
-            rankings = []
-            items = soup.select(config['ranking_selector'])[:20]  # TOP20
+        result = self.fetch_engine.fetch_all_sync([config])[0]
+        return self._parse_rankings([site_name], [result])[0]
+    
+    def _parse_rankings(self, site_names, results: List[FetchResult]) -> List[List[Dict]]:
+        """取得済みのランキングページをワーカープロセスでまとめて解析し、サイトごとのランキングを返す"""
+        rankings = [[] for _ in results]
+        jobs = []
+        positions = []
+        
+        for position, (site_name, result) in enumerate(zip(site_names, results)):
+            config = result.source
+            if result.error:
+                logger.error(f"Failed to fetch {site_name}: {result.error}")
+            elif result.status_code != 200:
+                logger.error(f"Failed to fetch {site_name}: {result.status_code}")
+            else:
+                jobs.append((result.content, config['ranking_selector'], config['title_selector'], 20))  # TOP20
+                positions.append(position)
+        
+        for position, links in zip(positions, self.parse_executor.map_sync(select_links, jobs)):
+            if isinstance(links, Exception):
+                logger.error(f"Error in scrape_ranking for {site_names[position]}: {links}")
+                continue
             
-            for i, item in enumerate(items):
-                title_elem = item.select_one(config['title_selector'])
-                if title_elem:
-                    title_text = title_elem.text.strip()
-                    rankings.append({
+            config = results[position].source
+            for i, link in enumerate(links):
+                if link:
+                    title_text, url = link
+                    rankings[position].append({
                         'rank': i + 1,
                         'title': title_text,
-                        'url': title_elem.get('href', ''),
+                        'url': url,
                         'category': config['category']
                     })
-            
-            return rankings
-            
-        except Exception as e:
-            logger.error(f"Error in scrape_ranking for {site_name}: {e}")
-            return []
+        
+        return rankings
     
     def _get_dummy_rankings(self):
         """ダミーのランキングデータを生成"""
@@ -222,8 +233,8 @@ class NewsRankingAnalyzer:
     
     def close(self):
         """Close HTTP client"""
-        if self.client:
-            self.client.close()
+        # HTTP クライアントは fetch_engine が取得ごとに開閉し、解析用のプールはプロセス内で共有する
+        self.feed_state.close()
 
 
 class PatternAnalyzer:
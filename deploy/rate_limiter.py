@@ -0,0 +1,134 @@
+#!/usr/bin/env python3
+"""
+Async Rate Limiter
+ソース種別ごと・ホストごとのトークンバケット
+上限に達したリクエストは捨てずに、トークンが補充されるまで待たせる
+429 / 503 の Retry-After を受けたら、そのバケットを指定時間だけ止める
+"""
+
+import time
+import asyncio
+import logging
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+from typing import Dict, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# ソース種別ごとの上限 (回数, 秒)。API 的な制限があるサービスだけ種別単位で絞る
+SOURCE_TYPE_LIMITS = {
+    'youtube': (100, 3600),
+    'twitter': (15, 900),
+    'reddit': (60, 60),
+}
+
+# 同一ホストへの上限 (回数, 秒) と瞬間的に許すリクエスト数。一般のニュースサイトはこれだけが掛かる
+HOST_LIMIT = (30, 60)
+HOST_BURST = 5
+
+# これより長い Retry-After は今回の実行では待たない
+MAX_RETRY_AFTER = 120.0
+
+def parse_retry_after(value: Optional[str]) -> Optional[float]:
+    """Retry-After ヘッダ（秒数または HTTP 日付）を待ち秒数に変換する"""
+    if not value:
+        return None
+    value = value.strip()
+    if value.isdigit():
+        return float(value)
+    try:
+        retry_at = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    if retry_at.tzinfo is None:
+        retry_at = retry_at.replace(tzinfo=timezone.utc)
+    return max((retry_at - datetime.now(timezone.utc)).total_seconds(), 0.0)
+
+
+class TokenBucket:
+    def __init__(self, max_calls: int, period: float, capacity: Optional[int] = None):
+        self.rate = max_calls / period
+        self.capacity = capacity or max_calls
+        self.tokens = float(self.capacity)
+        self.updated = time.monotonic()
+        self.blocked_until = 0.0
+        # 待っているリクエストを到着順に通す
+        self._lock = asyncio.Lock()
+    
+    def _refill(self, now: float):
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+    
+    async def acquire(self) -> float:
+        """トークンを1つ取得する。待った秒数を返す"""
+        started = time.monotonic()
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                self._refill(now)
+                if now < self.blocked_until:
+                    await asyncio.sleep(self.blocked_until - now)
+                    continue
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return time.monotonic() - started
+                await asyncio.sleep((1 - self.tokens) / self.rate)
+    
+    def block_for(self, seconds: float):
+        """Retry-After などで指定された時間、トークンを払い出さない"""
+        self.blocked_until = max(self.blocked_until, time.monotonic() + seconds)
+    
+    def level(self) -> Dict:
+        now = time.monotonic()
+        self._refill(now)
+        return {
+            'tokens': round(self.tokens, 2),
+            'capacity': self.capacity,
+            'rate_per_sec': round(self.rate, 4),
+            'blocked_for': round(max(self.blocked_until - now, 0.0), 1)
+        }
+
+
+class RateLimiter:
+    def __init__(self, type_limits: Optional[Dict[str, Tuple[int, float]]] = None,
+                 host_limit: Tuple[int, float] = HOST_LIMIT, host_burst: int = HOST_BURST):
+        self.type_buckets = {source_type: TokenBucket(max_calls, period)
+                             for source_type, (max_calls, period) in (type_limits or SOURCE_TYPE_LIMITS).items()}
+        self.host_limit = host_limit
+        self.host_burst = host_burst
+        self.host_buckets: Dict[str, TokenBucket] = {}
+        
+        self.waited = 0.0
+        self.throttled = 0
+    
+    def _host_bucket(self, host: str) -> TokenBucket:
+        if host not in self.host_buckets:
+            self.host_buckets[host] = TokenBucket(*self.host_limit, capacity=self.host_burst)
+        return self.host_buckets[host]
+    
+    async def acquire(self, source_type: str, host: str):
+        """種別とホストの両方のバケットからトークンを取るまで待つ"""
+        waited = 0.0
+        if source_type in self.type_buckets:
+            waited += await self.type_buckets[source_type].acquire()
+        waited += await self._host_bucket(host).acquire()
+        self.waited += waited
+        if waited > 0.01:
+            logger.debug(f"Rate limited {host} ({source_type}) for {waited:.2f}s")
+    
+    def throttle(self, source_type: str, host: str, seconds: float):
+        """サーバから 429 / 503 を受けたとき、ホスト（と API 種別）のバケットを止める"""
+        self.throttled += 1
+        self._host_bucket(host).block_for(seconds)
+        if source_type in self.type_buckets:
+            self.type_buckets[source_type].block_for(seconds)
+        logger.warning(f"{host} asked to back off for {seconds:.0f}s")
+    
+    def levels(self) -> Dict:
+        """監視用に各バケットの残量を返す"""
+        return {
+            'types': {source_type: bucket.level() for source_type, bucket in self.type_buckets.items()},
+            'hosts': {host: bucket.level() for host, bucket in self.host_buckets.items()},
+            'waited_seconds': round(self.waited, 1),
+            'throttled': self.throttled
+        }
@@ -17,15 +17,13 @@ from typing import Dict, List, Optional
 # Add current directory to path
 sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
 
-try:
-    import feedparser
-    import httpx
-except ImportError:
-    feedparser = None
-    httpx = None
-
 from comment_system import AnonymousCommentSystem, RankingSystem
 from comment_generator import CommentGenerator
+from feed_consumer import FeedConsumerMixin
+from feed_state import FeedStateStore
+from fetch_engine import FeedFetchEngine
+from near_duplicate import remove_near_duplicates
+from seen_index import SeenArticleIndex
 
 # Setup logging
 logging.basicConfig(
@@ -34,8 +32,8 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
-class RealNewsFetcher:
-    def __init__(self):
+class RealNewsFetcher(FeedConsumerMixin):
+    def __init__(self, seen_namespace: str = 'real_news'):
         # Comprehensive Japanese news sources by major categories
         self.news_sources = [
             # === 政治・総合 ===
@@ -274,66 +272,31 @@ class RealNewsFetcher:
             }
         ]
         
-        if httpx:
-            self.client = httpx.Client(
-                timeout=30.0,
-                headers={
-                    'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36'
-                }
-            )
-        else:
-            self.client = None
+        self.feed_state = FeedStateStore()
+        self.fetch_engine = FeedFetchEngine(feed_state=self.feed_state)
+        self.seen_index = SeenArticleIndex(seen_namespace)
     
-    def fetch_all_feeds(self, max_per_feed: int = 3) -> List[Dict]:
-        """Fetch news from all RSS feeds"""
-        all_articles = []
+    def fetch_all_feeds(self, max_per_feed: int = 3, only_new: bool = False) -> List[Dict]:
+        """Fetch news from all RSS feeds
         
-        for source in self.news_sources:
-            try:
-                logger.info(f"Fetching from {source['name']}")
-                articles = self._fetch_single_feed(source, max_per_feed)
-                all_articles.extend(articles)
-                logger.info(f"Fetched {len(articles)} articles from {source['name']}")
-                
-            except Exception as e:
-                logger.error(f"Error fetching from {source['name']}: {str(e)}")
-                continue
+        only_new: 前回までの実行で取得済みの記事を除き、新規・変更のあった記事だけを返す
+                  （各フィードは前回取り込んだ最新エントリに達した時点でパースを打ち切る）
+                  処理を終えた記事は commit_seen() で記録する（記録するまでは次回も新規として返る）
+        """
+        all_articles = self._fetch_feed_articles(self.news_sources, max_per_feed, stop_at_watermark=only_new)
         
         # Remove duplicates
         unique_articles = self._remove_duplicates(all_articles)
         logger.info(f"Total unique articles: {len(unique_articles)}")
         
-        return unique_articles
+        return self._select_new(unique_articles, only_new)
     
-    def _fetch_single_feed(self, source: Dict, max_items: int) -> List[Dict]:
+    def _fetch_single_feed(self, source: Dict, max_items: int, stop_at_watermark: bool = False) -> List[Dict]:
         """Fetch from a single RSS feed"""
-        articles = []
-        
-        try:
-            if self.client is None:
-                logger.error("httpx client not available")
-                return articles
-            
-            response = self.client.get(source['url'])
-            response.raise_for_status()
-            
-            if feedparser:
-                # Use feedparser if available
-                feed = feedparser.parse(response.text)
-                entries = feed.entries[:max_items]
-                
-                for entry in entries:
-                    article = self._parse_feedparser_entry(entry, source)
-                    if article:
-                        articles.append(article)
-            else:
-                # Basic XML parsing fallback
-                articles = self._parse_xml_basic(response.text, source, max_items)
-                
-        except Exception as e:
-            logger.error(f"Error fetching RSS feed {source['url']}: {str(e)}")
-        
-        return articles
+        return self._fetch_feed_articles([source], max_items, stop_at_watermark)
+    
+    def _article_from_entry(self, entry, source: Dict) -> Optional[Dict]:
+        return self._parse_feedparser_entry(entry, source)
     
     def _parse_feedparser_entry(self, entry, source: Dict) -> Optional[Dict]:
         """Parse entry using feedparser"""
@@ -369,52 +332,6 @@ class RealNewsFetcher:
         
         return None
     
-    def _parse_xml_basic(self, xml_content: str, source: Dict, max_items: int) -> List[Dict]:
-        """Basic XML parsing fallback"""
-        articles = []
-        
-        try:
-            import xml.etree.ElementTree as ET
-            root = ET.fromstring(xml_content)
-            
-            # Find items (RSS format)
-            items = root.findall('.//item')[:max_items]
-            
-            for item in items:
-                title_elem = item.find('title')
-                link_elem = item.find('link')
-                desc_elem = item.find('description')
-                pub_elem = item.find('pubDate')
-                
-                if title_elem is not None and link_elem is not None:
-                    title = title_elem.text or ''
-                    link = link_elem.text or ''
-                    description = desc_elem.text or '' if desc_elem is not None else ''
-                    pub_date = pub_elem.text or '' if pub_elem is not None else ''
-                    
-                    article = {
-                        'id': hashlib.md5(f"{link}{title}".encode()).hexdigest()[:12],
-                        'title': title.strip(),
-                        'content': description.strip()[:500],
-                        'url': link,
-                        'source': source['name'],
-                        'source_url': source['url'],
-                        'category': source['category'],
-                        'language': source['language'],
-                        'reliability_score': source['reliability'],
-                        'published': self._parse_date(pub_date),
-                        'fetch_timestamp': datetime.utcnow().isoformat(),
-                        'is_real_news': True
-                    }
-                    
-                    if article['title'] and article['url']:
-                        articles.append(article)
-                        
-        except Exception as e:
-            logger.error(f"Error parsing XML: {str(e)}")
-        
-        return articles
-    
     def _parse_date(self, date_str: str) -> str:
         """Parse and normalize date string"""
         if not date_str:
@@ -446,50 +363,14 @@ class RealNewsFetcher:
     
     def _remove_duplicates(self, articles: List[Dict]) -> List[Dict]:
         """Remove duplicate articles"""
-        seen_urls = set()
-        seen_titles = set()
-        unique_articles = []
-        
-        for article in articles:
-            url = article.get('url', '')
-            title = article.get('title', '').lower()
-            
-            # Check URL duplicates
-            if url and url in seen_urls:
-                continue
-            
-            # Check title similarity (basic)
-            is_duplicate = False
-            for seen_title in seen_titles:
-                if self._calculate_similarity(title, seen_title) > 0.8:
-                    is_duplicate = True
-                    break
-            
-            if not is_duplicate:
-                unique_articles.append(article)
-                if url:
-                    seen_urls.add(url)
-                seen_titles.add(title)
-        
-        return unique_articles
-    
-    def _calculate_similarity(self, text1: str, text2: str) -> float:
-        """Calculate text similarity"""
-        words1 = set(text1.split())
-        words2 = set(text2.split())
-        
-        if not words1 or not words2:
-            return 0.0
-        
-        intersection = words1.intersection(words2)
-        union = words1.union(words2)
-        
-        return len(intersection) / len(union) if union else 0.0
+        # URL の完全一致と、タイトルの文字 n-gram による近似重複（MinHash/LSH）で除去
+        return remove_near_duplicates(articles)
     
     def close(self):
         """Close HTTP client"""
-        if self.client:
-            self.client.close()
+        # HTTP クライアントは fetch_engine が取得ごとに開閉する
+        self.seen_index.close()
+        self.feed_state.close()
 
 
 class RealNewsSystem:
@@ -507,7 +388,10 @@ class RealNewsSystem:
             
             # Fetch real news
             logger.info("📡 Fetching real news from RSS feeds...")
-            real_articles = self.news_fetcher.fetch_all_feeds(max_per_feed=3)
+            new_articles = self.news_fetcher.fetch_all_feeds(max_per_feed=3, only_new=True)
+            
+            # 前回までに処理した記事は取得し直さないので、前回の記事と合わせて表示する
+            real_articles = self._merge_with_previous(new_articles, self._load_previous_articles())
             
             if not real_articles:
                 logger.warning("No real articles fetched, using fallback")
@@ -536,6 +420,9 @@ class RealNewsSystem:
             with open(articles_path, 'w', encoding='utf-8') as f:
                 json.dump(real_articles, f, ensure_ascii=False, indent=2)
             
+            # 保存できた新規記事を記録する（途中で失敗した場合は次回もう一度処理する）
+            self.news_fetcher.commit_seen(new_articles)
+            
             logger.info("🎉 Real news system update completed!")
             
         except Exception as e:
@@ -544,6 +431,24 @@ class RealNewsSystem:
         finally:
             self.news_fetcher.close()
     
+    def _load_previous_articles(self) -> List[Dict]:
+        """Load the real articles saved by the previous run"""
+        try:
+            with open(self.data_dir / 'articles.json', 'r', encoding='utf-8') as f:
+                articles = json.load(f)
+        except (OSError, ValueError):
+            return []
+        if not isinstance(articles, list):
+            return []
+        return [article for article in articles if isinstance(article, dict) and article.get('is_real_news')]
+    
+    def _merge_with_previous(self, new_articles: List[Dict], previous_articles: List[Dict]) -> List[Dict]:
+        """New articles first, then previous ones up to the size of a full fetch"""
+        max_articles = 3 * len(self.news_fetcher.news_sources)
+        urls = {article['url'] for article in new_articles}
+        merged = new_articles + [article for article in previous_articles if article.get('url') not in urls]
+        return merged[:max_articles]
+    
     def _initialize_comments_for_articles(self, articles: List[Dict]):
         """Initialize comments for articles that don't have them"""
         existing_comments = self.comment_system._load_comments()
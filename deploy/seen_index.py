@@ -0,0 +1,140 @@
+#!/usr/bin/env python3
+"""
+Seen Article Index
+実行をまたいで取得済みの記事を記録する SQLite インデックス
+正規化した URL のハッシュとタイトルの指紋で照合し、新規・変更のあった記事だけを後段に渡す
+"""
+
+import time
+import sqlite3
+import hashlib
+import logging
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, List, Optional
+from urllib.parse import urlsplit, urlunsplit, parse_qsl, urlencode
+
+from config import CACHE_DIR
+from near_duplicate import normalize_title
+
+logger = logging.getLogger(__name__)
+
+# 記事の同一性に関係しないトラッキング用パラメータ
+TRACKING_PARAMS = {'fbclid', 'gclid', 'yclid', 'ref', 'from', 'cmpid', 'ncid'}
+
+def normalize_url(url: str) -> str:
+    """スキーム・ホストを小文字化し、フラグメントとトラッキング用パラメータ、末尾のスラッシュを除く"""
+    parts = urlsplit((url or '').strip())
+    query = [(key, value) for key, value in parse_qsl(parts.query, keep_blank_values=True)
+             if not key.lower().startswith('utm_') and key.lower() not in TRACKING_PARAMS]
+    path = parts.path.rstrip('/') or '/'
+    return urlunsplit((parts.scheme.lower(), parts.netloc.lower(), path, urlencode(query), ''))
+
+def url_hash(url: str) -> str:
+    return hashlib.sha256(normalize_url(url).encode('utf-8')).hexdigest()[:32]
+
+def title_fingerprint(title: str) -> str:
+    return hashlib.sha256(normalize_title(title).encode('utf-8')).hexdigest()[:32]
+
+
+class SeenArticleIndex:
+    """取得済み記事の記録。namespace（利用する側のパイプライン）ごとに別々の集合として扱う
+    
+    classify() は記録を変えずに新規・変更のあった記事を判定するだけで、
+    記録は後段の処理（分析・保存）が成功した記事について commit() で行う
+    """
+    
+    def __init__(self, namespace: str = 'default', db_path: Optional[Path] = None, ttl_hours: float = 72):
+        self.namespace = namespace
+        self.db_path = Path(db_path or CACHE_DIR / 'seen_articles.db')
+        self.ttl_seconds = ttl_hours * 3600
+        self.db_path.parent.mkdir(parents=True, exist_ok=True)
+        
+        self.conn = sqlite3.connect(str(self.db_path), timeout=30)
+        self.conn.row_factory = sqlite3.Row
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        with self.conn:
+            columns = [row['name'] for row in self.conn.execute("PRAGMA table_info(seen_articles)")]
+            if columns and 'namespace' not in columns:
+                # 旧形式は取得した時点で全パイプライン共通に記録していたので、引き継がずに作り直す
+                self.conn.execute("DROP TABLE seen_articles")
+            self.conn.execute('''
+                CREATE TABLE IF NOT EXISTS seen_articles (
+                    namespace TEXT NOT NULL,
+                    url_hash TEXT NOT NULL,
+                    title_fingerprint TEXT NOT NULL,
+                    first_seen REAL NOT NULL,
+                    last_seen REAL NOT NULL,
+                    PRIMARY KEY (namespace, url_hash)
+                )
+            ''')
+            self.conn.execute("CREATE INDEX IF NOT EXISTS idx_seen_title ON seen_articles(namespace, title_fingerprint)")
+            self.conn.execute("CREATE INDEX IF NOT EXISTS idx_seen_last_seen ON seen_articles(last_seen)")
+    
+    def expire(self) -> int:
+        """TTL を過ぎても再び現れなかった記事を削除"""
+        with self.conn:
+            cursor = self.conn.execute("DELETE FROM seen_articles WHERE last_seen < ?",
+                                       (time.time() - self.ttl_seconds,))
+        return cursor.rowcount
+    
+    def _keys(self, article: Dict):
+        fingerprint = title_fingerprint(article.get('title', ''))
+        key = url_hash(article['url']) if article.get('url') else fingerprint
+        return key, fingerprint
+    
+    def _lookup(self, key: str, fingerprint: str) -> Optional[sqlite3.Row]:
+        row = self.conn.execute(
+            "SELECT title_fingerprint, first_seen FROM seen_articles WHERE namespace = ? AND url_hash = ?",
+            (self.namespace, key)
+        ).fetchone()
+        if row is None:
+            row = self.conn.execute(
+                "SELECT title_fingerprint, first_seen FROM seen_articles "
+                "WHERE namespace = ? AND title_fingerprint = ? LIMIT 1",
+                (self.namespace, fingerprint)
+            ).fetchone()
+        return row
+    
+    def classify(self, articles: List[Dict]) -> List[Dict]:
+        """各記事に is_new / first_seen を付け、新規または内容が変わった記事を返す（記録はしない）
+        
+        URL が既知でタイトルが変わっていれば「変更あり」、URL が未知でも同じタイトルが
+        既知なら（配信元違いの同じ記事として）既出扱いにする
+        """
+        expired = self.expire()
+        now = time.time()
+        fresh = []
+        
+        for article in articles:
+            key, fingerprint = self._keys(article)
+            row = self._lookup(key, fingerprint)
+            article['is_new'] = row is None or row['title_fingerprint'] != fingerprint
+            article['first_seen'] = datetime.utcfromtimestamp(now if row is None else row['first_seen']).isoformat()
+            if article['is_new']:
+                fresh.append(article)
+        
+        logger.info(f"Seen index [{self.namespace}]: {len(fresh)}/{len(articles)} articles new or changed"
+                    f"{f', {expired} expired' if expired else ''}")
+        return fresh
+    
+    def commit(self, articles: List[Dict]):
+        """後段の処理が成功した記事を取得済みとして記録する（1トランザクション）"""
+        now = time.time()
+        with self.conn:
+            for article in articles:
+                key, fingerprint = self._keys(article)
+                row = self._lookup(key, fingerprint)
+                first_seen = now if row is None else row['first_seen']
+                self.conn.execute('''
+                    INSERT INTO seen_articles (namespace, url_hash, title_fingerprint, first_seen, last_seen)
+                    VALUES (?, ?, ?, ?, ?)
+                    ON CONFLICT(namespace, url_hash) DO UPDATE SET
+                        title_fingerprint = excluded.title_fingerprint,
+                        last_seen = excluded.last_seen
+                ''', (self.namespace, key, fingerprint, first_seen, now))
+        logger.info(f"Seen index [{self.namespace}]: recorded {len(articles)} processed articles")
+    
+    def close(self):
+        self.conn.close()
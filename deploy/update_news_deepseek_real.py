@@ -11,7 +11,6 @@ import logging
 import tempfile
 from datetime import datetime, timezone
 from pathlib import Path
-import time
 
 # Add backend directory to path - check for multiple possible locations
 possible_paths = [
@@ -27,6 +26,7 @@ for path in possible_paths:
         break
 
 from deepseek_processor import DeepSeekProcessor
+from llm_stream import get_stream_metrics
 from news_fetcher import NewsFetcher
 
 # Setup logging
@@ -40,6 +40,9 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+# Articles shown on the page (newly processed ones first, then the previous run's)
+MAX_ARTICLES = 6
+
 class RealNewsUpdater:
     def __init__(self, public_dir=None):
         if public_dir:
@@ -60,50 +63,54 @@ class RealNewsUpdater:
         try:
             logger.info("Starting real news update process...")
             
-            # 1. Fetch real news from RSS feeds
+            # 1. Fetch real news from RSS feeds (articles processed in earlier runs are skipped)
             logger.info("Fetching news from RSS feeds...")
-            raw_articles = self.fetcher.fetch_all_feeds(max_per_feed=3)
+            raw_articles = self.fetcher.fetch_all_feeds(max_per_feed=3, only_new=True)
             
             # 2. Filter recent articles (last 24 hours)
             recent_articles = self.fetcher.filter_recent(raw_articles, hours=24)
             logger.info(f"Found {len(recent_articles)} recent articles")
             
+            # 24時間より古い記事は処理しないので、処理済みとして記録する
+            stale_articles = [article for article in raw_articles if article not in recent_articles]
             if not recent_articles:
                 logger.warning("No recent articles found, using all fetched articles")
                 recent_articles = raw_articles[:10]  # Use top 10 articles
+                stale_articles = []
             
             # 3. Analyze articles with DeepSeek
             logger.info("Analyzing articles with DeepSeek...")
             analyzed_articles = []
+            target_articles = recent_articles[:MAX_ARTICLES]  # 残りは記録せず、次回の実行で処理する
             
-            for i, article in enumerate(recent_articles[:6]):  # Process max 6 articles
-                try:
-                    logger.info(f"Analyzing article {i+1}/{min(6, len(recent_articles))}: {article['title'][:50]}...")
-                    
-                    # First analyze the article
-                    analyzed = self.processor.analyze_article(article)
-                    
-                    # Then generate detailed content
-                    if analyzed.get('ai_analysis'):
-                        detailed = self.processor.generate_detailed_article(analyzed)
-                        analyzed_articles.append(detailed)
-                        logger.info(f"Successfully processed: {article['source']} - {article['title'][:30]}...")
-                    
-                    # Rate limiting
-                    time.sleep(2)
-                    
-                except Exception as e:
-                    logger.error(f"Error processing article: {str(e)}")
-                    continue
+            # 記事ごとの処理を並行に実行（レート制限は共通スケジューラが守る）
+            results = self.processor.scheduler.map(self._analyze_and_generate, target_articles)
+            for article, detailed in zip(target_articles, results):
+                if isinstance(detailed, Exception):
+                    logger.error(f"Error processing article: {str(detailed)}")
+                elif detailed:
+                    analyzed_articles.append(detailed)
+                    logger.info(f"Successfully processed: {article['source']} - {article['title'][:30]}...")
+            processed = [article for article in analyzed_articles if self._is_processed(article)]
+            
+            # 新しい記事が少ない実行でもページが空にならないよう、前回の処理済み記事で埋める
+            urls = {article['url'] for article in analyzed_articles}
+            previous_articles = [article for article in self._load_previous_articles() if article['url'] not in urls]
+            articles = (analyzed_articles + previous_articles)[:MAX_ARTICLES]
             
             # 4. Save processed articles
-            self._save_articles(analyzed_articles)
+            self._save_articles(articles)
             
             # 5. Generate HTML
-            html_content = self._generate_html(analyzed_articles)
+            html_content = self._generate_html(articles)
             self._save_html(html_content)
             
-            logger.info(f"Update completed. Processed {len(analyzed_articles)} articles.")
+            # 保存できた処理済みの記事だけを記録する（失敗・仮の分析の記事は次回もう一度処理する）
+            self.fetcher.commit_seen(processed + stale_articles)
+            
+            self.processor.cache.log_stats()
+            get_stream_metrics().log_stats()
+            logger.info(f"Update completed. Processed {len(processed)} new articles.")
             
         except Exception as e:
             logger.error(f"Fatal error in news update: {str(e)}")
@@ -113,6 +120,33 @@ class RealNewsUpdater:
             self.processor.close()
             self.fetcher.close()
     
+    def _analyze_and_generate(self, article):
+        """Analyze one article, then generate its detailed content"""
+        logger.info(f"Analyzing article: {article['title'][:50]}...")
+        
+        # First analyze the article
+        analyzed = self.processor.analyze_article(article)
+        
+        # Then generate detailed content
+        if analyzed.get('ai_analysis'):
+            return self.processor.generate_detailed_article(analyzed)
+        return None
+    
+    def _is_processed(self, article):
+        """Whether the article has a real analysis (not the fallback) and a detailed article"""
+        analysis = article.get('ai_analysis')
+        return isinstance(analysis, dict) and not analysis.get('fallback') and 'detailed_article' in article
+    
+    def _load_previous_articles(self):
+        """Load the processed articles saved by the previous run"""
+        try:
+            with open(self.public_dir / 'data.json', 'r', encoding='utf-8') as f:
+                articles = json.load(f).get('articles', [])
+        except (OSError, ValueError, AttributeError):
+            return []
+        return [article for article in articles
+                if isinstance(article, dict) and article.get('url') and self._is_processed(article)]
+    
     def _save_articles(self, articles):
         """Save articles as JSON"""
         # Add metadata
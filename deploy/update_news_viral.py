@@ -18,7 +18,10 @@ from typing import Dict, List
 sys.path.insert(0, '/home/ubuntu/news-ai-site/backend')
 
 from deepseek_processor import DeepSeekProcessor
+from json_scanner import load_json_response
+from llm_stream import get_stream_metrics
 from extended_news_fetcher import ExtendedNewsFetcher
+from seen_index import SeenArticleIndex
 from viral_frontend import generate_viral_frontend
 
 # Setup logging
@@ -39,6 +42,8 @@ class ViralNewsUpdater:
         
         self.processor = DeepSeekProcessor()
         self.fetcher = ExtendedNewsFetcher()
+        # 前回の分析結果を再利用できるか（前回分析し終えた記事か）の判定用
+        self.seen_index = SeenArticleIndex('viral')
         
         # 更新間隔設定
         self.update_interval = 180  # 3分間隔
@@ -67,32 +72,39 @@ class ViralNewsUpdater:
             
             # 3. DeepSeekで分析（高スコア記事優先）
             analyzed_articles = []
+            previous_analyses = self._load_previous_analyses()
             
-            for i, article in enumerate(top_articles[:20]):  # 上位20記事のみ分析
-                try:
-                    logger.info(f"🤖 Analyzing article {i+1}/20: {article['title'][:50]}...")
-                    
-                    # トレンド・炎上系は特別プロンプト使用
-                    if self._is_trend_article(article):
-                        analyzed = await self._analyze_trend_article(article)
-                    else:
-                        analyzed = self.processor.analyze_article(article)
-                    
-                    analyzed_articles.append(analyzed)
-                    
-                    # レート制限対策
-                    await asyncio.sleep(1)
-                    
-                except Exception as e:
-                    logger.error(f"Error analyzing article: {str(e)}")
-                    analyzed_articles.append(article)  # 分析失敗時は元記事をそのまま
-                    continue
+            # 前回から変わっていない記事は前回の分析結果を再利用し、残りだけを分析する
+            pending = []
+            self.seen_index.classify(top_articles[:20])
+            for article in top_articles[:20]:  # 上位20記事のみ分析
+                previous = previous_analyses.get(article.get('url'))
+                if previous and not article.get('is_new', True):
+                    analyzed_articles.append({**article, **previous})
+                else:
+                    analyzed_articles.append(article)
+                    pending.append(len(analyzed_articles) - 1)
+            
+            # 共通スケジューラで並行に分析（同時実行数・毎分の上限はスケジューラが守る）
+            logger.info(f"🤖 Analyzing {len(pending)} articles...")
+            results = await asyncio.get_running_loop().run_in_executor(
+                None, self.processor.scheduler.map, self._analyze_viral_article,
+                [analyzed_articles[position] for position in pending]
+            )
+            for position, analyzed in zip(pending, results):
+                if isinstance(analyzed, Exception):
+                    logger.error(f"Error analyzing article: {str(analyzed)}")
+                    continue  # 分析失敗時は元記事をそのまま
+                analyzed_articles[position] = analyzed
+            processed = [article for article in analyzed_articles if self._has_analysis(article)]
             
             # 未分析記事も追加（分析なし）
             analyzed_articles.extend(top_articles[20:])
             
             # 4. データ保存
             await self._save_viral_data(analyzed_articles)
+            # 保存できた分析済みの記事だけを記録する（失敗・仮の分析の記事は次回もう一度分析する）
+            self.seen_index.commit(processed)
             
             # 5. バイラルフロントエンド生成
             html_content = self._generate_viral_html(analyzed_articles)
@@ -100,6 +112,8 @@ class ViralNewsUpdater:
             
             # 6. 統計情報出力
             self._log_viral_stats(analyzed_articles)
+            self.processor.cache.log_stats()
+            get_stream_metrics().log_stats()
             
             logger.info(f"✅ Viral news update completed. Processed {len(analyzed_articles)} articles.")
             
@@ -110,6 +124,34 @@ class ViralNewsUpdater:
         finally:
             await self.fetcher.close()
             self.processor.close()
+            self.seen_index.close()
+    
+    def _load_previous_analyses(self) -> Dict[str, Dict]:
+        """
+        前回の viral_data.json から URL ごとの分析結果を読み込む
+        """
+        json_path = self.public_dir / 'viral_data.json'
+        try:
+            with open(json_path, 'r', encoding='utf-8') as f:
+                articles = json.load(f).get('articles', [])
+        except (OSError, ValueError):
+            return {}
+        
+        analyses = {}
+        for article in articles:
+            # API エラー時の仮の分析結果は再利用せず、次の実行で分析し直す
+            analysis = {key: article[key] for key in ('ai_analysis', 'trend_analysis')
+                        if isinstance(article.get(key), dict) and not article[key].get('fallback')}
+            if article.get('url') and analysis:
+                analyses[article['url']] = analysis
+        return analyses
+    
+    def _has_analysis(self, article: Dict) -> bool:
+        """
+        API による分析結果（仮の分析結果ではないもの）を持っているか
+        """
+        analyses = [article[key] for key in ('ai_analysis', 'trend_analysis') if isinstance(article.get(key), dict)]
+        return bool(analyses) and not any(analysis.get('fallback') for analysis in analyses)
     
     def _is_trend_article(self, article: Dict) -> bool:
         """
@@ -126,7 +168,16 @@ class ViralNewsUpdater:
                 platform in trend_platforms or 
                 viral_score >= 600)
     
-    async def _analyze_trend_article(self, article: Dict) -> Dict:
+    def _analyze_viral_article(self, article: Dict) -> Dict:
+        """
+        1記事の分析（スケジューラのワーカースレッドで実行）
+        """
+        # トレンド・炎上系は特別プロンプト使用
+        if self._is_trend_article(article):
+            return self._analyze_trend_article(article)
+        return self.processor.analyze_article(article)
+    
+    def _analyze_trend_article(self, article: Dict) -> Dict:
         """
         トレンド記事の特別分析
         """
@@ -158,17 +209,14 @@ class ViralNewsUpdater:
             必ずJSON形式のみで返答してください。
             """
             
-            response = self.processor.client.post(
-                self.processor.api_url,
-                json={
-                    "model": self.processor.model,
-                    "messages": [
-                        {"role": "system", "content": "あなたはSNSトレンド分析の専門家です。"},
-                        {"role": "user", "content": prompt}
-                    ],
-                    "temperature": 0.5,
-                    "max_tokens": 1000
-                }
+            response = self.processor.chat_completion(
+                [
+                    {"role": "system", "content": "あなたはSNSトレンド分析の専門家です。"},
+                    {"role": "user", "content": prompt}
+                ],
+                temperature=0.5,
+                max_tokens=1000,
+                expect_json='object'
             )
             
             if response.status_code == 200:
@@ -177,10 +225,7 @@ class ViralNewsUpdater:
                 
                 try:
                     # より強固なJSON抽出
-                    from deepseek_processor import DeepSeekProcessor
-                    processor_instance = DeepSeekProcessor()
-                    cleaned_content = processor_instance._extract_json_from_response(content)
-                    analysis = json.loads(cleaned_content)
+                    analysis = load_json_response(content)
                     
                     # 元記事データと分析結果を統合
                     return {
@@ -228,7 +273,8 @@ class ViralNewsUpdater:
                 "fact_check": "未確認",
                 "speculation": "情報収集中",
                 "target_audience": "一般",
-                "analyzed_at": datetime.utcnow().isoformat()
+                "analyzed_at": datetime.utcnow().isoformat(),
+                "fallback": True
             }
         }
     
@@ -1,31 +1,45 @@
 import os
 import stat
 import subprocess
-import asyncio
 import json
 import re
+import time
+import heapq
 import click
 from pathlib import Path
 from datetime import datetime
 from typing import Dict, Optional, List
-import psutil
-from rich.console import Console
-from rich.table import Table
-from rich.progress import Progress, TaskID
-from rich.panel import Panel
 
 from .config import config, logger
 from .task_manager import TaskManager, Task, TaskStatus
+from .metrics import PhaseTimer, TASK_PHASES, summarize
+from .result_cache import ResultCache
 
-console = Console()
+# rich, psutil, asyncio and concurrent.futures are imported inside the commands
+# that need them so that `dashboard` and `health` start quickly
+_console = None
+
+def get_console():
+    global _console
+    if _console is None:
+        from rich.console import Console
+        _console = Console()
+    return _console
+
+EXECUTION_LOG_FILES = {'execution_log.json', 'claude_stdout.log', 'claude_stderr.log'}
 
 class ClaudeAgent:
-    def __init__(self):
+    def __init__(self, use_cache: bool = True, refresh_cache: bool = False):
+        config.setup_logging()
         self.task_manager = TaskManager()
         self.workspace_dir = config.WORKSPACE_DIR
         self.workspace_dir.mkdir(exist_ok=True)
+        self.use_cache = use_cache
+        self.refresh_cache = refresh_cache
+        self.result_cache = ResultCache()
     
-    def execute_claude_command(self, instruction: str, working_dir: Optional[Path] = None) -> Dict:
+    def execute_claude_command(self, instruction: str, working_dir: Optional[Path] = None,
+                               log_context: Optional[Dict] = None) -> Dict:
         try:
             work_dir = working_dir or self.workspace_dir
             work_dir.mkdir(exist_ok=True)
@@ -40,34 +54,18 @@ class ClaudeAgent:
             logger.info(f"Executing Claude Code: {' '.join(cmd)}")
             logger.info(f"Working directory: {work_dir}")
             
-            result = subprocess.run(
-                cmd,
-                cwd=work_dir,
-                capture_output=True,
-                text=True,
-                env=env,
-                timeout=config.CLAUDE_CODE_TIMEOUT
-            )
+            from .executor import StreamingExecutor
+            
+            executor = StreamingExecutor(work_dir, log_context=log_context)
+            result = executor.run(cmd, env=env)
             
             # If still have issues, try without the dangerous flag
-            if result.returncode != 0 and "--dangerously-skip-permissions" in result.stderr:
+            if result['returncode'] != 0 and "--dangerously-skip-permissions" in result['stderr']:
                 logger.warning("Retrying without --dangerously-skip-permissions flag...")
                 cmd_retry = [config.CLAUDE_CODE_COMMAND, "--print", instruction]
-                result = subprocess.run(
-                    cmd_retry,
-                    cwd=work_dir,
-                    capture_output=True,
-                    text=True,
-                    env=env,
-                    timeout=config.CLAUDE_CODE_TIMEOUT
-                )
+                result = executor.run(cmd_retry, env=env)
             
-            return {
-                'success': result.returncode == 0,
-                'stdout': result.stdout,
-                'stderr': result.stderr,
-                'returncode': result.returncode
-            }
+            return result
         
         except subprocess.TimeoutExpired:
             logger.error(f"Claude Code command timed out after {config.CLAUDE_CODE_TIMEOUT} seconds")
@@ -428,39 +426,70 @@ Flask-SQLAlchemy==3.0.5
         (working_dir / 'analysis_report.md').write_text(report_content)
     
     def execute_task(self, task: Task) -> bool:
+        timer = PhaseTimer()
+        success = False
+        
         try:
             logger.info(f"Starting task: {task.name} (ID: {task.id})")
             
             self.task_manager.update_task_status(task.id, TaskStatus.RUNNING)
             
-            instruction = self.generate_instruction(task)
+            with timer.phase('instruction'):
+                instruction = self.generate_instruction(task)
             
-            task_workspace = self.workspace_dir / f"task_{task.id}"
-            task_workspace.mkdir(exist_ok=True)
+            with timer.phase('filesystem'):
+                task_workspace = self.workspace_dir / f"task_{task.id}"
+                task_workspace.mkdir(exist_ok=True)
+                
+                # Set proper permissions for the workspace directory
+                os.chmod(task_workspace, stat.S_IRWXU | stat.S_IRWXG | stat.S_IRWXO)
             
-            # Set proper permissions for the workspace directory
-            os.chmod(task_workspace, stat.S_IRWXU | stat.S_IRWXG | stat.S_IRWXO)
+            cache_key = None
+            if self.use_cache:
+                with timer.phase('filesystem'):
+                    cache_key = self.result_cache.key_for(task, instruction)
+                    restored = not self.refresh_cache and self.result_cache.restore(cache_key, task_workspace)
+                if restored:
+                    timer.metrics['cache_hit'] = True
+                    success = self._complete_from_cache(task, task_workspace)
+                    return success
             
-            result = self.execute_claude_command(instruction, task_workspace)
+            with timer.phase('claude'):
+                result = self.execute_claude_command(
+                    instruction, task_workspace,
+                    log_context={'task_id': task.id, 'instruction': instruction}
+                )
+            timer.metrics.update(result.get('resources', {}))
+            timer.metrics['stdout_bytes'] = result.get('stdout_bytes', len(result['stdout'].encode('utf-8')))
+            timer.metrics['stderr_bytes'] = result.get('stderr_bytes', len(result['stderr'].encode('utf-8')))
             
             # Parse Claude output and create files
-            if result['success'] and result['stdout']:
-                file_creation_result = self.parse_and_create_files(result['stdout'], task_workspace, task)
-                logger.info(f"Created {file_creation_result['count']} files for task {task.id}")
+            with timer.phase('parse'):
+                if result['success'] and result['stdout']:
+                    file_creation_result = self.parse_and_create_files(self._full_stdout(result), task_workspace, task)
+                    logger.info(f"Created {file_creation_result['count']} files for task {task.id}")
             
-            # Check if files were actually created
-            created_files = list(task_workspace.glob('*'))
-            actual_file_count = len([f for f in created_files if f.name != 'execution_log.json'])
+            with timer.phase('filesystem'):
+                # Check if files were actually created
+                created_files = list(task_workspace.glob('*'))
+                actual_file_count = len([f for f in created_files if f.name not in EXECUTION_LOG_FILES])
+                timer.metrics['files_created'] = actual_file_count
+                
+                output_file = task_workspace / "execution_log.json"
+                with open(output_file, 'w') as f:
+                    json.dump({
+                        'task_id': task.id,
+                        'instruction': instruction,
+                        'status': 'finished',
+                        'timestamp': datetime.now().isoformat(),
+                        'result': result,
+                        'files_created': actual_file_count,
+                        'phases': timer.phases
+                    }, f, indent=2)
             
-            output_file = task_workspace / "execution_log.json"
-            with open(output_file, 'w') as f:
-                json.dump({
-                    'task_id': task.id,
-                    'instruction': instruction,
-                    'timestamp': datetime.now().isoformat(),
-                    'result': result,
-                    'files_created': actual_file_count
-                }, f, indent=2)
+            if result['success'] and cache_key:
+                with timer.phase('filesystem'):
+                    self.result_cache.store(cache_key, task_workspace)
             
             if result['success'] and actual_file_count > 0:
                 self.task_manager.update_task_status(
@@ -468,7 +497,7 @@ Flask-SQLAlchemy==3.0.5
                     output_path=str(task_workspace)
                 )
                 logger.info(f"Task {task.id} completed successfully with {actual_file_count} files created")
-                return True
+                success = True
             elif result['success'] and actual_file_count == 0:
                 # Claude succeeded but no files created - still mark as success
                 self.task_manager.update_task_status(
@@ -476,14 +505,13 @@ Flask-SQLAlchemy==3.0.5
                     output_path=str(task_workspace)
                 )
                 logger.warning(f"Task {task.id} completed but no files were created")
-                return True
+                success = True
             else:
                 self.task_manager.update_task_status(
                     task.id, TaskStatus.FAILED,
                     error_message=result['stderr']
                 )
                 logger.error(f"Task {task.id} failed: {result['stderr']}")
-                return False
         
         except Exception as e:
             logger.error(f"Exception during task execution: {e}")
@@ -491,47 +519,258 @@ Flask-SQLAlchemy==3.0.5
                 task.id, TaskStatus.FAILED,
                 error_message=str(e)
             )
-            return False
+        
+        finally:
+            try:
+                self.task_manager.record_task_run(task, success, timer)
+            except Exception as e:
+                logger.warning(f"Failed to record run metrics for task {task.id}: {e}")
+        
+        return success
+    
+    def _full_stdout(self, result: Dict) -> str:
+        """上限を超えて退避された stdout は、メモリには末尾しか残らないのでファイルから全体を読む
+        
+        読めない場合は途中までの出力でファイルを作らず、例外のままタスクを失敗にする
+        """
+        spill_path = result.get('stdout_file')
+        if not spill_path:
+            return result['stdout']
+        with open(spill_path, 'r', encoding='utf-8') as f:
+            return f.read()
+    
+    def _complete_from_cache(self, task: Task, task_workspace: Path) -> bool:
+        log_file = task_workspace / "execution_log.json"
+        try:
+            log = json.loads(log_file.read_text())
+            log.update({'cache_hit': True, 'restored_at': datetime.now().isoformat()})
+            log_file.write_text(json.dumps(log, indent=2))
+        except (OSError, ValueError) as e:
+            logger.warning(f"Cached execution log for task {task.id} is unreadable: {e}")
+        
+        self.task_manager.update_task_status(
+            task.id, TaskStatus.COMPLETED,
+            output_path=str(task_workspace)
+        )
+        logger.info(f"Task {task.id} completed from cache")
+        return True
+    
+    def _critical_path_lengths(self, tasks: List[Task]) -> Dict[str, int]:
+        """各タスクから終端までの最長依存チェーン長を計算（循環に含まれるタスクは除外）"""
+        dependents = {task.id: [] for task in tasks}
+        remaining = {task.id: 0 for task in tasks}
+        for task in tasks:
+            for dep in task.depends_on:
+                if dep in dependents:
+                    dependents[dep].append(task.id)
+                    remaining[task.id] += 1
+        
+        # Kahn's algorithm gives a topological order; walk it backwards for path lengths
+        order = [task_id for task_id, count in remaining.items() if count == 0]
+        for task_id in order:
+            for child in dependents[task_id]:
+                remaining[child] -= 1
+                if remaining[child] == 0:
+                    order.append(child)
+        
+        lengths = {}
+        for task_id in reversed(order):
+            lengths[task_id] = 1 + max((lengths[child] for child in dependents[task_id]), default=0)
+        return lengths
     
-    def run_tasks_from_file(self, task_file: Path) -> Dict:
+    def run_tasks_from_file(self, task_file: Path, concurrency: int = 1) -> Dict:
+        from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+        from rich.progress import Progress
+        
         tasks = self.task_manager.load_tasks_from_yaml(task_file)
         
         if not tasks:
             logger.error("No tasks found in file")
-            return {'success': False, 'completed': 0, 'failed': 0}
+            return {'success': False, 'completed': 0, 'failed': 0, 'skipped': 0}
+        
+        tasks_by_id = {task.id: task for task in tasks}
+        index = {task.id: i for i, task in enumerate(tasks)}
+        dependents = {task.id: [] for task in tasks}
+        waiting_on = {}
+        
+        for task in tasks:
+            self.task_manager.save_task(task)
+            waiting_on[task.id] = set(task.depends_on)
+            for dep in task.depends_on:
+                if dep in dependents:
+                    dependents[dep].append(task.id)
+        
+        priority = self._critical_path_lengths(tasks)
         
         completed = 0
         failed = 0
+        skipped = 0
+        ready = []
+        blocked = set()
+        
+        def skip(task_id: str, reason: str):
+            nonlocal skipped
+            if task_id in blocked:
+                return
+            blocked.add(task_id)
+            skipped += 1
+            logger.warning(f"Skipping task {task_id}: {reason}")
+            self.task_manager.update_task_status(task_id, TaskStatus.FAILED, error_message=f"Skipped: {reason}")
+            progress.advance(task_progress)
+            for child in dependents[task_id]:
+                skip(child, f"prerequisite '{task_id}' did not complete")
         
         with Progress() as progress:
             task_progress = progress.add_task("[green]Processing tasks...", total=len(tasks))
             
             for task in tasks:
-                self.task_manager.save_task(task)
-                
-                progress.update(task_progress, description=f"[green]Processing: {task.name}")
-                
-                if self.execute_task(task):
-                    completed += 1
-                else:
-                    failed += 1
+                missing = [dep for dep in task.depends_on if dep not in tasks_by_id]
+                if missing:
+                    skip(task.id, f"unknown prerequisite(s): {', '.join(missing)}")
+                elif task.id not in priority:
+                    skip(task.id, "dependency cycle detected")
+            
+            for task in tasks:
+                if task.id not in blocked and not waiting_on[task.id]:
+                    heapq.heappush(ready, (-priority[task.id], index[task.id], task.id))
+            
+            # Each task already runs in its own workspace/task_<id>, so workers share nothing
+            with ThreadPoolExecutor(max_workers=concurrency) as executor:
+                running = {}
                 
-                progress.advance(task_progress)
+                while ready or running:
+                    while ready and len(running) < concurrency:
+                        _, _, task_id = heapq.heappop(ready)
+                        if task_id in blocked:
+                            continue
+                        task = tasks_by_id[task_id]
+                        running[executor.submit(self.execute_task, task)] = task
+                        progress.update(task_progress, description=f"[green]Processing: {task.name}")
+                    
+                    if not running:
+                        break
+                    
+                    done, _ = wait(running, return_when=FIRST_COMPLETED)
+                    for future in done:
+                        task = running.pop(future)
+                        try:
+                            success = future.result()
+                        except Exception as e:
+                            logger.error(f"Worker crashed while running task {task.id}: {e}")
+                            success = False
+                        
+                        progress.advance(task_progress)
+                        
+                        if success:
+                            completed += 1
+                            for child in dependents[task.id]:
+                                waiting_on[child].discard(task.id)
+                                if not waiting_on[child] and child not in blocked:
+                                    heapq.heappush(ready, (-priority[child], index[child], child))
+                        else:
+                            failed += 1
+                            for child in dependents[task.id]:
+                                skip(child, f"prerequisite '{task.id}' failed")
+                        
+                        progress.update(
+                            task_progress,
+                            description=f"[green]Finished: {task.name} ({completed} ok, {failed} failed, {skipped} skipped)"
+                        )
         
         return {
-            'success': failed == 0,
+            'success': failed == 0 and skipped == 0,
             'completed': completed,
             'failed': failed,
+            'skipped': skipped,
             'total': len(tasks)
         }
     
-    def health_check(self) -> Dict:
-        health_status = {
-            'claude_code_available': False,
-            'system_resources': {},
-            'workspace_writable': False,
-            'database_accessible': False
-        }
+    def run_worker(self, concurrency: int = 1, lease_seconds: Optional[float] = None,
+                   poll_interval: float = 2.0, exit_when_idle: bool = False) -> Dict:
+        """キューに登録されたタスクをリースして実行し続けるワーカー
+        
+        リースはハートビートで延長され、ワーカーが停止した場合は期限切れ後に他のワーカーが再取得する。
+        """
+        import signal
+        import socket
+        import threading
+        from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+        
+        lease_seconds = lease_seconds or config.WORKER_LEASE_SECONDS
+        worker_id = f"{socket.gethostname()}:{os.getpid()}"
+        stopping = threading.Event()
+        finished = threading.Event()
+        
+        def request_stop(signum, frame):
+            logger.info(f"Worker {worker_id} received signal {signum}, finishing running tasks")
+            stopping.set()
+        
+        signal.signal(signal.SIGTERM, request_stop)
+        signal.signal(signal.SIGINT, request_stop)
+        
+        def heartbeat():
+            while not finished.wait(lease_seconds / 3):
+                try:
+                    self.task_manager.renew_leases(worker_id, lease_seconds)
+                except Exception as e:
+                    logger.error(f"Worker {worker_id} failed to renew leases: {e}")
+        
+        heartbeat_thread = threading.Thread(target=heartbeat, name="lease-heartbeat", daemon=True)
+        heartbeat_thread.start()
+        logger.info(f"Worker {worker_id} started with {concurrency} slots (lease {lease_seconds}s)")
+        
+        completed = 0
+        failed = 0
+        running = {}
+        
+        try:
+            with ThreadPoolExecutor(max_workers=concurrency) as executor:
+                while True:
+                    while not stopping.is_set() and len(running) < concurrency:
+                        task = self.task_manager.claim_task(worker_id, lease_seconds)
+                        if task is None:
+                            break
+                        logger.info(f"Worker {worker_id} claimed task {task.id}")
+                        running[executor.submit(self.execute_task, task)] = task
+                    
+                    if not running:
+                        if stopping.is_set() or exit_when_idle:
+                            break
+                        stopping.wait(poll_interval)
+                        continue
+                    
+                    done, _ = wait(running, timeout=poll_interval, return_when=FIRST_COMPLETED)
+                    for future in done:
+                        task = running.pop(future)
+                        try:
+                            success = future.result()
+                        except Exception as e:
+                            logger.error(f"Worker crashed while running task {task.id}: {e}")
+                            success = False
+                        
+                        self.task_manager.release_lease(task.id, worker_id)
+                        if success:
+                            completed += 1
+                        else:
+                            failed += 1
+        finally:
+            finished.set()
+        
+        logger.info(f"Worker {worker_id} stopped: {completed} completed, {failed} failed")
+        return {'completed': completed, 'failed': failed}
+    
+    def _claude_code_available(self, refresh: bool = False) -> bool:
+        """`claude --version`の結果をディスクにキャッシュ（成功時のみ、HEALTH_PROBE_TTL秒有効）"""
+        cache_file = config.CACHE_DIR / "health_probe.json"
+        
+        if not refresh:
+            try:
+                cached = json.loads(cache_file.read_text())
+                if (cached['command'] == config.CLAUDE_CODE_COMMAND
+                        and time.time() - cached['checked_at'] < config.HEALTH_PROBE_TTL):
+                    return cached['available']
+            except (OSError, ValueError, KeyError):
+                pass
         
         try:
             result = subprocess.run(
@@ -540,18 +779,44 @@ Flask-SQLAlchemy==3.0.5
                 text=True,
                 timeout=10
             )
-            health_status['claude_code_available'] = result.returncode == 0
-        except:
-            pass
+            available = result.returncode == 0
+        except (OSError, subprocess.SubprocessError):
+            available = False
         
-        try:
-            health_status['system_resources'] = {
-                'cpu_percent': psutil.cpu_percent(),
-                'memory_percent': psutil.virtual_memory().percent,
-                'disk_usage': psutil.disk_usage('/').percent
-            }
-        except:
-            pass
+        if available:
+            try:
+                config.CACHE_DIR.mkdir(exist_ok=True)
+                cache_file.write_text(json.dumps({
+                    'command': config.CLAUDE_CODE_COMMAND,
+                    'available': available,
+                    'checked_at': time.time()
+                }))
+            except OSError as e:
+                logger.warning(f"Failed to cache health probe: {e}")
+        
+        return available
+    
+    def health_check(self, include_resources: bool = True, refresh: bool = False) -> Dict:
+        health_status = {
+            'claude_code_available': False,
+            'system_resources': {},
+            'workspace_writable': False,
+            'database_accessible': False
+        }
+        
+        health_status['claude_code_available'] = self._claude_code_available(refresh=refresh)
+        
+        if include_resources:
+            try:
+                import psutil
+                
+                health_status['system_resources'] = {
+                    'cpu_percent': psutil.cpu_percent(),
+                    'memory_percent': psutil.virtual_memory().percent,
+                    'disk_usage': psutil.disk_usage('/').percent
+                }
+            except:
+                pass
         
         try:
             test_file = self.workspace_dir / "health_check.txt"
@@ -570,6 +835,10 @@ Flask-SQLAlchemy==3.0.5
         return health_status
     
     def show_dashboard(self):
+        from rich.table import Table
+        from rich.panel import Panel
+        
+        console = get_console()
         stats = self.task_manager.get_task_statistics()
         health = self.health_check()
         
@@ -612,7 +881,7 @@ Flask-SQLAlchemy==3.0.5
         console.print(health_table)
         
         # Recent Tasks
-        recent_tasks = self.task_manager.get_all_tasks()[:5]
+        recent_tasks, _ = self.task_manager.get_recent_tasks(limit=5)
         if recent_tasks:
             recent_table = Table(title="Recent Tasks")
             recent_table.add_column("ID", style="cyan")
@@ -645,17 +914,60 @@ def cli():
 @cli.command()
 @click.option('--task-file', '-f', type=click.Path(exists=True), required=True,
               help='Path to YAML file containing tasks')
-def run(task_file):
+@click.option('--concurrency', '-c', type=click.IntRange(min=1), default=1, show_default=True,
+              help='Number of tasks to execute in parallel')
+@click.option('--no-cache', is_flag=True, help='Always run Claude Code and do not store results')
+@click.option('--refresh', is_flag=True, help='Ignore cached results but store fresh ones')
+def run(task_file, concurrency, no_cache, refresh):
     """Run tasks from a YAML file."""
-    agent = ClaudeAgent()
-    result = agent.run_tasks_from_file(Path(task_file))
+    console = get_console()
+    agent = ClaudeAgent(use_cache=not no_cache, refresh_cache=refresh)
+    result = agent.run_tasks_from_file(Path(task_file), concurrency=concurrency)
     
     if result['success']:
         console.print(f"✅ All {result['total']} tasks completed successfully!", style="green")
     else:
         console.print(f"❌ {result['failed']} out of {result['total']} tasks failed.", style="red")
+        if result.get('skipped'):
+            console.print(f"⏭️  {result['skipped']} tasks skipped due to failed prerequisites.", style="yellow")
         console.print(f"✅ {result['completed']} tasks completed successfully.", style="green")
 
+@cli.command()
+@click.option('--task-file', '-f', type=click.Path(exists=True), required=True,
+              help='Path to YAML file containing tasks')
+def enqueue(task_file):
+    """Add tasks from a YAML file to the worker queue."""
+    console = get_console()
+    agent = ClaudeAgent()
+    tasks = agent.task_manager.load_tasks_from_yaml(Path(task_file))
+    
+    if not tasks:
+        console.print("❌ No tasks found in file.", style="red")
+        return
+    
+    agent.task_manager.enqueue_tasks(tasks)
+    console.print(f"📥 Enqueued {len(tasks)} tasks.", style="green")
+
+@cli.command()
+@click.option('--concurrency', '-c', type=click.IntRange(min=1), default=1, show_default=True,
+              help='Number of tasks this worker executes in parallel')
+@click.option('--lease', type=click.FloatRange(min=1), default=None,
+              help='Lease duration in seconds (default: WORKER_LEASE_SECONDS)')
+@click.option('--poll-interval', type=click.FloatRange(min=0.1), default=2.0, show_default=True,
+              help='Seconds to wait between polls when the queue is empty')
+@click.option('--exit-when-idle', is_flag=True, help='Exit once no claimable tasks remain')
+@click.option('--no-cache', is_flag=True, help='Always run Claude Code and do not store results')
+@click.option('--refresh', is_flag=True, help='Ignore cached results but store fresh ones')
+def worker(concurrency, lease, poll_interval, exit_when_idle, no_cache, refresh):
+    """Run a worker that executes tasks from the queue."""
+    console = get_console()
+    agent = ClaudeAgent(use_cache=not no_cache, refresh_cache=refresh)
+    result = agent.run_worker(
+        concurrency=concurrency, lease_seconds=lease,
+        poll_interval=poll_interval, exit_when_idle=exit_when_idle
+    )
+    console.print(f"👷 Worker finished: {result['completed']} completed, {result['failed']} failed.", style="green")
+
 @cli.command()
 def dashboard():
     """Show the system dashboard."""
@@ -663,10 +975,68 @@ def dashboard():
     agent.show_dashboard()
 
 @cli.command()
-def health():
+@click.option('--limit', type=click.IntRange(min=1), default=10000, show_default=True,
+              help='Number of most recent runs to include')
+def stats(limit):
+    """Show per-phase timing percentiles for recent task runs."""
+    from rich.table import Table
+    
+    console = get_console()
+    agent = ClaudeAgent()
+    runs = agent.task_manager.get_task_runs(limit=limit)
+    
+    if not runs:
+        console.print("No task runs recorded yet.", style="yellow")
+        return
+    
+    def fmt(value, scale=1.0, unit='s'):
+        return "-" if value is None else f"{value / scale:.3f}{unit}"
+    
+    # Cache hits skip Claude entirely and would drag every percentile towards zero
+    executed = [run for run in runs if not run.get('cache_hit')]
+    by_type = {}
+    for run in executed:
+        by_type.setdefault(run['task_type'], []).append(run)
+    
+    timing_table = Table(title=f"Phase Timing (last {len(runs)} runs, {len(runs) - len(executed)} cache hits excluded)")
+    for column in ["Task Type", "Phase", "Runs", "p50", "p95", "p99"]:
+        timing_table.add_column(column, style="cyan" if column in ("Task Type", "Phase") else "magenta")
+    
+    resource_table = Table(title="Resource Usage (p50 / p95 / p99)")
+    for column in ["Task Type", "Child CPU", "Peak RSS", "Output"]:
+        resource_table.add_column(column, style="cyan" if column == "Task Type" else "magenta")
+    
+    for task_type, type_runs in sorted(by_type.items()):
+        for phase in TASK_PHASES + ['total']:
+            summary = summarize([run[f'{phase}_seconds'] for run in type_runs if run[f'{phase}_seconds'] is not None])
+            timing_table.add_row(
+                task_type, phase, str(summary['count']),
+                fmt(summary['p50']), fmt(summary['p95']), fmt(summary['p99'])
+            )
+        
+        def triple(key, scale, unit):
+            summary = summarize([run[key] for run in type_runs if run[key] is not None])
+            return " / ".join(fmt(summary[p], scale, unit) for p in ('p50', 'p95', 'p99'))
+        
+        resource_table.add_row(
+            task_type,
+            triple('child_cpu_seconds', 1.0, 's'),
+            triple('peak_rss_bytes', 1024 * 1024, 'MB'),
+            triple('stdout_bytes', 1024, 'KB')
+        )
+    
+    console.print(timing_table)
+    console.print(resource_table)
+
+@cli.command()
+@click.option('--refresh', is_flag=True, help='Ignore the cached Claude Code availability probe')
+def health(refresh):
     """Run system health check."""
+    from rich.panel import Panel
+    
+    console = get_console()
     agent = ClaudeAgent()
-    health_status = agent.health_check()
+    health_status = agent.health_check(include_resources=False, refresh=refresh)
     
     console.print(Panel.fit("🏥 System Health Check", style="bold blue"))
     
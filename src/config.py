@@ -11,29 +11,40 @@ class Config:
     TASKS_DIR = PROJECT_ROOT / "tasks"
     LOGS_DIR = PROJECT_ROOT / "logs"
     WORKSPACE_DIR = PROJECT_ROOT / "workspace"
+    CACHE_DIR = PROJECT_ROOT / ".cache"
     
     DATABASE_PATH = PROJECT_ROOT / "tasks.db"
     
     CLAUDE_CODE_COMMAND = os.getenv("CLAUDE_CODE_COMMAND", "claude")
     CLAUDE_CODE_TIMEOUT = int(os.getenv("CLAUDE_CODE_TIMEOUT", "300"))
+    CLAUDE_OUTPUT_MEMORY_LIMIT = int(os.getenv("CLAUDE_OUTPUT_MEMORY_LIMIT", str(4 * 1024 * 1024)))
+    
+    RESULT_CACHE_MAX_BYTES = int(os.getenv("RESULT_CACHE_MAX_BYTES", str(512 * 1024 * 1024)))
+    HEALTH_PROBE_TTL = int(os.getenv("HEALTH_PROBE_TTL", "600"))
+    WORKER_LEASE_SECONDS = int(os.getenv("WORKER_LEASE_SECONDS", "60"))
     
     LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO")
     LOG_FORMAT = "%(asctime)s - %(name)s - %(levelname)s - %(message)s"
     
+    _logging_configured = False
+    
     @classmethod
     def setup_logging(cls):
-        cls.LOGS_DIR.mkdir(exist_ok=True)
-        
-        logging.basicConfig(
-            level=getattr(logging, cls.LOG_LEVEL),
-            format=cls.LOG_FORMAT,
-            handlers=[
-                logging.FileHandler(cls.LOGS_DIR / "agent.log"),
-                logging.StreamHandler()
-            ]
-        )
+        # Deferred until a command actually runs so importing the package stays cheap
+        if not cls._logging_configured:
+            cls._logging_configured = True
+            cls.LOGS_DIR.mkdir(exist_ok=True)
+            
+            logging.basicConfig(
+                level=getattr(logging, cls.LOG_LEVEL),
+                format=cls.LOG_FORMAT,
+                handlers=[
+                    logging.FileHandler(cls.LOGS_DIR / "agent.log"),
+                    logging.StreamHandler()
+                ]
+            )
         
         return logging.getLogger(__name__)
 
 config = Config()
-logger = config.setup_logging()
\ No newline at end of file
+logger = logging.getLogger(__name__)
\ No newline at end of file
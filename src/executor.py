@@ -0,0 +1,249 @@
+import os
+import json
+import codecs
+import signal
+import asyncio
+import subprocess
+from collections import deque
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, List, Optional
+
+from .config import config, logger
+
+READ_CHUNK_SIZE = 64 * 1024
+KILL_GRACE_PERIOD = 5.0
+LOG_FLUSH_INTERVAL = 1.0
+RESOURCE_SAMPLE_INTERVAL = 0.5
+EXIT_POLL_INTERVAL = 0.1
+
+class OutputCapture:
+    """サブプロセス出力を上限サイズまでメモリに保持し、超過時はディスクに退避"""
+
+    def __init__(self, spill_path: Path, memory_limit: int):
+        self.spill_path = spill_path
+        self.memory_limit = memory_limit
+        self.lines = deque()
+        self.memory_bytes = 0
+        self.total_bytes = 0
+        self.spill_file = None
+
+    @property
+    def spilled(self) -> bool:
+        return self.spill_file is not None
+
+    def write(self, text: str):
+        size = len(text.encode('utf-8'))
+        self.total_bytes += size
+        self.lines.append(text)
+        self.memory_bytes += size
+
+        if self.spill_file:
+            self.spill_file.write(text)
+        elif self.memory_bytes > self.memory_limit:
+            # The spill file always holds the complete output; memory keeps only the tail
+            logger.info(f"Output exceeded {self.memory_limit} bytes, spilling to {self.spill_path}")
+            self.spill_file = open(self.spill_path, 'w', encoding='utf-8')
+            self.spill_file.writelines(self.lines)
+
+        while self.memory_bytes > self.memory_limit and len(self.lines) > 1:
+            self.memory_bytes -= len(self.lines.popleft().encode('utf-8'))
+
+    def getvalue(self) -> str:
+        return ''.join(self.lines)
+
+    def close(self):
+        if self.spill_file:
+            self.spill_file.close()
+
+class StreamingExecutor:
+    """asyncioでサブプロセスを実行し、stdout/stderrを逐次ログとexecution_log.jsonに書き出す"""
+
+    def __init__(self, working_dir: Path, log_context: Optional[Dict] = None,
+                 memory_limit: Optional[int] = None, timeout: Optional[int] = None):
+        self.working_dir = working_dir
+        self.log_context = log_context
+        self.memory_limit = memory_limit or config.CLAUDE_OUTPUT_MEMORY_LIMIT
+        self.timeout = timeout or config.CLAUDE_CODE_TIMEOUT
+        self._last_flush = 0.0
+        # Accumulated over every run of this executor (e.g. the permission-flag retry)
+        self.resources = {'cpu_seconds': 0.0, 'peak_rss_bytes': 0}
+
+    def run(self, cmd: List[str], env: Optional[Dict] = None) -> Dict:
+        return asyncio.run(self._run(cmd, env))
+
+    async def _run(self, cmd: List[str], env: Optional[Dict]) -> Dict:
+        stdout = OutputCapture(self.working_dir / "claude_stdout.log", self.memory_limit)
+        stderr = OutputCapture(self.working_dir / "claude_stderr.log", self.memory_limit)
+
+        try:
+            process = await asyncio.create_subprocess_exec(
+                *cmd,
+                cwd=self.working_dir,
+                env=env,
+                stdin=subprocess.DEVNULL,
+                stdout=asyncio.subprocess.PIPE,
+                stderr=asyncio.subprocess.PIPE,
+                start_new_session=hasattr(os, 'killpg')
+            )
+
+            pumps = asyncio.gather(
+                self._pump(process.stdout, stdout, stdout, stderr, "stdout"),
+                self._pump(process.stderr, stderr, stdout, stderr, "stderr")
+            )
+            cpu_before = self.resources['cpu_seconds']
+            monitor = asyncio.ensure_future(self._monitor(process.pid, cpu_before))
+
+            try:
+                try:
+                    returncode = await asyncio.wait_for(self._wait_exit(process), timeout=self.timeout)
+                except asyncio.TimeoutError:
+                    await self._kill_process_group(process)
+                    await self._drain(pumps)
+                    raise subprocess.TimeoutExpired(cmd, self.timeout)
+
+                # Descendants that inherited stdout/stderr keep the pipes open after the main process exits
+                try:
+                    await asyncio.wait_for(asyncio.shield(pumps), timeout=KILL_GRACE_PERIOD)
+                except asyncio.TimeoutError:
+                    logger.warning(f"Background processes of {self.working_dir.name} still hold its output "
+                                   f"{KILL_GRACE_PERIOD:.0f}s after exit, terminating them")
+                await self._kill_process_group(process)
+                await self._drain(pumps)
+            finally:
+                monitor.cancel()
+
+            return self._build_result(returncode, stdout, stderr)
+
+        finally:
+            stdout.close()
+            stderr.close()
+
+    async def _wait_exit(self, process) -> int:
+        """メインプロセスの終了を待つ（process.wait() はパイプが閉じるまで返らないので returncode を見る）"""
+        while process.returncode is None:
+            await asyncio.sleep(EXIT_POLL_INTERVAL)
+        return process.returncode
+
+    async def _drain(self, pumps):
+        try:
+            await asyncio.wait_for(pumps, timeout=KILL_GRACE_PERIOD)
+        except (asyncio.TimeoutError, asyncio.CancelledError):
+            pass
+
+    async def _pump(self, stream, capture: OutputCapture, stdout: OutputCapture,
+                    stderr: OutputCapture, label: str):
+        decoder = codecs.getincrementaldecoder('utf-8')(errors='replace')
+        pending = ''
+
+        while True:
+            chunk = await stream.read(READ_CHUNK_SIZE)
+            text = decoder.decode(chunk, final=not chunk)
+
+            if text:
+                pending += text
+                *lines, pending = pending.split('\n')
+                for line in lines:
+                    self._emit(capture, line + '\n', label)
+                # Never hold an unterminated line beyond one chunk
+                if len(pending) > READ_CHUNK_SIZE:
+                    self._emit(capture, pending, label)
+                    pending = ''
+                self._flush_log(stdout, stderr)
+
+            if not chunk:
+                break
+
+        if pending:
+            self._emit(capture, pending, label)
+        self._flush_log(stdout, stderr, force=True)
+
+    def _emit(self, capture: OutputCapture, text: str, label: str):
+        capture.write(text)
+        logger.info(f"[{self.working_dir.name}:{label}] {text.rstrip()}")
+
+    def _flush_log(self, stdout: OutputCapture, stderr: OutputCapture, force: bool = False):
+        if self.log_context is None:
+            return
+
+        now = asyncio.get_running_loop().time()
+        if not force and now - self._last_flush < LOG_FLUSH_INTERVAL:
+            return
+        self._last_flush = now
+
+        try:
+            with open(self.working_dir / "execution_log.json", 'w') as f:
+                json.dump({
+                    **self.log_context,
+                    'status': 'running',
+                    'timestamp': datetime.now().isoformat(),
+                    'result': self._build_result(None, stdout, stderr)
+                }, f, indent=2)
+        except OSError as e:
+            logger.warning(f"Failed to update execution log: {e}")
+
+    async def _monitor(self, pid: int, cpu_before: float):
+        """子プロセスツリーのCPU時間とRSSを定期的にサンプリング"""
+        try:
+            import psutil
+            leader = psutil.Process(pid)
+        except Exception:
+            return
+
+        while True:
+            try:
+                processes = [leader] + leader.children(recursive=True)
+            except psutil.Error:
+                return
+
+            cpu = 0.0
+            rss = 0
+            for proc in processes:
+                try:
+                    times = proc.cpu_times()
+                    rss += proc.memory_info().rss
+                except psutil.Error:
+                    continue
+                # children_* covers descendants that already exited and were reaped
+                cpu += times.user + times.system + times.children_user + times.children_system
+
+            # The last sample before exit is the best figure available once the process is reaped
+            self.resources['cpu_seconds'] = max(self.resources['cpu_seconds'], cpu_before + cpu)
+            self.resources['peak_rss_bytes'] = max(self.resources['peak_rss_bytes'], rss)
+            await asyncio.sleep(RESOURCE_SAMPLE_INTERVAL)
+
+    async def _kill_process_group(self, process):
+        """タイムアウト時、またはメインプロセスの終了後に、子プロセスを含むプロセスグループ全体を終了"""
+        def send(sig):
+            try:
+                if hasattr(os, 'killpg'):
+                    os.killpg(process.pid, sig)
+                else:
+                    process.kill()
+            except (ProcessLookupError, PermissionError):
+                pass
+
+        send(signal.SIGTERM)
+        try:
+            await asyncio.wait_for(process.wait(), timeout=KILL_GRACE_PERIOD)
+        except asyncio.TimeoutError:
+            send(getattr(signal, 'SIGKILL', signal.SIGTERM))
+            await process.wait()
+        # The leader may exit on SIGTERM while descendants ignore it
+        send(getattr(signal, 'SIGKILL', signal.SIGTERM))
+
+    def _build_result(self, returncode: Optional[int], stdout: OutputCapture,
+                      stderr: OutputCapture) -> Dict:
+        result = {
+            'success': returncode == 0,
+            'stdout': stdout.getvalue(),
+            'stderr': stderr.getvalue(),
+            'returncode': returncode,
+            'stdout_bytes': stdout.total_bytes,
+            'stderr_bytes': stderr.total_bytes,
+            'resources': dict(self.resources)
+        }
+        for name, capture in (('stdout', stdout), ('stderr', stderr)):
+            if capture.spilled:
+                result[f'{name}_file'] = str(capture.spill_path)
+        return result
@@ -0,0 +1,44 @@
+import time
+from contextlib import contextmanager
+from typing import Dict, Iterator, List, Optional
+
+TASK_PHASES = ['instruction', 'claude', 'parse', 'filesystem']
+
+class PhaseTimer:
+    """タスク実行の各フェーズの経過時間とリソース使用量を記録"""
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.phases = {phase: 0.0 for phase in TASK_PHASES}
+        self.metrics = {}
+
+    @contextmanager
+    def phase(self, name: str) -> Iterator[None]:
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.phases[name] = self.phases.get(name, 0.0) + time.perf_counter() - start
+
+    @property
+    def total_seconds(self) -> float:
+        return time.perf_counter() - self.started
+
+def percentile(values: List[float], q: float) -> Optional[float]:
+    """線形補間によるパーセンタイル（q は 0〜100）"""
+    if not values:
+        return None
+
+    ordered = sorted(values)
+    position = (len(ordered) - 1) * q / 100
+    lower = int(position)
+    upper = min(lower + 1, len(ordered) - 1)
+    return ordered[lower] + (ordered[upper] - ordered[lower]) * (position - lower)
+
+def summarize(values: List[float]) -> Dict[str, Optional[float]]:
+    return {
+        'count': len(values),
+        'p50': percentile(values, 50),
+        'p95': percentile(values, 95),
+        'p99': percentile(values, 99)
+    }
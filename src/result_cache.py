@@ -0,0 +1,142 @@
+import os
+import json
+import time
+import shutil
+import hashlib
+import tempfile
+from pathlib import Path
+from typing import Optional
+
+from .config import config, logger
+from .task_manager import Task
+
+class ResultCache:
+    """命令文のハッシュをキーにタスクのワークスペース出力を保存・復元するキャッシュ
+
+    エントリ合計サイズが上限を超えると、最後に使われた時刻が古い順に削除する。
+    """
+
+    META_FILE = "cache_meta.json"
+
+    def __init__(self, cache_dir: Optional[Path] = None, max_bytes: Optional[int] = None):
+        self.cache_dir = cache_dir or config.CACHE_DIR / "results"
+        self.max_bytes = max_bytes if max_bytes is not None else config.RESULT_CACHE_MAX_BYTES
+
+    def key_for(self, task: Task, instruction: str) -> str:
+        digest = hashlib.sha256()
+        for part in (config.CLAUDE_CODE_COMMAND, task.type.lower(), instruction):
+            digest.update(part.encode('utf-8'))
+            digest.update(b'\0')
+
+        # Relative inputs resolve against the project root, not the task workspace,
+        # so files a previous run generated there do not change the key
+        input_path = task.parameters.get('input_file') or task.parameters.get('target_file')
+        if input_path:
+            digest.update(self._input_digest(config.PROJECT_ROOT / input_path).encode('utf-8'))
+
+        return digest.hexdigest()
+
+    def _input_digest(self, path: Path) -> str:
+        """入力ファイル（またはディレクトリ）の内容ダイジェスト。存在しなければ空文字"""
+        if path.is_file():
+            files = [path]
+            root = path.parent
+        elif path.is_dir():
+            files = sorted(p for p in path.rglob('*') if p.is_file())
+            root = path
+        else:
+            return ''
+
+        digest = hashlib.sha256()
+        for file_path in files:
+            digest.update(str(file_path.relative_to(root)).encode('utf-8'))
+            with open(file_path, 'rb') as f:
+                for chunk in iter(lambda: f.read(1024 * 1024), b''):
+                    digest.update(chunk)
+        return digest.hexdigest()
+
+    def restore(self, key: str, working_dir: Path) -> bool:
+        entry = self.cache_dir / key
+        files_dir = entry / "files"
+        if not files_dir.is_dir():
+            return False
+
+        try:
+            shutil.copytree(files_dir, working_dir, dirs_exist_ok=True)
+            self._touch(entry)
+        except OSError as e:
+            logger.warning(f"Failed to restore cached result {key[:12]}: {e}")
+            return False
+
+        logger.info(f"Restored cached result {key[:12]} into {working_dir}")
+        return True
+
+    def store(self, key: str, working_dir: Path):
+        if self.max_bytes <= 0:
+            return
+
+        size = sum(p.stat().st_size for p in working_dir.rglob('*') if p.is_file())
+        if size > self.max_bytes:
+            logger.info(f"Result of {working_dir.name} ({size} bytes) exceeds the cache size limit, not caching")
+            return
+
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        entry = self.cache_dir / key
+        if self._exists(entry):
+            # Same key means same output; keep the entry readers may already be copying from
+            self._touch(entry)
+            return
+
+        try:
+            staging = Path(tempfile.mkdtemp(prefix=f".{key[:12]}.", suffix=".tmp", dir=self.cache_dir))
+        except OSError as e:
+            logger.warning(f"Failed to cache result of {working_dir.name}: {e}")
+            return
+
+        try:
+            shutil.copytree(working_dir, staging / "files")
+            (staging / self.META_FILE).write_text(json.dumps({
+                'size': size,
+                'created_at': time.time(),
+                'source': working_dir.name
+            }))
+            # Rename is atomic, so concurrent readers never see a half-written entry
+            os.replace(staging, entry)
+            self._touch(entry)
+        except OSError as e:
+            shutil.rmtree(staging, ignore_errors=True)
+            if self._exists(entry):
+                # Another worker stored the same key first
+                self._touch(entry)
+                return
+            logger.warning(f"Failed to cache result of {working_dir.name}: {e}")
+            return
+
+        self.evict()
+
+    def _exists(self, entry: Path) -> bool:
+        return (entry / self.META_FILE).is_file()
+
+    def _touch(self, entry: Path):
+        os.utime(entry / self.META_FILE)
+
+    def evict(self):
+        """合計サイズが上限以下になるまで最も長く使われていないエントリを削除"""
+        entries = []
+        for entry in self.cache_dir.iterdir():
+            if entry.name.startswith('.'):
+                continue  # staging directory of an in-progress store
+            meta_file = entry / self.META_FILE
+            try:
+                size = json.loads(meta_file.read_text())['size']
+                entries.append((meta_file.stat().st_mtime, size, entry))
+            except (OSError, ValueError, KeyError):
+                continue
+
+        total = sum(size for _, size, _ in entries)
+        for _, size, entry in sorted(entries, key=lambda item: item[0]):
+            if total <= self.max_bytes:
+                break
+            shutil.rmtree(entry, ignore_errors=True)
+            total -= size
+            logger.info(f"Evicted cached result {entry.name[:12]} ({size} bytes)")
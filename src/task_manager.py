@@ -1,19 +1,65 @@
-import yaml
+import json
+import time
+import atexit
 import sqlite3
+import threading
+from contextlib import contextmanager
 from datetime import datetime
 from pathlib import Path
-from typing import List, Dict, Optional
-from dataclasses import dataclass
+from typing import List, Dict, Optional, Iterator, Tuple
+from collections import UserDict
+from dataclasses import dataclass, field
 from enum import Enum
 
 from .config import config, logger
 
+def load_yaml(stream):
+    # Imported lazily: PyYAML is only needed for task files and legacy rows.
+    # libyaml's loader is an order of magnitude faster when PyYAML was built with it
+    import yaml
+    return yaml.load(stream, Loader=getattr(yaml, 'CSafeLoader', yaml.SafeLoader))
+
 class TaskStatus(Enum):
     PENDING = "pending"
     RUNNING = "running"
     COMPLETED = "completed"
     FAILED = "failed"
 
+def encode_parameters(parameters) -> str:
+    if isinstance(parameters, LazyParameters) and not parameters.decoded:
+        return parameters.raw
+    return json.dumps(dict(parameters or {}), ensure_ascii=False, separators=(',', ':'), default=str)
+
+def decode_parameters(raw: Optional[str]) -> Dict:
+    if not raw:
+        return {}
+    try:
+        return json.loads(raw)
+    except json.JSONDecodeError:
+        # Rows written before the JSON migration (or by an older process) are YAML
+        return load_yaml(raw) or {}
+
+class LazyParameters(UserDict):
+    """DBから読み込んだparametersを最初にアクセスされた時点でデコードする辞書"""
+    
+    def __init__(self, raw: Optional[str]):
+        self.raw = raw
+        self._data = None
+    
+    @property
+    def decoded(self) -> bool:
+        return self._data is not None
+    
+    @property
+    def data(self) -> Dict:
+        if self._data is None:
+            self._data = decode_parameters(self.raw)
+        return self._data
+    
+    @data.setter
+    def data(self, value: Dict):
+        self._data = value
+
 @dataclass
 class Task:
     id: str
@@ -27,14 +73,60 @@ class Task:
     completed_at: Optional[datetime] = None
     output_path: Optional[str] = None
     error_message: Optional[str] = None
+    depends_on: List[str] = field(default_factory=list)
+
+TASK_COLUMNS = """id, name, description, type, parameters, status, created_at,
+                  started_at, completed_at, output_path, error_message, depends_on"""
 
 class TaskManager:
+    WRITE_BATCH_SIZE = 64
+    WRITE_FLUSH_INTERVAL = 0.1
+    
+    # Applied in order; PRAGMA user_version records how many have run
+    MIGRATIONS = [
+        '_migrate_indexes_and_stats',
+        '_migrate_parameters_to_json',
+        '_migrate_task_leases',
+        '_migrate_task_runs',
+        '_migrate_task_runs_cache_hit',
+    ]
+    
+    # A reclaimed task is failed instead of re-run once it has been claimed this often
+    MAX_LEASE_ATTEMPTS = 3
+    
     def __init__(self):
         self.db_path = config.DATABASE_PATH
+        self._lock = threading.RLock()
+        self._conn = self._connect()
+        self._pending_updates = []
+        self._closed = False
+        self._flush_wakeup = threading.Event()
         self._init_database()
+        
+        # Group status/timestamp updates into one transaction per flush interval
+        self._flusher = threading.Thread(target=self._flush_loop, name="task-db-flusher", daemon=True)
+        self._flusher.start()
+        atexit.register(self.close)
+    
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.db_path, timeout=30, check_same_thread=False)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.execute("PRAGMA busy_timeout=30000")
+        # INSERT OR REPLACE only fires DELETE triggers with recursive triggers enabled
+        conn.execute("PRAGMA recursive_triggers=ON")
+        return conn
+    
+    @contextmanager
+    def _connection(self) -> Iterator[sqlite3.Connection]:
+        """共有接続を取得（保留中の書き込みを先に反映し、ブロック終了時にコミット）"""
+        with self._lock:
+            self._flush_pending()
+            with self._conn:
+                yield self._conn
     
     def _init_database(self):
-        with sqlite3.connect(self.db_path) as conn:
+        with self._connection() as conn:
             conn.execute("""
                 CREATE TABLE IF NOT EXISTS tasks (
                     id TEXT PRIMARY KEY,
@@ -50,22 +142,193 @@ class TaskManager:
                     error_message TEXT
                 )
             """)
-            conn.commit()
+        self._migrate()
+    
+    @contextmanager
+    def _immediate_transaction(self) -> Iterator[sqlite3.Connection]:
+        """書き込みロックを先に取得するトランザクション（複数プロセス間での読み取り→更新を原子的に行う）"""
+        with self._lock:
+            self._flush_pending()
+            conn = self._conn
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                yield conn
+                conn.commit()
+            except Exception:
+                conn.rollback()
+                raise
+    
+    def _migrate(self):
+        with self._immediate_transaction() as conn:
+            version = conn.execute("PRAGMA user_version").fetchone()[0]
+            for target, name in enumerate(self.MIGRATIONS, start=1):
+                if version < target:
+                    logger.info(f"Migrating task database to schema version {target} ({name})")
+                    getattr(self, name)(conn)
+                    conn.execute(f"PRAGMA user_version = {target}")
+    
+    def _migrate_indexes_and_stats(self, conn: sqlite3.Connection):
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_tasks_status ON tasks (status)")
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_tasks_created_at ON tasks (created_at, id)")
+        
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS task_stats (
+                status TEXT PRIMARY KEY,
+                count INTEGER NOT NULL DEFAULT 0
+            )
+        """)
+        conn.execute("DELETE FROM task_stats")
+        conn.execute("INSERT INTO task_stats (status, count) SELECT status, COUNT(*) FROM tasks GROUP BY status")
+        # Triggers only adjust existing rows (an outer INSERT OR REPLACE would override
+        # any conflict clause inside them), so every status gets a row up front
+        conn.executemany(
+            "INSERT OR IGNORE INTO task_stats (status, count) VALUES (?, 0)",
+            [(status.value,) for status in TaskStatus]
+        )
+        
+        conn.execute("""
+            CREATE TRIGGER IF NOT EXISTS tasks_stats_insert AFTER INSERT ON tasks
+            BEGIN
+                UPDATE task_stats SET count = count + 1 WHERE status = NEW.status;
+            END
+        """)
+        conn.execute("""
+            CREATE TRIGGER IF NOT EXISTS tasks_stats_delete AFTER DELETE ON tasks
+            BEGIN
+                UPDATE task_stats SET count = count - 1 WHERE status = OLD.status;
+            END
+        """)
+        conn.execute("""
+            CREATE TRIGGER IF NOT EXISTS tasks_stats_update AFTER UPDATE OF status ON tasks
+            WHEN OLD.status IS NOT NEW.status
+            BEGIN
+                UPDATE task_stats SET count = count - 1 WHERE status = OLD.status;
+                UPDATE task_stats SET count = count + 1 WHERE status = NEW.status;
+            END
+        """)
+    
+    def _flush_loop(self):
+        while not self._closed:
+            self._flush_wakeup.wait(self.WRITE_FLUSH_INTERVAL)
+            self._flush_wakeup.clear()
+            try:
+                self.flush()
+            except sqlite3.Error as e:
+                logger.error(f"Failed to flush task status updates: {e}")
+    
+    def _flush_pending(self):
+        if not self._pending_updates:
+            return
+        updates, self._pending_updates = self._pending_updates, []
+        try:
+            with self._conn:
+                self._conn.executemany("""
+                    UPDATE tasks SET
+                        status = ?,
+                        started_at = COALESCE(started_at, ?),
+                        completed_at = COALESCE(?, completed_at),
+                        output_path = COALESCE(?, output_path),
+                        error_message = CASE WHEN ? THEN ? ELSE COALESCE(?, error_message) END
+                    WHERE id = ?
+                """, updates)
+        except sqlite3.Error:
+            # The transaction rolled back; keep the batch (ahead of newer updates) for the next flush
+            self._pending_updates = updates + self._pending_updates
+            raise
+    
+    def flush(self):
+        with self._lock:
+            if self._conn is not None:
+                self._flush_pending()
+    
+    def close(self):
+        with self._lock:
+            if self._conn is None:
+                return
+            self._closed = True
+            self._flush_wakeup.set()
+            self._flush_pending()
+            self._conn.close()
+            self._conn = None
+    
+    def _migrate_parameters_to_json(self, conn: sqlite3.Connection):
+        converted = 0
+        last_rowid = 0
+        while True:
+            rows = conn.execute(
+                "SELECT rowid, parameters FROM tasks WHERE rowid > ? ORDER BY rowid LIMIT 1000",
+                (last_rowid,)
+            ).fetchall()
+            if not rows:
+                break
+            last_rowid = rows[-1][0]
+            
+            batch = []
+            for rowid, raw in rows:
+                if not raw:
+                    continue
+                try:
+                    json.loads(raw)
+                except json.JSONDecodeError:
+                    batch.append((encode_parameters(load_yaml(raw)), rowid))
+            conn.executemany("UPDATE tasks SET parameters = ? WHERE rowid = ?", batch)
+            converted += len(batch)
+        
+        logger.info(f"Converted parameters of {converted} tasks from YAML to JSON")
+    
+    def _migrate_task_leases(self, conn: sqlite3.Connection):
+        conn.execute("ALTER TABLE tasks ADD COLUMN depends_on TEXT")
+        conn.execute("ALTER TABLE tasks ADD COLUMN lease_owner TEXT")
+        conn.execute("ALTER TABLE tasks ADD COLUMN lease_expires_at REAL")
+        conn.execute("ALTER TABLE tasks ADD COLUMN attempts INTEGER NOT NULL DEFAULT 0")
+        # Only enqueued tasks are visible to workers; tasks saved by `run` stay in-process
+        conn.execute("ALTER TABLE tasks ADD COLUMN enqueued_at REAL")
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_tasks_queue ON tasks (status, enqueued_at)")
+    
+    def _migrate_task_runs(self, conn: sqlite3.Connection):
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS task_runs (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                task_id TEXT NOT NULL,
+                task_type TEXT NOT NULL,
+                recorded_at TIMESTAMP,
+                success INTEGER NOT NULL,
+                total_seconds REAL,
+                instruction_seconds REAL,
+                claude_seconds REAL,
+                parse_seconds REAL,
+                filesystem_seconds REAL,
+                child_cpu_seconds REAL,
+                peak_rss_bytes INTEGER,
+                stdout_bytes INTEGER,
+                stderr_bytes INTEGER,
+                files_created INTEGER
+            )
+        """)
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_task_runs_type ON task_runs (task_type, id)")
+    
+    def _migrate_task_runs_cache_hit(self, conn: sqlite3.Connection):
+        conn.execute("ALTER TABLE task_runs ADD COLUMN cache_hit INTEGER NOT NULL DEFAULT 0")
     
     def load_tasks_from_yaml(self, yaml_path: Path) -> List[Task]:
         try:
             with open(yaml_path, 'r', encoding='utf-8') as file:
-                data = yaml.safe_load(file)
+                data = load_yaml(file)
             
             tasks = []
             for task_data in data.get('tasks', []):
+                depends_on = task_data.get('depends_on', [])
+                if isinstance(depends_on, str):
+                    depends_on = [depends_on]
+                
                 task = Task(
                     id=task_data['id'],
                     name=task_data['name'],
                     description=task_data.get('description', ''),
                     type=task_data['type'],
                     parameters=task_data.get('parameters', {}),
-                    created_at=datetime.now()
+                    created_at=datetime.now(),
+                    depends_on=[str(dep) for dep in depends_on]
                 )
                 tasks.append(task)
             
@@ -77,79 +340,191 @@ class TaskManager:
             return []
     
     def save_task(self, task: Task):
-        with sqlite3.connect(self.db_path) as conn:
-            conn.execute("""
-                INSERT OR REPLACE INTO tasks 
-                (id, name, description, type, parameters, status, created_at, 
-                 started_at, completed_at, output_path, error_message)
-                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-            """, (
-                task.id, task.name, task.description, task.type,
-                yaml.dump(task.parameters), task.status.value,
-                task.created_at, task.started_at, task.completed_at,
-                task.output_path, task.error_message
-            ))
-            conn.commit()
+        with self._connection() as conn:
+            self._insert_task(conn, task)
+    
+    def enqueue_tasks(self, tasks: List[Task]):
+        """タスクをPENDINGとして保存し、ワーカーが取得できるキューに登録"""
+        now = time.time()
+        with self._connection() as conn:
+            for task in tasks:
+                task.status = TaskStatus.PENDING
+                self._insert_task(conn, task)
+                conn.execute("UPDATE tasks SET enqueued_at = ? WHERE id = ?", (now, task.id))
+        logger.info(f"Enqueued {len(tasks)} tasks")
+    
+    def _insert_task(self, conn: sqlite3.Connection, task: Task):
+        conn.execute("""
+            INSERT OR REPLACE INTO tasks 
+            (id, name, description, type, parameters, status, created_at, 
+             started_at, completed_at, output_path, error_message, depends_on)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+        """, (
+            task.id, task.name, task.description, task.type,
+            encode_parameters(task.parameters), task.status.value,
+            task.created_at, task.started_at, task.completed_at,
+            task.output_path, task.error_message,
+            json.dumps(task.depends_on) if task.depends_on else None
+        ))
+    
+    def _row_to_task(self, row) -> Task:
+        return Task(
+            id=row[0], name=row[1], description=row[2], type=row[3],
+            parameters=LazyParameters(row[4]), status=TaskStatus(row[5]),
+            created_at=datetime.fromisoformat(row[6]) if row[6] else None,
+            started_at=datetime.fromisoformat(row[7]) if row[7] else None,
+            completed_at=datetime.fromisoformat(row[8]) if row[8] else None,
+            output_path=row[9], error_message=row[10],
+            depends_on=json.loads(row[11]) if row[11] else []
+        )
     
     def get_task(self, task_id: str) -> Optional[Task]:
-        with sqlite3.connect(self.db_path) as conn:
-            cursor = conn.execute("SELECT * FROM tasks WHERE id = ?", (task_id,))
+        with self._connection() as conn:
+            cursor = conn.execute(f"SELECT {TASK_COLUMNS} FROM tasks WHERE id = ?", (task_id,))
             row = cursor.fetchone()
             
             if row:
-                return Task(
-                    id=row[0], name=row[1], description=row[2], type=row[3],
-                    parameters=yaml.safe_load(row[4]), status=TaskStatus(row[5]),
-                    created_at=datetime.fromisoformat(row[6]) if row[6] else None,
-                    started_at=datetime.fromisoformat(row[7]) if row[7] else None,
-                    completed_at=datetime.fromisoformat(row[8]) if row[8] else None,
-                    output_path=row[9], error_message=row[10]
-                )
+                return self._row_to_task(row)
         return None
     
     def get_all_tasks(self) -> List[Task]:
-        tasks = []
-        with sqlite3.connect(self.db_path) as conn:
-            cursor = conn.execute("SELECT * FROM tasks ORDER BY created_at DESC")
-            for row in cursor.fetchall():
-                task = Task(
-                    id=row[0], name=row[1], description=row[2], type=row[3],
-                    parameters=yaml.safe_load(row[4]), status=TaskStatus(row[5]),
-                    created_at=datetime.fromisoformat(row[6]) if row[6] else None,
-                    started_at=datetime.fromisoformat(row[7]) if row[7] else None,
-                    completed_at=datetime.fromisoformat(row[8]) if row[8] else None,
-                    output_path=row[9], error_message=row[10]
-                )
-                tasks.append(task)
-        return tasks
+        with self._connection() as conn:
+            cursor = conn.execute(f"SELECT {TASK_COLUMNS} FROM tasks ORDER BY created_at DESC")
+            return [self._row_to_task(row) for row in cursor.fetchall()]
+    
+    def get_recent_tasks(self, limit: int = 20, 
+                         cursor: Optional[Tuple[str, str]] = None) -> Tuple[List[Task], Optional[Tuple[str, str]]]:
+        """created_at降順でタスクを取得（キーセットページネーション）
+        
+        戻り値の次ページ用カーソルを次回呼び出しの``cursor``に渡す。最終ページではNone。
+        """
+        with self._connection() as conn:
+            if cursor is None:
+                rows = conn.execute(f"""
+                    SELECT {TASK_COLUMNS} FROM tasks
+                    ORDER BY created_at DESC, id DESC LIMIT ?
+                """, (limit,)).fetchall()
+            else:
+                rows = conn.execute(f"""
+                    SELECT {TASK_COLUMNS} FROM tasks
+                    WHERE (created_at, id) < (?, ?)
+                    ORDER BY created_at DESC, id DESC LIMIT ?
+                """, (cursor[0], cursor[1], limit)).fetchall()
+        
+        next_cursor = (rows[-1][6], rows[-1][0]) if len(rows) == limit else None
+        return [self._row_to_task(row) for row in rows], next_cursor
     
     def update_task_status(self, task_id: str, status: TaskStatus, 
                           output_path: Optional[str] = None, 
                           error_message: Optional[str] = None):
-        task = self.get_task(task_id)
-        if task:
-            task.status = status
-            if status == TaskStatus.RUNNING and not task.started_at:
-                task.started_at = datetime.now()
-            elif status in [TaskStatus.COMPLETED, TaskStatus.FAILED]:
-                task.completed_at = datetime.now()
+        now = datetime.now()
+        started_at = now if status == TaskStatus.RUNNING else None
+        completed_at = now if status in [TaskStatus.COMPLETED, TaskStatus.FAILED] else None
+        # A retried task that runs or completes no longer carries the previous attempt's error
+        reset_error = status in [TaskStatus.RUNNING, TaskStatus.COMPLETED]
+        
+        with self._lock:
+            self._pending_updates.append((
+                status.value, started_at, completed_at, output_path or None,
+                reset_error, error_message or None, error_message or None, task_id
+            ))
+            if len(self._pending_updates) >= self.WRITE_BATCH_SIZE:
+                self._flush_wakeup.set()
+    
+    def claim_task(self, worker_id: str, lease_seconds: float) -> Optional[Task]:
+        """実行可能なタスクを1件リースして返す（PENDING、またはリース期限切れのRUNNING）
+        
+        BEGIN IMMEDIATEで書き込みロックを取るため、DBを共有する複数ワーカーが同じタスクを取得することはない。
+        """
+        now = time.time()
+        with self._immediate_transaction() as conn:
+            # Tasks whose worker died too many times are failed rather than retried forever
+            conn.execute("""
+                UPDATE tasks SET status = 'failed', completed_at = ?, lease_owner = NULL,
+                    lease_expires_at = NULL, error_message = 'Lease expired after ' || attempts || ' attempts'
+                WHERE status = 'running' AND lease_expires_at < ? AND attempts >= ?
+            """, (datetime.now(), now, self.MAX_LEASE_ATTEMPTS))
+            
+            # Prerequisites that failed will never complete, so their dependents cannot run either
+            conn.execute("""
+                UPDATE tasks SET status = 'failed', completed_at = ?,
+                    error_message = 'Skipped: a prerequisite did not complete'
+                WHERE status = 'pending' AND enqueued_at IS NOT NULL AND depends_on IS NOT NULL AND EXISTS (
+                    SELECT 1 FROM json_each(tasks.depends_on) dep
+                    LEFT JOIN tasks prereq ON prereq.id = dep.value
+                    WHERE prereq.id IS NULL OR prereq.status = 'failed'
+                )
+            """, (datetime.now(),))
             
-            if output_path:
-                task.output_path = output_path
-            if error_message:
-                task.error_message = error_message
+            row = conn.execute("""
+                SELECT id FROM tasks
+                WHERE enqueued_at IS NOT NULL
+                  AND (status = 'pending' OR (status = 'running' AND lease_expires_at < ?))
+                  AND (depends_on IS NULL OR NOT EXISTS (
+                    SELECT 1 FROM json_each(tasks.depends_on) dep
+                    LEFT JOIN tasks prereq ON prereq.id = dep.value
+                    WHERE prereq.status IS NOT 'completed'
+                  ))
+                ORDER BY enqueued_at, created_at, id
+                LIMIT 1
+            """, (now,)).fetchone()
             
-            self.save_task(task)
+            if not row:
+                return None
+            
+            conn.execute("""
+                UPDATE tasks SET status = 'running', started_at = ?, completed_at = NULL,
+                    lease_owner = ?, lease_expires_at = ?, attempts = attempts + 1
+                WHERE id = ?
+            """, (datetime.now(), worker_id, now + lease_seconds, row[0]))
+            
+            return self._row_to_task(
+                conn.execute(f"SELECT {TASK_COLUMNS} FROM tasks WHERE id = ?", (row[0],)).fetchone()
+            )
+    
+    def renew_leases(self, worker_id: str, lease_seconds: float) -> int:
+        with self._connection() as conn:
+            cursor = conn.execute(
+                "UPDATE tasks SET lease_expires_at = ? WHERE lease_owner = ? AND status = 'running'",
+                (time.time() + lease_seconds, worker_id)
+            )
+            return cursor.rowcount
+    
+    def release_lease(self, task_id: str, worker_id: str):
+        with self._connection() as conn:
+            conn.execute(
+                "UPDATE tasks SET lease_owner = NULL, lease_expires_at = NULL WHERE id = ? AND lease_owner = ?",
+                (task_id, worker_id)
+            )
+    
+    def record_task_run(self, task: Task, success: bool, timer) -> None:
+        metrics = timer.metrics
+        with self._connection() as conn:
+            conn.execute("""
+                INSERT INTO task_runs
+                (task_id, task_type, recorded_at, success, total_seconds, instruction_seconds,
+                 claude_seconds, parse_seconds, filesystem_seconds, child_cpu_seconds,
+                 peak_rss_bytes, stdout_bytes, stderr_bytes, files_created, cache_hit)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+            """, (
+                task.id, task.type.lower(), datetime.now(), int(success), timer.total_seconds,
+                timer.phases.get('instruction'), timer.phases.get('claude'),
+                timer.phases.get('parse'), timer.phases.get('filesystem'),
+                metrics.get('cpu_seconds'), metrics.get('peak_rss_bytes'),
+                metrics.get('stdout_bytes'), metrics.get('stderr_bytes'), metrics.get('files_created'),
+                int(bool(metrics.get('cache_hit')))
+            ))
+    
+    def get_task_runs(self, limit: int = 10000) -> List[Dict]:
+        with self._connection() as conn:
+            cursor = conn.execute("SELECT * FROM task_runs ORDER BY id DESC LIMIT ?", (limit,))
+            columns = [description[0] for description in cursor.description]
+            return [dict(zip(columns, row)) for row in cursor.fetchall()]
     
     def get_task_statistics(self) -> Dict:
-        with sqlite3.connect(self.db_path) as conn:
-            cursor = conn.execute("""
-                SELECT status, COUNT(*) FROM tasks GROUP BY status
-            """)
-            stats = dict(cursor.fetchall())
-            
-            cursor = conn.execute("SELECT COUNT(*) FROM tasks")
-            total = cursor.fetchone()[0]
+        with self._connection() as conn:
+            stats = dict(conn.execute("SELECT status, count FROM task_stats").fetchall())
+            total = sum(stats.values())
             
             return {
                 'total': total,
@@ -158,4 +533,4 @@ class TaskManager:
                 'completed': stats.get('completed', 0),
                 'failed': stats.get('failed', 0),
                 'success_rate': (stats.get('completed', 0) / total * 100) if total > 0 else 0
-            }
\ No newline at end of file
+            }
@@ -0,0 +1,14 @@
+"""
+deploy/ のモジュールは互いにフラットに import するので、deploy/ をパスに加える
+キャッシュや状態の SQLite は一時ディレクトリに置き、実環境のものには触れない
+"""
+
+import os
+import sys
+import tempfile
+
+DEPLOY_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'deploy')
+sys.path.insert(0, DEPLOY_DIR)
+
+# config は import 時に CACHE_DIR を決めるので、どのテストモジュールより先に設定する
+os.environ['CACHE_DIR'] = tempfile.mkdtemp(prefix='news-ai-tests-')
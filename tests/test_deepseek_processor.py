@@ -0,0 +1,137 @@
+import json
+
+import httpx
+import pytest
+
+from config import LLM_CONFIG
+from deepseek_processor import DeepSeekProcessor
+from llm_cache import LLMResponseCache
+
+IDS = {'a1', 'a2', 'a3'}
+
+
+def analysis(article_id: str, **fields) -> dict:
+    return {'id': article_id, 'summary': f"{article_id} の要約", 'category': '経済', 'importance': 6, **fields}
+
+
+def test_bare_array():
+    content = json.dumps([analysis('a1'), analysis('a2'), analysis('a3')], ensure_ascii=False)
+    assert sorted(DeepSeekProcessor._extract_batch_results(content, IDS)) == ['a1', 'a2', 'a3']
+
+def test_array_wrapped_in_object_and_code_fence():
+    articles = [analysis('a1', keywords=['日銀', '金利']), analysis('a2')]
+    content = f"分析結果です。\n```json\n{json.dumps({'results': articles}, ensure_ascii=False)}\n```\n以上です。"
+    results = DeepSeekProcessor._extract_batch_results(content, IDS)
+    assert results == {'a1': articles[0], 'a2': articles[1]}
+
+def test_array_cut_off_by_max_tokens_keeps_the_complete_items():
+    content = json.dumps([analysis('a1'), analysis('a2'), analysis('a3')], ensure_ascii=False)
+    truncated = content[:content.index('"a3"') + 20]
+    results = DeepSeekProcessor._extract_batch_results(truncated, IDS)
+    assert sorted(results) == ['a1', 'a2']
+
+def test_nested_objects_and_unknown_ids_are_not_articles():
+    # 記事の中に id を持つオブジェクトがあっても別の記事としては拾わない
+    articles = [analysis('a1', source={'id': 'a2'}), analysis('a9'), {'summary': 'id なし'}]
+    results = DeepSeekProcessor._extract_batch_results(json.dumps(articles), IDS)
+    assert results == {'a1': articles[0]}
+
+
+def sse(content: str, chunk_size: int = 16) -> bytes:
+    events = [{'choices': [{'index': 0, 'delta': {'content': content[i:i + chunk_size]}}]}
+              for i in range(0, len(content), chunk_size)]
+    events.append({'choices': [{'index': 0, 'delta': {}, 'finish_reason': 'stop'}],
+                   'usage': {'total_tokens': 100}})
+    lines = [f"data: {json.dumps(event, ensure_ascii=False)}\n\n" for event in events] + ["data: [DONE]\n\n"]
+    return ''.join(lines).encode('utf-8')
+
+def reply(request: httpx.Request, content: str) -> httpx.Response:
+    if json.loads(request.content).get('stream'):
+        return httpx.Response(200, content=sse(content), headers={'content-type': 'text/event-stream'})
+    return httpx.Response(200, json={'choices': [{'index': 0, 'message': {'role': 'assistant', 'content': content}}],
+                                     'usage': {'total_tokens': 100}})
+
+@pytest.mark.parametrize('stream', [True, False])
+def test_batch_analyze_retries_items_missing_from_a_truncated_batch(tmp_path, monkeypatch, stream):
+    monkeypatch.setitem(LLM_CONFIG, 'stream', stream)
+    articles = [{'title': f"記事{i}", 'content': f"本文{i}", 'language': 'ja'} for i in range(1, 4)]
+    single_requests = []
+
+    def handler(request):
+        prompt = json.loads(request.content)['messages'][1]['content']
+        if 'JSON配列' in prompt:
+            content = json.dumps([analysis('a1'), analysis('a2'), analysis('a3')], ensure_ascii=False)
+            # 出典の [1] で打ち切らず、切れた配列から a1 と a2 を拾う
+            return reply(request, '記事[1]によると、' + content[:content.index('"a3"')])
+        single_requests.append(prompt)
+        return reply(request, f"```json\n{json.dumps(analysis('single'), ensure_ascii=False)}\n```")
+
+    processor = DeepSeekProcessor()
+    processor.client = httpx.Client(transport=httpx.MockTransport(handler))
+    processor.cache = LLMResponseCache(db_path=tmp_path / 'llm_cache.db')
+    try:
+        results = processor.batch_analyze(articles)
+    finally:
+        processor.cache.close()
+        processor.close()
+
+    assert [result['title'] for result in results] == ['記事1', '記事2', '記事3']
+    assert [result['ai_analysis']['summary'] for result in results] == ['a1 の要約', 'a2 の要約', 'single の要約']
+    assert len(single_requests) == 1 and '記事3' in single_requests[0]
+    assert not any(result['ai_analysis'].get('fallback') for result in results)
+
+def test_prose_requests_read_the_whole_stream(tmp_path, monkeypatch):
+    monkeypatch.setitem(LLM_CONFIG, 'stream', True)
+    prose = '背景: 設定は {"retries": 3} のように書く。' + '詳しい分析。' * 20
+    processor = DeepSeekProcessor()
+    processor.client = httpx.Client(transport=httpx.MockTransport(lambda request: reply(request, prose)))
+    processor.cache = LLMResponseCache(db_path=tmp_path / 'llm_cache.db')
+    try:
+        response = processor.chat_completion([{'role': 'user', 'content': '記事を書いて'}], 0.7, 3000)
+        assert response.json()['choices'][0]['message']['content'] == prose
+        response = processor.chat_completion([{'role': 'user', 'content': '分析して'}], 0.3, 500, expect_json='object')
+        # JSON が閉じたチャンクまでで読むのをやめる
+        content = response.json()['choices'][0]['message']['content']
+        assert content.startswith('背景: 設定は {"retries": 3}') and len(content) < len(prose)
+    finally:
+        processor.cache.close()
+        processor.close()
+
+@pytest.mark.parametrize('stream', [True, False])
+def test_replies_without_usable_json_are_not_cached(tmp_path, monkeypatch, stream):
+    monkeypatch.setitem(LLM_CONFIG, 'stream', stream)
+    replies = ['申し訳ありません、分析できませんでした。', json.dumps(analysis('a1'), ensure_ascii=False)]
+    requests = []
+
+    def handler(request):
+        requests.append(request)
+        return reply(request, replies[min(len(requests), len(replies)) - 1])
+
+    processor = DeepSeekProcessor()
+    processor.client = httpx.Client(transport=httpx.MockTransport(handler))
+    processor.cache = LLMResponseCache(db_path=tmp_path / 'llm_cache.db')
+    article = {'title': '記事', 'content': '本文', 'language': 'ja'}
+    try:
+        assert processor.analyze_article(article)['ai_analysis'].get('fallback')
+        # 次の実行では API を呼び直し、読めた応答だけを保存する
+        assert processor.analyze_article(article)['ai_analysis']['summary'] == 'a1 の要約'
+        assert processor.analyze_article(article)['ai_analysis']['summary'] == 'a1 の要約'
+        assert len(requests) == 2
+    finally:
+        processor.cache.close()
+        processor.close()
+
+def test_failed_articles_are_not_logged_as_analyzed(tmp_path, caplog):
+    processor = DeepSeekProcessor()
+    processor.client = httpx.Client(transport=httpx.MockTransport(lambda request: httpx.Response(500)))
+    processor.cache = LLMResponseCache(db_path=tmp_path / 'llm_cache.db')
+    try:
+        with caplog.at_level('INFO', logger='deepseek_processor'):
+            results = processor.batch_analyze([{'title': '記事1'}, {'title': '記事2'}])
+    finally:
+        processor.cache.close()
+        processor.close()
+
+    assert all(result['ai_analysis']['fallback'] for result in results)
+    assert 'Analyzed:' not in caplog.text
+    assert 'using fallback: 記事2' in caplog.text
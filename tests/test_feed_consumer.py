@@ -0,0 +1,132 @@
+import json
+
+import httpx
+import pytest
+
+from feed_state import FeedStateStore
+from fetch_engine import FeedFetchEngine
+from news_fetcher import NewsFetcher
+from seen_index import SeenArticleIndex
+
+FEED_URL = 'https://news.example.jp/rss'
+
+
+def rss(numbers) -> bytes:
+    items = ''.join(
+        f"<item><title>記事{n}</title><link>https://news.example.jp/articles/{n}</link><guid>news-{n}</guid>"
+        f"<pubDate>Tue, 02 Jan 2024 {n:02d}:00:00 +0000</pubDate></item>"
+        for n in sorted(numbers, reverse=True)
+    )
+    return f'<?xml version="1.0"?><rss version="2.0"><channel>{items}</channel></rss>'.encode('utf-8')
+
+
+@pytest.fixture
+def feed():
+    return {'content': rss([1, 2, 3]), 'requests': 0}
+
+@pytest.fixture
+def make_fetcher(tmp_path, feed):
+    fetchers = []
+
+    def handler(request):
+        feed['requests'] += 1
+        return httpx.Response(200, content=feed['content'])
+
+    class MockEngine(FeedFetchEngine):
+        def _create_client(self):
+            return httpx.AsyncClient(transport=httpx.MockTransport(handler))
+
+    def make(namespace='news_fetcher'):
+        fetcher = NewsFetcher(namespace)
+        fetcher.close()
+        fetcher.sources = [{'name': 'Example', 'url': FEED_URL, 'lang': 'ja'}]
+        fetcher.feed_state = FeedStateStore(tmp_path / 'feed_state.db')
+        fetcher.seen_index = SeenArticleIndex(namespace, tmp_path / 'seen_articles.db')
+        fetcher.fetch_engine = MockEngine(feed_state=fetcher.feed_state, use_http_cache=False)
+        # 連続で取得しても間隔の調整で取得を省かないようにする
+        fetcher.feed_state.skip_reason = lambda url: None
+        fetchers.append(fetcher)
+        return fetcher
+
+    yield make
+    for fetcher in fetchers:
+        fetcher.close()
+
+def titles(articles):
+    return sorted(article['title'] for article in articles)
+
+
+def test_failed_run_is_fetched_again_on_the_next_run(feed, make_fetcher):
+    # 1回目: 取得したが後段の処理が失敗し、commit_seen() を呼ばなかった
+    assert titles(make_fetcher().fetch_all_feeds(only_new=True)) == ['記事1', '記事2', '記事3']
+
+    # 同じフィードを別の利用者が先に取得して処理を終えても、こちらのウォーターマークは進まない
+    other = make_fetcher('other')
+    other.commit_seen(other.fetch_all_feeds(only_new=True))
+
+    # 2回目: 未処理の記事と新しい記事をすべて受け取る
+    feed['content'] = rss([1, 2, 3, 4])
+    fetcher = make_fetcher()
+    articles = fetcher.fetch_all_feeds(only_new=True)
+    assert titles(articles) == ['記事1', '記事2', '記事3', '記事4']
+    fetcher.commit_seen(articles)
+
+    # 3回目: 前回処理した最新エントリでパースを打ち切る
+    feed['content'] = rss([1, 2, 3, 4, 5])
+    fetcher = make_fetcher()
+    assert titles(fetcher.fetch_all_feeds(only_new=True)) == ['記事5']
+    assert fetcher.feed_state.get_watermark(FEED_URL, 'news_fetcher').entry_id == 'news-4'
+
+def test_watermark_waits_until_every_fresh_article_is_committed(feed, make_fetcher):
+    fetcher = make_fetcher()
+    articles = fetcher.fetch_all_feeds(only_new=True)
+    fetcher.commit_seen(articles[:2])
+    assert fetcher.feed_state.get_watermark(FEED_URL, 'news_fetcher') is None
+
+    # 処理できなかった1件は、次の実行で再び新規として返る
+    feed['content'] = rss([1, 2, 3, 4])
+    fetcher = make_fetcher()
+    articles = fetcher.fetch_all_feeds(only_new=True)
+    assert titles(articles) == ['記事1', '記事4']
+    fetcher.commit_seen(articles)
+    assert fetcher.feed_state.get_watermark(FEED_URL, 'news_fetcher').entry_id == 'news-4'
+
+def test_updater_reprocesses_failed_articles_and_keeps_the_previous_page(feed, make_fetcher, tmp_path):
+    from update_news_deepseek_real import RealNewsUpdater
+
+    failing = {'記事2'}
+
+    def analyze_and_generate(article):
+        analysis = {'summary': article['title'], 'fallback': article['title'] in failing}
+        return {**article, 'ai_analysis': analysis, 'detailed_article': {'content': '本文'}}
+
+    def run():
+        updater = RealNewsUpdater(tmp_path / 'public')
+        updater.fetcher.close()
+        updater.fetcher = make_fetcher()
+        updater._analyze_and_generate = analyze_and_generate
+        updater.process_news()
+        with open(tmp_path / 'public' / 'data.json', encoding='utf-8') as f:
+            return json.load(f)['articles']
+
+    def watermark():
+        # process_news() は終了時にフェッチャーを閉じるので、状態は開き直して確かめる
+        state = FeedStateStore(tmp_path / 'feed_state.db')
+        try:
+            return state.get_watermark(FEED_URL, 'news_fetcher')
+        finally:
+            state.close()
+
+    # 1回目: 記事2 は仮の分析になったので記録せず、フィードのウォーターマークも進めない
+    articles = run()
+    assert titles(articles) == ['記事1', '記事2', '記事3']
+    assert watermark() is None
+
+    # 2回目: 記事2 と新しい記事4 だけを処理し、前回処理した記事と合わせて保存する
+    failing.clear()
+    feed['content'] = rss([1, 2, 3, 4])
+    articles = run()
+    assert [article['title'] for article in articles[:2]] == ['記事4', '記事2']
+    assert titles(articles) == ['記事1', '記事2', '記事3', '記事4']
+    assert not any(article['ai_analysis']['fallback'] for article in articles)
+    assert watermark().entry_id == 'news-4'
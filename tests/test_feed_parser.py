@@ -0,0 +1,173 @@
+import asyncio
+import time
+from pathlib import Path
+
+import httpx
+import pytest
+
+from feed_parser import FeedStreamParser, parse_entries, parse_feed, read_feed_response
+from fetch_engine import FeedFetchEngine
+
+FIXTURES = Path(__file__).parent / 'fixtures'
+
+EXPECTED = {
+    'rss2.xml': [
+        ('日銀、政策金利を据え置き', 'https://news.example.jp/articles/3', 'news-3'),
+        ('新幹線、一部区間で運転見合わせ', 'https://news.example.jp/articles/2', 'news-2'),
+        ('Tokyo stocks open higher', 'https://news.example.jp/articles/1', 'https://news.example.jp/articles/1'),
+    ],
+    'rss1_shift_jis.rdf': [
+        ('国産スマートフォン、新機種を発表', 'https://it.example.jp/news/0102', 'https://it.example.jp/news/0102'),
+        ('クラウド障害が復旧', 'https://it.example.jp/news/0101', 'https://it.example.jp/news/0101'),
+    ],
+    'atom.xml': [
+        ('Release 2.0', 'https://blog.example.com/posts/2', 'tag:blog.example.com,2024:2'),
+        ('Hello, world', 'https://blog.example.com/posts/1', 'tag:blog.example.com,2024:1'),
+    ],
+}
+
+
+def fixture(name: str) -> bytes:
+    return (FIXTURES / name).read_bytes()
+
+def summary(entries):
+    return [(entry['title'], entry['link'], entry['id']) for entry in entries]
+
+
+@pytest.mark.parametrize('name', sorted(EXPECTED))
+def test_parse_entries(name):
+    assert summary(parse_entries(fixture(name))) == EXPECTED[name]
+
+@pytest.mark.parametrize('name', sorted(EXPECTED))
+def test_titles_and_links_match_feedparser(name):
+    feedparser = pytest.importorskip('feedparser')
+    expected = [(entry.title, entry.link) for entry in feedparser.parse(fixture(name)).entries]
+    assert [(entry.title, entry.link) for entry in parse_entries(fixture(name))] == expected
+
+def test_entry_fields():
+    rss = parse_entries(fixture('rss2.xml'))
+    # content:encoded だけのエントリは summary にも本文が入る
+    assert rss[1]['summary'] == '<p>大雪の影響で運転を見合わせている。</p>'
+    assert rss[0].published_parsed == time.gmtime(1704155400)
+
+    rdf = parse_entries(fixture('rss1_shift_jis.rdf'))
+    assert rdf[0]['summary'] == '表示・ソフト・予定など、Shift_JIS で 0x5C を含む文字。'
+    assert rdf[0]['published'] == '2024-01-02T10:00:00+09:00'
+
+    atom = parse_entries(fixture('atom.xml'))
+    assert atom[0]['updated'] == atom[0]['published'] == '2024-01-02T12:00:00Z'
+    assert atom[1]['summary'] == '<p>First post</p>'
+
+@pytest.mark.parametrize('name', sorted(EXPECTED))
+def test_byte_at_a_time_matches_whole_document(name):
+    # マルチバイト文字や XML 宣言の途中でチャンクが切れても結果は変わらない
+    content = fixture(name)
+    parser = FeedStreamParser()
+    for i in range(len(content)):
+        parser.feed(content[i:i + 1])
+    assert summary(parser.finish()) == EXPECTED[name]
+
+def test_stops_at_max_items_and_at_the_watermark():
+    parser = FeedStreamParser(max_items=1)
+    parser.feed(fixture('rss2.xml'))
+    assert parser.done
+    assert summary(parser.finish()) == EXPECTED['rss2.xml'][:1]
+
+    entries = parse_feed(fixture('atom.xml'), stop=lambda item: item['id'] == 'tag:blog.example.com,2024:1')
+    assert summary(entries) == EXPECTED['atom.xml'][:1]
+
+def test_feed_broken_after_some_entries_keeps_them():
+    content = fixture('rss2.xml').replace(b'<title>Tokyo stocks', b'<title>Tokyo & stocks')
+    assert summary(parse_entries(content)) == EXPECTED['rss2.xml'][:2]
+
+def test_feed_broken_from_the_start_falls_back_to_feedparser():
+    pytest.importorskip('feedparser')
+    content = b'<rss><channel><item><title>A & B</title><link>https://x.example/1</link></item></channel></rss>'
+    with pytest.raises(Exception):
+        parse_feed(content)
+    assert [entry.link for entry in parse_entries(content)] == ['https://x.example/1']
+
+
+def large_feed(items: int) -> bytes:
+    body = ''.join(f'<item><title>記事{i}</title><link>https://big.example/{i}</link></item>' for i in range(items))
+    return f'<?xml version="1.0"?><rss version="2.0"><channel>{body}</channel></rss>'.encode('utf-8')
+
+class CountingStream(httpx.AsyncByteStream):
+    """4KB ずつ本文を返し、実際に送った量を数える"""
+
+    def __init__(self, content: bytes):
+        self.content = content
+        self.sent = 0
+
+    async def __aiter__(self):
+        for i in range(0, len(self.content), 4096):
+            self.sent = i + 4096
+            yield self.content[i:i + 4096]
+
+def test_read_feed_response_stops_receiving_once_the_entries_are_in():
+    content = large_feed(5000)
+    stream = CountingStream(content)
+
+    async def fetch(read_all):
+        transport = httpx.MockTransport(lambda request: httpx.Response(200, stream=stream))
+        async with httpx.AsyncClient(transport=transport) as client:
+            async with client.stream('GET', 'https://big.example/feed') as response:
+                return await read_feed_response(response, max_items=3, read_all=read_all)
+
+    response = asyncio.run(fetch(read_all=False))
+    assert [entry['title'] for entry in response.extensions['entries']] == ['記事0', '記事1', '記事2']
+    assert response.extensions['truncated']
+    assert stream.sent == 4096 and len(response.content) == 4096
+
+    response = asyncio.run(fetch(read_all=True))
+    assert len(response.extensions['entries']) == 3
+    assert not response.extensions['truncated']
+    assert response.content == content
+
+def test_read_feed_response_stops_at_max_bytes_even_when_reading_all():
+    content = large_feed(5000)
+    stream = CountingStream(content)
+
+    async def fetch():
+        transport = httpx.MockTransport(lambda request: httpx.Response(200, stream=stream))
+        async with httpx.AsyncClient(transport=transport) as client:
+            async with client.stream('GET', 'https://big.example/feed') as response:
+                return await read_feed_response(response, max_items=3, read_all=True, max_bytes=10000)
+
+    response = asyncio.run(fetch())
+    assert len(response.extensions['entries']) == 3
+    # 上限を超えたチャンクで受信をやめ、そのチャンクは持たない（途中までの本文は保存されない）
+    assert response.extensions['truncated']
+    assert stream.sent == 3 * 4096 and len(response.content) == 2 * 4096
+
+def test_fetch_engine_streams_feeds_and_keeps_conditional_get(tmp_path):
+    content = large_feed(2000)
+    streams = []
+
+    def handler(request):
+        url = str(request.url)
+        if url.endswith('/etag') and request.headers.get('if-none-match') == '"v1"':
+            return httpx.Response(304, headers={'etag': '"v1"'})
+        streams.append(CountingStream(content))
+        headers = {'etag': '"v1"'} if url.endswith('/etag') else {}
+        return httpx.Response(200, headers=headers, stream=streams[-1])
+
+    class MockEngine(FeedFetchEngine):
+        def _create_client(self):
+            return httpx.AsyncClient(transport=httpx.MockTransport(handler))
+
+    engine = MockEngine()
+    engine.http_cache.cache_dir = tmp_path
+    sources = [{'url': 'https://big.example/plain'}, {'url': 'https://big.example/etag'}]
+    parse = lambda source: {'max_items': 2}
+
+    plain, etag = engine.fetch_all_sync(sources, parse=parse)
+    assert [entry['title'] for entry in plain.entries] == ['記事0', '記事1']
+    assert plain.truncated and streams[0].sent < len(content)
+    # 検証ヘッダ付きの応答は、次回の 304 のために最後まで受け取って保存する
+    assert [entry['title'] for entry in etag.entries] == ['記事0', '記事1']
+    assert not etag.truncated and etag.content == content
+
+    plain, etag = engine.fetch_all_sync(sources, parse=parse)
+    assert etag.not_modified and etag.entries is None
+    assert summary(parse_entries(etag.content, 2)) == summary(plain.entries)
@@ -0,0 +1,134 @@
+import json
+import random
+
+import pytest
+
+from json_scanner import COMPLETE, MALFORMED, IncrementalJSONScanner, iter_json_candidates, load_json_response
+
+# JSON の構文と紛らわしい文字を多めに混ぜる
+ALPHABET = 'abcxyz 日本語ニュース{}[]":,\\\n\t/'
+
+# JSON の前に置く文章。どれも JSON の値の始まりではない
+PREFIXES = [
+    '',
+    '以下が分析結果です。\n',
+    '設定は {x} のように書きます。',
+    '詳細は[こちら](https://example.com/a?b=1)を参照。',
+    '<think>まず {記事} を読み、[要点] を整理する。}] 閉じ括弧だけの行。</think>\n',
+]
+# JSON の後に置く文章。括弧が崩れていても最初の値には影響しない
+SUFFIXES = ['', '\n以上です。', '\n補足: {"note": 1', ' }} ]] {', '\n```\n次の記事 [1] へ']
+
+
+def random_string(rng: random.Random) -> str:
+    return ''.join(rng.choice(ALPHABET) for _ in range(rng.randint(0, 12)))
+
+def random_value(rng: random.Random, depth: int = 0):
+    kind = rng.randrange(7 if depth < 4 else 4)
+    if kind == 0:
+        return random_string(rng)
+    if kind == 1:
+        return rng.choice([rng.randint(-10 ** 6, 10 ** 6), rng.uniform(-1e3, 1e3)])
+    if kind == 2:
+        return rng.choice([True, False, None])
+    if kind == 3:
+        return rng.randint(0, 9)
+    if kind in (4, 5):
+        return {random_string(rng): random_value(rng, depth + 1) for _ in range(rng.randint(0, 4))}
+    return [random_value(rng, depth + 1) for _ in range(rng.randint(0, 4))]
+
+def random_document(rng: random.Random, top: type):
+    while True:
+        value = random_value(rng)
+        if isinstance(value, top):
+            return value
+
+def embed(rng: random.Random, value) -> str:
+    encoded = json.dumps(value, ensure_ascii=rng.random() < 0.5, indent=rng.choice([None, 2]))
+    if rng.random() < 0.5:
+        encoded = f"```json\n{encoded}\n```"
+    return rng.choice(PREFIXES) + encoded + rng.choice(SUFFIXES)
+
+def random_chunks(rng: random.Random, text: str):
+    position = 0
+    while position < len(text):
+        size = rng.randint(1, 8)
+        yield text[position:position + size]
+        position += size
+
+def cases(top: type, count: int = 300):
+    rng = random.Random(f"json-scanner-{top.__name__}")
+    for _ in range(count):
+        value = random_document(rng, top)
+        yield value, embed(rng, value), rng
+
+
+@pytest.mark.parametrize('top, openers', [(dict, '{'), (dict, '{['), (list, '{[')])
+def test_load_json_response_matches_json_loads(top, openers):
+    for value, text, _ in cases(top):
+        assert load_json_response(text, openers) == value, text
+
+@pytest.mark.parametrize('top', [dict, list])
+def test_incremental_scanner_matches_json_loads_for_any_chunking(top):
+    for value, text, rng in cases(top):
+        scanner = IncrementalJSONScanner('{[')
+        for chunk in random_chunks(rng, text):
+            if scanner.feed(chunk) is not None:
+                break
+        assert scanner.state == COMPLETE, text
+        assert scanner.value == value
+        assert json.loads(scanner.text) == value
+
+def test_iter_json_candidates_yields_the_encoded_span():
+    rng = random.Random('json-scanner-spans')
+    for _ in range(100):
+        encoded = json.dumps(random_document(rng, dict), ensure_ascii=False)
+        prefix = rng.choice(PREFIXES)
+        text = prefix + encoded + rng.choice(SUFFIXES)
+        assert (len(prefix), len(prefix) + len(encoded)) in iter_json_candidates(text), text
+
+
+def test_prose_brackets_are_not_json():
+    text = '設定は {x} と書き、出典[1]と[リンク](https://example.com)を付ける。'
+    scanner = IncrementalJSONScanner('{')
+    assert scanner.feed(text) is None
+    with pytest.raises(json.JSONDecodeError):
+        load_json_response(text)
+
+def test_mismatched_brackets_are_malformed():
+    scanner = IncrementalJSONScanner('{[')
+    assert scanner.feed('回答: {"a": [1, 2}') == MALFORMED
+    assert scanner.feed(' ]}') == MALFORMED
+
+def test_escaped_quote_split_across_chunks():
+    scanner = IncrementalJSONScanner('{')
+    for chunk in ['{"a": "x\\', '"}', '"', '}']:
+        state = scanner.feed(chunk)
+    assert state == COMPLETE and scanner.value == {'a': 'x"}'}
+
+def test_common_breakage_is_repaired_as_a_last_resort():
+    text = '{\n  "title": "日銀\n  会合",\n  "keywords": ["金利", "円相場",],\n}'
+    assert load_json_response(text) == {'title': '日銀会合', 'keywords': ['金利', '円相場']}
+
+@pytest.mark.parametrize('text', [
+    'The syntax "{" opens an object. Result: {"a": 1}',
+    'He wrote {don"t} here. {"a": 1}',
+    'say "{" then {"a": 1} ok"',
+])
+def test_stray_quote_in_an_unclosed_candidate_does_not_hide_later_json(text):
+    assert load_json_response(text) == {'a': 1}
+
+def test_rescanned_candidates_are_yielded_once():
+    text = '{"' * 20000 + '{"a": 1}'
+    spans = list(iter_json_candidates(text))
+    assert len(spans) == len(set(spans))
+
+def test_rejected_values_are_skipped():
+    text = '記事[1]によると、[2] も参照。結果: [{"id": "a1"}] 以上'
+    assert IncrementalJSONScanner('[').feed(text) == COMPLETE
+
+    scanner = IncrementalJSONScanner('[', accept=lambda value: all(isinstance(item, dict) for item in value))
+    for chunk in random_chunks(random.Random(0), text):
+        if scanner.feed(chunk) is not None:
+            break
+    assert scanner.state == COMPLETE and scanner.value == [{'id': 'a1'}]
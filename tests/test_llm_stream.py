@@ -0,0 +1,96 @@
+import json
+
+import httpx
+import pytest
+
+from llm_cache import LLMResponseCache
+from llm_stream import MalformedStreamError, stream_chat_completion
+
+API_URL = 'https://api.example.com/chat/completions'
+PAYLOAD = {'model': 'test-model', 'messages': [{'role': 'user', 'content': 'hi'}], 'max_tokens': 100}
+
+
+class EventStream(httpx.SyncByteStream):
+    """SSE のイベントを1つずつ返し、送った数を数える"""
+
+    def __init__(self, deltas):
+        events = [{'choices': [{'index': 0, 'delta': {'content': delta}}]} for delta in deltas]
+        events.append({'choices': [{'index': 0, 'delta': {}, 'finish_reason': 'stop'}],
+                       'usage': {'total_tokens': 42}})
+        self.lines = [f"data: {json.dumps(event, ensure_ascii=False)}\n\n" for event in events]
+        self.lines.append("data: [DONE]\n\n")
+        self.sent = 0
+
+    def __iter__(self):
+        for line in self.lines:
+            self.sent += 1
+            yield line.encode('utf-8')
+
+def client_for(stream: EventStream) -> httpx.Client:
+    return httpx.Client(transport=httpx.MockTransport(lambda request: httpx.Response(200, stream=stream)))
+
+
+PROSE = ['まず設定例 ', '{"retries": 3}', ' を確認します。', '次に手順を説明します。', '以上です。']
+
+def test_prose_is_read_to_the_end_even_if_it_contains_json():
+    stream = EventStream(PROSE)
+    with client_for(stream) as client:
+        response = stream_chat_completion(client, API_URL, PAYLOAD)
+
+    assert response.json()['choices'][0]['message']['content'] == ''.join(PROSE)
+    assert response.json()['usage'] == {'total_tokens': 42}
+    assert stream.sent == len(stream.lines)
+    assert not response.extensions['stopped_early'] and not response.extensions['incomplete']
+
+def test_openers_stop_once_the_json_is_complete():
+    stream = EventStream(PROSE)
+    with client_for(stream) as client:
+        response = stream_chat_completion(client, API_URL, PAYLOAD, openers='{')
+
+    assert response.json()['choices'][0]['message']['content'] == 'まず設定例 {"retries": 3}'
+    assert stream.sent == 2
+    assert response.extensions['stopped_early']
+    assert 'usage' not in response.json()
+
+def test_values_the_caller_rejects_do_not_stop_the_stream():
+    stream = EventStream(['記事[1]によると', '、結果は ', '[{"id": "a1"}]', ' です。'])
+    with client_for(stream) as client:
+        response = stream_chat_completion(client, API_URL, PAYLOAD, openers='[',
+                                          accept=lambda value: all(isinstance(item, dict) for item in value))
+
+    assert response.json()['choices'][0]['message']['content'] == '記事[1]によると、結果は [{"id": "a1"}]'
+    assert response.extensions['stopped_early'] and stream.sent == 3
+
+def test_malformed_json_raises():
+    stream = EventStream(['{"a": [1, 2}', ' 続き'])
+    with client_for(stream) as client:
+        with pytest.raises(MalformedStreamError):
+            stream_chat_completion(client, API_URL, PAYLOAD, openers='{[')
+
+def test_connection_closed_before_done_is_incomplete():
+    stream = EventStream(PROSE)
+    stream.lines = stream.lines[:2]
+    with client_for(stream) as client:
+        response = stream_chat_completion(client, API_URL, PAYLOAD)
+    assert response.extensions['incomplete']
+
+
+def test_cache_keeps_early_stopped_replies_only_for_the_json_variant(tmp_path):
+    cache = LLMResponseCache(db_path=tmp_path / 'llm_cache.db')
+    try:
+        with client_for(EventStream(PROSE)) as client:
+            early = lambda: stream_chat_completion(client, API_URL, PAYLOAD, openers='{')
+            cache.get_or_call(PAYLOAD, early)
+            # 打ち切った応答を文章として読む呼び出しに返してはいけない
+            assert cache.get(PAYLOAD) is None
+
+        with client_for(EventStream(PROSE)) as client:
+            cache.get_or_call(PAYLOAD, lambda: stream_chat_completion(client, API_URL, PAYLOAD, openers='{'),
+                              variant='json-object')
+        assert cache.get(PAYLOAD, 'json-object')['choices'][0]['message']['content'] == 'まず設定例 {"retries": 3}'
+
+        with client_for(EventStream(PROSE)) as client:
+            cache.get_or_call(PAYLOAD, lambda: stream_chat_completion(client, API_URL, PAYLOAD))
+        assert cache.get(PAYLOAD)['choices'][0]['message']['content'] == ''.join(PROSE)
+    finally:
+        cache.close()
@@ -0,0 +1,55 @@
+from near_duplicate import (
+    NearDuplicateIndex, _lsh_params, jaccard, normalize_title, remove_near_duplicates, shingles
+)
+
+
+def test_normalize_title_folds_width_case_and_punctuation():
+    assert normalize_title('【速報】ＡＢＣ　News!') == normalize_title('速報 abc news')
+
+def test_shingles_of_short_titles():
+    assert shingles('') == set()
+    assert shingles('日銀') == {'日銀'}
+
+def test_lsh_params_reach_the_target_recall_at_the_threshold():
+    for threshold in (0.4, 0.5, 0.6, 0.8):
+        bands, rows = _lsh_params(threshold, 64)
+        assert bands * rows <= 64
+        assert 1 - (1 - threshold ** rows) ** bands >= 0.9
+
+def test_japanese_variants_are_near_duplicates():
+    index = NearDuplicateIndex()
+    index.add('original', '日銀が政策金利を0.5%に引き上げ、17年ぶりの水準に')
+
+    for variant in ('【速報】日銀が政策金利を0.5%に引き上げ、17年ぶりの水準に',
+                    '日銀が政策金利を0.5％に引き上げ 17年ぶりの水準に - 共同通信'):
+        assert index.find_duplicate(variant) == 'original'
+    assert index.find_duplicate('トヨタが新型EVを発表、航続距離は700キロ') is None
+
+def test_query_scores_are_exact_jaccard():
+    title = 'Apple unveils new iPhone with satellite messaging'
+    variant = 'Apple unveils new iPhone with satellite messaging | Reuters'
+    index = NearDuplicateIndex()
+    index.add(1, title)
+
+    [(key, score)] = index.query(variant)
+    assert key == 1
+    assert score == jaccard(shingles(title), shingles(variant))
+
+def test_remove_near_duplicates_keeps_the_first_article():
+    articles = [
+        {'title': '東京株式市場、日経平均が史上最高値を更新', 'url': 'https://a.example/1'},
+        {'title': '【速報】東京株式市場、日経平均が史上最高値を更新', 'url': 'https://b.example/2'},
+        {'title': '全く別のニュース：台風10号が九州に接近', 'url': 'https://a.example/3'},
+        {'title': 'URL だけが同じ記事', 'url': 'https://a.example/3'},
+    ]
+
+    assert remove_near_duplicates(articles) == [articles[0], articles[2]]
+
+def test_threshold_is_configurable():
+    articles = [
+        {'title': 'Fed holds interest rates steady'},
+        {'title': 'Fed holds interest rates steady as inflation cools'},
+    ]
+
+    assert len(remove_near_duplicates(articles, threshold=0.5)) == 1
+    assert len(remove_near_duplicates(articles, threshold=0.9)) == 2